@@ -1,20 +1,33 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import openai
+from streamlit.errors import StreamlitSecretNotFoundError
 import time
-import re
-from io import BytesIO
-import base64
-import textwrap
+from io import BytesIO, StringIO
+import csv
+import functools
+import hmac
+import html
+import logging
+import math
 import os
-import json
-import pickle
+import threading
 from pathlib import Path
+import uuid
 import zipfile
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from medsimplify import (
+    METHODS, TARGET_GROUPS, HistoryStore, MockBackend, OpenAIBackend, PhiScrubber, PhiScrubbingBackend, simplify
+)
+from medsimplify.charts import METHOD_COLORS, render_bar_chart
+from medsimplify.history_export import EXPORT_FORMATS, export_history
+from medsimplify.history_report import REPORT_FORMATS, ReportJob, write_text_report
+from medsimplify.job_queue import JobQueue, JobRunner
+from medsimplify.note_parser import parse_note
+from medsimplify.profiler import ProfileSchedule, list_profiles, read_collapsed, top_functions
+from medsimplify.fhir import iter_fhir_notes
+from medsimplify.synthea import iter_synthea_notes
+from medsimplify.uploads import UPLOAD_TYPES, iter_file_notes
+from medsimplify.tracing import span, trace, waterfall_rows
 
 # App title and configuration
 st.set_page_config(
@@ -24,166 +37,80 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Static tutorial text, code examples and CSS live in resource files next to the app
+CONTENT_DIR = Path(__file__).parent / "content"
+
+TUTORIAL_SECTIONS = ("introduction", "dataset_info", "prompting_methods", "patient_specific", "evaluation_methods")
+CODE_EXAMPLES = ("zero_shot", "few_shot", "chain_of_thought", "tree_of_thoughts", "evaluation")
+
+# Function to read a resource file (cached for the lifetime of the server)
+@st.cache_data(show_spinner=False)
+def load_resource(relative_path):
+    return (CONTENT_DIR / relative_path).read_text(encoding="utf-8")
+
+# Function to build the <style> block for the custom CSS
+@st.cache_data(show_spinner=False)
+def load_stylesheet():
+    return f"<style>\n{load_resource('style.css')}</style>"
+
 # Custom CSS for better appearance
-st.markdown("""
-<style>
-    .main .block-container {
-        padding-top: 2rem;
-    }
-    h1, h2, h3 {
-        color: #0e4c92;
-    }
-    .highlight {
-        background-color: #f0f7ff;
-        padding: 1.5rem;
-        border-radius: 0.5rem;
-        border-left: 0.5rem solid #0e4c92;
-        margin: 1rem 0;
-    }
-    .disclaimer {
-        background-color: #fff8e1;
-        padding: 1rem;
-        border-radius: 0.5rem;
-        border-left: 0.5rem solid #ffa000;
-        margin: 1rem 0;
-        font-size: 0.9rem;
-    }
-    .success-box {
-        background-color: #e6f4ea;
-        padding: 1rem;
-        border-radius: 0.5rem;
-        border-left: 0.5rem solid #34a853;
-        margin: 1rem 0;
-    }
-    .warning-box {
-        background-color: #fce8e6;
-        padding: 1rem;
-        border-radius: 0.5rem;
-        border-left: 0.5rem solid #ea4335;
-        margin: 1rem 0;
-    }
-    .stButton>button {
-        background-color: #0e4c92;
-        color: white;
-        border-radius: 0.5rem;
-        padding: 0.5rem 1rem;
-    }
-    .stButton>button:hover {
-        background-color: #0b3b73;
-    }
-    .styled-table {
-        border-collapse: collapse;
-        margin: 20px 0;
-        font-size: 0.9em;
-        font-family: sans-serif;
-        min-width: 400px;
-        box-shadow: 0 0 20px rgba(0, 0, 0, 0.15);
-        width: 100%;
-    }
-    .styled-table thead tr {
-        background-color: #0e4c92;
-        color: #ffffff;
-        text-align: left;
-    }
-    .styled-table th,
-    .styled-table td {
-        padding: 12px 15px;
-    }
-    .styled-table tbody tr {
-        border-bottom: 1px solid #dddddd;
-    }
-    .styled-table tbody tr:nth-of-type(even) {
-        background-color: #f3f3f3;
-    }
-    .styled-table tbody tr:last-of-type {
-        border-bottom: 2px solid #0e4c92;
-    }
-    .code-box {
-        background-color: #f6f8fa;
-        padding: 1rem;
-        border-radius: 0.5rem;
-        border: 1px solid #ddd;
-        font-family: 'Courier New', monospace;
-        overflow-x: auto;
-        white-space: pre-wrap;
-    }
-    .two-column {
-        display: flex;
-        gap: 20px;
-    }
-    .column {
-        flex: 1;
-    }
-    .method-box {
-        border: 1px solid #ddd;
-        border-radius: 8px;
-        padding: 15px;
-        margin-bottom: 15px;
-        background-color: #f9f9f9;
-    }
-    .method-title {
-        font-weight: bold;
-        color: #0e4c92;
-        margin-bottom: 10px;
-    }
-    .comparison-header {
-        text-align: center;
-        padding: 10px;
-        background-color: #e8f0fe;
-        border-radius: 5px;
-        margin-bottom: 15px;
-    }
-    .tab-content {
-        padding: 20px 0;
-    }
-    .prompt-title {
-        font-weight: bold;
-        color: #333;
-        margin-bottom: 5px;
-    }
-    .prompt-text {
-        background-color: #f6f8fa;
-        padding: 10px;
-        border-radius: 5px;
-        border-left: 3px solid #0e4c92;
-        font-family: 'Courier New', monospace;
-        white-space: pre-wrap;
-        margin-bottom: 20px;
-    }
-    .metric-box {
-        border: 1px solid #ddd;
-        border-radius: 8px;
-        padding: 15px;
-        margin-bottom: 15px;
-        background-color: #f9f9f9;
-    }
-    .metric-title {
-        font-weight: bold;
-        text-align: center;
-        margin-bottom: 10px;
-    }
-    .metric-value {
-        font-size: 24px;
-        font-weight: bold;
-        text-align: center;
-        color: #0e4c92;
-    }
-    .metric-description {
-        text-align: center;
-        font-size: 12px;
-        color: #666;
-        margin-top: 5px;
-    }
-</style>
-""", unsafe_allow_html=True)
+st.markdown(load_stylesheet(), unsafe_allow_html=True)
+
+# Function to write finished traces as JSON lines to TRACE_LOG_PATH (once per server process)
+@st.cache_resource
+def configure_trace_log():
+    log_path = os.environ.get("TRACE_LOG_PATH")
+    if log_path:
+        handler = logging.FileHandler(log_path)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        trace_logger = logging.getLogger("medsimplify.trace")
+        trace_logger.addHandler(handler)
+        trace_logger.setLevel(logging.INFO)
+    return log_path
+
+configure_trace_log()
+
+# Function to get the profiling schedule an admin arms from the Profiler page (one per server process)
+@st.cache_resource
+def get_profile_schedule():
+    return ProfileSchedule(Path("streamlit_cache") / "profiles")
+
+# Profile this script run if an admin asked for the next runs to be profiled. A run that was
+# interrupted by a rerun never reached the end of the script, so its profile is written here.
+if st.session_state.get("script_profiler") is not None:
+    get_profile_schedule().finish(st.session_state.pop("script_profiler"), "script_interrupted")
+st.session_state.script_profiler = get_profile_schedule().start("script", threads={threading.get_ident()})
+
+# Function to read a value from the Streamlit secrets; None when there is no secrets.toml or no such value,
+# so the app also runs without one
+def get_secret(section, key):
+    try:
+        return st.secrets[section][key]
+    except (StreamlitSecretNotFoundError, FileNotFoundError, KeyError):
+        return None
+
+# Function to check the admin password entered in the sidebar against ADMIN_PASSWORD or
+# st.secrets["admin"]["password"]; admin pages are hidden when neither is set
+def get_admin_password():
+    return os.environ.get("ADMIN_PASSWORD") or get_secret("admin", "password")
+
+def is_admin():
+    admin_password = get_admin_password()
+    entered = st.session_state.get("admin_password_input", "")
+    return bool(admin_password) and hmac.compare_digest(entered.encode(), admin_password.encode())
+
+# Function to get the scrubber that replaces identifiers in notes before LLM calls and storage
+# (one per server process); PHI_SCRUBBING=0 sends and stores notes as they are
+@st.cache_resource
+def get_phi_scrubber():
+    if os.environ.get("PHI_SCRUBBING", "1").lower() in ("0", "off", "false"):
+        return None
+    return PhiScrubber()
 
 # Initialize session state variables if they don't exist
 if 'api_key_configured' not in st.session_state:
     st.session_state.api_key_configured = False
 
-if 'processing_history' not in st.session_state:
-    st.session_state.processing_history = []
-    
 if 'current_tab' not in st.session_state:
     st.session_state.current_tab = "tutorial"
     
@@ -200,9 +127,13 @@ with st.sidebar:
     
     # Navigation
     st.subheader("Navigation")
+    nav_options = ["📚 Tutorial", "🔬 Live Demo", "📊 Results Explorer", "📝 Code Examples", "ℹ️ About"]
+    if is_admin():
+        nav_options.append("🩺 Profiler")
     nav_selection = st.radio(
         "Go to:",
-        ["📚 Tutorial", "🔬 Live Demo", "📊 Results Explorer", "📝 Code Examples", "ℹ️ About"]
+        nav_options,
+        key="navigation"
     )
     
     if nav_selection == "📚 Tutorial":
@@ -215,26 +146,34 @@ with st.sidebar:
         st.session_state.current_tab = "code"
     elif nav_selection == "ℹ️ About":
         st.session_state.current_tab = "about"
+    elif nav_selection == "🩺 Profiler":
+        st.session_state.current_tab = "profiler"
     
     # API Key Configuration
     st.markdown("---")
     st.subheader("API Configuration")
     
-    # Using Streamlit secrets if available, otherwise ask for API key
-    if "openai" in st.secrets:
-        openai.api_key = st.secrets["openai"]["api_key"]
+    # Using the offline mock backend if selected, otherwise Streamlit secrets if available, otherwise ask for API key
+    if os.environ.get("LLM_BACKEND") == "mock":
+        st.info("Using the offline mock LLM backend (LLM_BACKEND=mock).")
+        st.session_state.api_key_configured = True
+    elif get_secret("openai", "api_key"):
+        st.session_state.openai_api_key = get_secret("openai", "api_key")
         st.success("API Key configured from Streamlit secrets!")
         st.session_state.api_key_configured = True
     else:
         api_key = st.text_input("Enter your OpenAI API Key", type="password")
         if api_key:
-            openai.api_key = api_key
+            st.session_state.openai_api_key = api_key
             st.session_state.api_key_configured = True
             st.success("API Key configured!")
         else:
             st.session_state.api_key_configured = False
             st.warning("Please enter your API key to use the demo features.")
     
+    if get_phi_scrubber() is not None:
+        st.caption("🔒 Identifiers such as IDs, names, dates and phone numbers are replaced before notes are sent to the LLM or saved.")
+    
     # Settings (only shown when relevant)
     if st.session_state.current_tab == "demo" and st.session_state.api_key_configured:
         st.markdown("---")
@@ -257,990 +196,475 @@ with st.sidebar:
         
         target_group = st.radio(
             "Target patient group",
-            options=["General", "Elderly", "Low Literacy", "ESL (English as Second Language)"]
+            options=list(TARGET_GROUPS)
         )
     
+    # Admin login (only shown when an admin password is configured)
+    if get_admin_password():
+        st.markdown("---")
+        with st.expander("Admin"):
+            st.text_input("Admin password", type="password", key="admin_password_input")
+            if is_admin():
+                st.success("Admin pages enabled.")
+            elif st.session_state.get("admin_password_input"):
+                st.error("Wrong admin password.")
+    
     st.markdown("---")
     st.caption("Created for Healthcare LLM Application Tutorial")
 
-# Sample medical notes from Synthea
-default_medical_note = """PATIENT MEDICAL NOTE
-Patient ID: 1a2b3c4d-5e6f
-Demographics: 67 year old male, White, Non-Hispanic
-
-MEDICAL HISTORY:
-Conditions: Essential hypertension, Hyperlipidemia, Type 2 diabetes mellitus, Chronic kidney disease, stage 2 (mild)
-
-MEDICATIONS:
-Lisinopril 10mg daily, Atorvastatin 20mg daily, Metformin 1000mg BID
-
-ENCOUNTERS:
-- 2024-03-10: Outpatient visit - Reason: Follow-up
-- 2024-01-15: Laboratory encounter - Reason: Routine labs
-
-LABORATORY RESULTS:
-- 2024-01-15: Hemoglobin A1c - 7.2 %
-- 2024-01-15: Creatinine - 1.3 mg/dL
-- 2024-01-15: LDL Cholesterol - 110 mg/dL"""
-
-# Load sample medical notes
-sample_notes = {
-    "Sample 1: Diabetes and Hypertension": default_medical_note,
-    "Sample 2: Cardiac Condition": """PATIENT MEDICAL NOTE
-Patient ID: 7g8h9i0j-1k2l
-Demographics: 72 year old female, Asian, Non-Hispanic
-
-MEDICAL HISTORY:
-Conditions: Coronary atherosclerosis, Atrial fibrillation, Congestive heart failure, Osteoarthritis
-
-MEDICATIONS:
-Metoprolol 25mg BID, Warfarin 5mg daily, Furosemide 40mg daily, Lisinopril 20mg daily, Atorvastatin 40mg daily
-
-ENCOUNTERS:
-- 2024-02-05: Emergency visit - Reason: Chest pain
-- 2024-02-06: Inpatient admission - Reason: Non-ST elevation myocardial infarction
-- 2024-02-10: Discharge - Disposition: Home
-
-LABORATORY RESULTS:
-- 2024-02-05: Troponin I - 0.2 ng/mL
-- 2024-02-05: BNP - 450 pg/mL
-- 2024-02-05: Creatinine - 1.1 mg/dL""",
-    "Sample 3: Respiratory Condition": """PATIENT MEDICAL NOTE
-Patient ID: 3m4n5o6p-7q8r
-Demographics: 58 year old female, Black, Non-Hispanic
-
-MEDICAL HISTORY:
-Conditions: Chronic obstructive pulmonary disease (COPD), Gastroesophageal reflux disease (GERD), Anxiety disorder
-
-MEDICATIONS:
-Albuterol inhaler PRN, Fluticasone/Salmeterol inhaler BID, Omeprazole 20mg daily, Sertraline 50mg daily
-
-ENCOUNTERS:
-- 2024-04-02: Outpatient visit - Reason: COPD exacerbation
-- 2024-04-02: Pulmonary function test
-
-LABORATORY RESULTS:
-- 2024-04-02: SpO2 - 94 %
-- 2024-04-02: FEV1 - 65 % predicted
-- 2024-04-02: FEV1/FVC ratio - 0.65""",
-    "Custom Note (Enter your own)": ""
+# Sample medical notes from Synthea, one file each in content/samples (the benchmarks use them too)
+SAMPLE_NOTES = {
+    "Sample 1: Diabetes and Hypertension": "diabetes_hypertension",
+    "Sample 2: Cardiac Condition": "cardiac",
+    "Sample 3: Respiratory Condition": "respiratory"
 }
 
-# Functions for different prompting methods
-def zero_shot_simplification(medical_note, target_group="General", model="gpt-3.5-turbo", temp=0.3):
-    """Simplifies a medical note using zero-shot prompting approach."""
-    
-    # Customize for target patient group
-    if target_group == "Elderly":
-        audience = "elderly patients (70+ years) who may have some vision or hearing difficulties"
-        specific_instructions = "Use larger conceptual chunks, clear organization with headings, and avoid information overload."
-    elif target_group == "Low Literacy":
-        audience = "patients with low health literacy (reading at a 4th-5th grade level)"
-        specific_instructions = "Use very simple words (1-2 syllables when possible), short sentences, and concrete examples."
-    elif target_group == "ESL":
-        audience = "patients who speak English as a second language"
-        specific_instructions = "Use common everyday vocabulary, avoid idioms and cultural references, and use consistent terminology."
-    else:  # General
-        audience = "patients with limited health literacy"
-        specific_instructions = "Use plain language at approximately an 8th grade reading level."
-    
-    prompt = f"""
-Please simplify the following medical note to make it more understandable for {audience}:
-
-{medical_note}
-
-The simplified note should:
-- Use plain language instead of medical jargon
-- Maintain all important medical information
-- Be organized in a clear structure
-- Explain medical terms when necessary
-- {specific_instructions}
-"""
-    
-    try:
-        response = openai.ChatCompletion.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that specializes in making medical information accessible to patients."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=temp,
-            max_tokens=1000
-        )
-        
-        return response.choices[0].message["content"].strip()
-    except Exception as e:
-        return f"Error: {str(e)}"
-
-def few_shot_simplification(medical_note, target_group="General", model="gpt-3.5-turbo", temp=0.3):
-    """Simplifies a medical note using few-shot (in-context learning) approach."""
-    
-    # Customize examples for target patient group
-    if target_group == "Elderly":
-        instruction = "elderly patients (70+ years) who may have some vision or hearing difficulties"
-        examples = """
-EXAMPLE 1:
-ORIGINAL: 
-Patient is a 75-year-old female with hypertension, hyperlipidemia, and osteoarthritis. Patient reports increasing joint pain and difficulty with mobility. Physical examination reveals decreased range of motion in bilateral knees.
-
-SIMPLIFIED:
-YOUR HEALTH SUMMARY
-
-You are a 75-year-old woman with high blood pressure, high cholesterol, and arthritis in your joints.
+# Load sample medical notes (read once per server process)
+@st.cache_data(show_spinner=False)
+def load_sample_notes():
+    notes = {label: load_resource(f"samples/{name}.txt").rstrip("\n") for label, name in SAMPLE_NOTES.items()}
+    notes["Custom Note (Enter your own)"] = ""
+    return notes
 
-YOUR CURRENT SYMPTOMS:
-You mentioned that your joint pain is getting worse and you're having more trouble moving around. When we examined you, we noticed you can't bend your knees as fully as normal.
+sample_notes = load_sample_notes()
 
-WHAT THIS MEANS:
-Your arthritis may be progressing. This is causing the increased pain and making it harder for you to walk and move.
-
-NEXT STEPS:
-We should discuss pain management options and possibly physical therapy to help maintain your mobility and independence.
-
-EXAMPLE 2:
-ORIGINAL:
-Patient presents with exacerbation of COPD. Pulmonary function tests show FEV1 of 45% predicted and SpO2 of 92% on room air. Started on prednisone 40mg daily for 5 days and increased albuterol inhaler frequency.
-
-SIMPLIFIED:
-YOUR HEALTH UPDATE
-
-Your lung condition (COPD) is having a flare-up right now.
-
-YOUR TEST RESULTS:
-• Breathing test: Shows your lungs are working at about 45% of normal capacity
-• Oxygen level: 92% (normal is 95-100%)
-
-YOUR TREATMENT PLAN:
-• New medication: Prednisone pills (40mg) once daily for 5 days
-  This helps reduce inflammation in your lungs
-• Increase your rescue inhaler (albuterol) as needed
-  Use it more often until your breathing improves
-
-IMPORTANT REMINDER:
-• Take all medications as directed
-• Call us if your breathing gets worse or doesn't improve
-"""
-    elif target_group == "Low Literacy":
-        instruction = "patients with low health literacy (reading at a 4th-5th grade level)"
-        examples = """
-EXAMPLE 1:
-ORIGINAL: 
-Patient is a 67-year-old male with hypertension, hyperlipidemia, and type 2 diabetes mellitus. Patient reports dyspnea on exertion and occasional orthopnea. Physical examination reveals bilateral lower extremity edema.
-
-SIMPLIFIED:
-YOUR HEALTH
-
-You are a 67-year-old man with:
-• High blood pressure
-• High fat in your blood
-• Sugar disease (diabetes)
-
-You told us:
-• You get short of breath when you move around
-• Sometimes it's hard to breathe when you lie down
-
-We found:
-• Your legs are swollen on both sides
-
-What this means:
-Your heart may be working too hard. The swelling in your legs happens when fluid builds up.
-
-Next steps:
-We need to check your heart. Take your pills every day.
-
-EXAMPLE 2:
-ORIGINAL:
-Patient presents with complaints of dyspepsia and epigastric pain for 2 weeks, worse after meals. Endoscopy revealed gastric erosions consistent with NSAID gastropathy. H. pylori testing negative.
-
-SIMPLIFIED:
-YOUR HEALTH PROBLEM
-
-What you told us:
-• Your stomach hurts
-• The pain has lasted 2 weeks
-• Pain gets worse after you eat
-
-What we found:
-• Your stomach has some raw, sore areas inside
-• These sores likely came from pain pills you take
-• You do not have the stomach germ called H. pylori
-
-What to do now:
-• Stop taking ibuprofen, naproxen, or aspirin
-• Take the new stomach medicine every day
-• Eat smaller meals
-• Call us if you see blood in your throw-up or poop
-"""
-    elif target_group == "ESL":
-        instruction = "patients who speak English as a second language"
-        examples = """
-EXAMPLE 1:
-ORIGINAL: 
-Patient is a 58-year-old female who presents with acute onset of severe headache, photophobia, and nuchal rigidity. CT scan negative for hemorrhage. Lumbar puncture performed, results pending. Started on empiric antibiotics for presumed meningitis.
-
-SIMPLIFIED:
-YOUR MEDICAL SITUATION
-
-Your symptoms:
-• You have a sudden, very bad headache
-• Bright light hurts your eyes
-• Your neck feels stiff and painful
-
-Tests we did:
-• Head scan (CT): No bleeding was found in your brain
-• Spinal fluid test: We took some fluid from your spine to test it. We are waiting for results.
-
-Current treatment:
-• We started you on strong antibiotics through your IV
-• These medications fight infection
-
-What we think might be happening:
-We are concerned you might have an infection around your brain and spinal cord. This is called "meningitis."
-
-Next steps:
-• You need to stay in the hospital
-• We will check your test results when they are ready
-• We will watch you closely for any changes
-
-EXAMPLE 2:
-ORIGINAL:
-Patient with history of CHF presents with increased dyspnea, orthopnea, and peripheral edema. BNP elevated at 850 pg/mL. CXR shows pulmonary edema and cardiomegaly. Started on IV furosemide and increased ACE inhibitor dosage.
-
-SIMPLIFIED:
-YOUR HEART CONDITION
-
-Your symptoms now:
-• You are having trouble breathing
-• You cannot breathe well when lying flat
-• Your legs and ankles are swollen
-
-Your test results:
-• Blood test: Shows your heart is under stress
-• Chest X-ray: Shows fluid in your lungs and your heart is enlarged
-
-Your treatment plan:
-• Water pill through IV: This helps remove extra fluid from your body
-• Increased dose of your heart medicine: This helps your heart work better
-
-What is happening:
-Your heart failure is getting worse right now. This means your heart is not pumping blood well enough. This causes fluid to build up in your lungs and legs.
-
-Important information:
-• You need to limit salt in your food
-• You need to limit how much liquid you drink
-• You should weigh yourself every day
-• Call us if you gain more than 2 kg (4 pounds) in one day
-"""
-    else:  # General
-        instruction = "patients with limited health literacy"
-        examples = """
-EXAMPLE 1:
-ORIGINAL: 
-Patient is a 67-year-old male with hypertension, hyperlipidemia, and type 2 diabetes mellitus. Patient reports dyspnea on exertion and orthopnea. Physical examination reveals bilateral lower extremity edema.
-
-SIMPLIFIED:
-You are a 67-year-old man with high blood pressure, high cholesterol, and type 2 diabetes. You mentioned feeling short of breath during activity and when lying flat. During the exam, we noticed swelling in both of your legs.
-
-EXAMPLE 2:
-ORIGINAL:
-Patient presents with persistent cough for 2 weeks, associated with low-grade fever and myalgia. Chest auscultation reveals rhonchi in the right lower lobe. WBC count elevated at 11,000.
-
-SIMPLIFIED:
-You came in with a cough that has lasted for 2 weeks, along with a mild fever and muscle aches. When listening to your lungs, we heard abnormal breathing sounds in the lower right part of your lungs. Your white blood cell count is high at 11,000, which might indicate an infection.
-"""
-    
-    prompt = f"""
-I'll show you how to simplify medical notes for {instruction}. Here are some examples:
-
-{examples}
-
-Now, please simplify the following medical note in a similar way:
-
-{medical_note}
-"""
+# Function to get the LLM backend for this session (LLM_BACKEND=mock runs the app offline,
+# LLM_MOCK_LATENCY sets the seconds each mock call takes)
+def get_llm_backend():
+    if os.environ.get("LLM_BACKEND") == "mock":
+        backend = MockBackend(latency=float(os.environ.get("LLM_MOCK_LATENCY", "1.0")))
+    else:
+        backend = OpenAIBackend(api_key=st.session_state.get("openai_api_key"))
+    scrubber = get_phi_scrubber()
+    return PhiScrubbingBackend(backend, scrubber) if scrubber is not None else backend
+
+# Function to open the shared history database (one store per server process, shared by all sessions).
+# Point HISTORY_DB_PATH at the same file to share history between app processes on one host.
+@st.cache_resource
+def get_history_store():
+    store = HistoryStore(
+        os.environ.get("HISTORY_DB_PATH", Path("streamlit_cache") / "history.db"),
+        scrubber=get_phi_scrubber()
+    )
     
+    # Import history saved by earlier versions of the app
     try:
-        response = openai.ChatCompletion.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that specializes in making medical information accessible to patients."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=temp,
-            max_tokens=1000
-        )
-        
-        return response.choices[0].message["content"].strip()
+        store.migrate_pickle(Path("streamlit_cache") / "processing_history.pkl")
     except Exception as e:
-        return f"Error: {str(e)}"
-
-def chain_of_thought_simplification(medical_note, target_group="General", model="gpt-3.5-turbo", temp=0.3):
-    """Simplifies a medical note using chain of thought prompting approach."""
-    
-    # Customize for target patient group
-    if target_group == "Elderly":
-        audience = "elderly patients (70+ years) who may have some vision or hearing difficulties"
-        specific_instructions = "Use larger conceptual chunks, clear organization with headings, and avoid information overload."
-    elif target_group == "Low Literacy":
-        audience = "patients with low health literacy (reading at a 4th-5th grade level)"
-        specific_instructions = "Use very simple words (1-2 syllables when possible), short sentences, and concrete examples."
-    elif target_group == "ESL":
-        audience = "patients who speak English as a second language"
-        specific_instructions = "Use common everyday vocabulary, avoid idioms and cultural references, and use consistent terminology."
-    else:  # General
-        audience = "patients with limited health literacy"
-        specific_instructions = "Use plain language at approximately an 8th grade reading level."
-    
-    prompt = f"""
-Please simplify the following medical note for {audience}. Think step by step:
-
-1. First, identify all medical terms and jargon that need simplification
-2. Determine the core medical information that must be preserved
-3. Reorganize the information in a more logical flow for the patient
-4. Rewrite each section using plain language appropriate for the patient
-5. Add brief explanations for medical terms and values when needed
-6. Ensure all important information is included and accurate
-7. Format the information in a patient-friendly way with clear headings
-8. Check that the simplification addresses these specific needs: {specific_instructions}
-
-Medical Note:
-{medical_note}
-
-Now, first identify the medical terms that need simplification:
-"""
+        st.warning(f"Could not import legacy history: {str(e)}")
     
+    return store
+
+# Function to save results to the history database
+def save_to_history(original_note, simplified_note, method, target_group, metrics, model=None):
     try:
-        response = openai.ChatCompletion.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that specializes in making medical information accessible to patients."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=temp,
-            max_tokens=1500
-        )
-        
-        return response.choices[0].message["content"].strip()
+        get_history_store().add(original_note, simplified_note, method, target_group, metrics, model=model)
     except Exception as e:
-        return f"Error: {str(e)}"
-
-def tree_of_thoughts_simplification(medical_note, target_group="General", model="gpt-3.5-turbo", temp=0.3):
-    """Simplifies a medical note using tree of thoughts approach."""
-    
-    # Customize for target patient group
-    if target_group == "Elderly":
-        audience = "elderly patients (70+ years) who may have some vision or hearing difficulties"
-        specific_instructions = "larger conceptual chunks, clear organization with headings, and avoid information overload"
-    elif target_group == "Low Literacy":
-        audience = "patients with low health literacy (reading at a 4th-5th grade level)"
-        specific_instructions = "very simple words (1-2 syllables when possible), short sentences, and concrete examples"
-    elif target_group == "ESL":
-        audience = "patients who speak English as a second language"
-        specific_instructions = "common everyday vocabulary, no idioms or cultural references, and consistent terminology"
-    else:  # General
-        audience = "patients with limited health literacy"
-        specific_instructions = "plain language at approximately an 8th grade reading level"
-    
-    prompt = f"""
-I will simplify this medical note for {audience} by exploring different approaches and selecting the best one.
-
-Medical Note:
-{medical_note}
-
-Approach 1: Focus on simplifying vocabulary while maintaining the structure
-- Identify all medical terms
-- Replace with simpler alternatives or brief explanations
-- Keep the original structure of the note
-- Use {specific_instructions}
-
-Approach 2: Restructure the note to be more narrative and conversational
-- Convert the note into a summary of what happened and what it means
-- Use second-person perspective ("you have..." instead of "patient has...")
-- Group related information together regardless of original structure
-- Use {specific_instructions}
+        st.warning(f"Could not save history to disk: {str(e)}")
 
-Approach 3: Create a hybrid approach with simplified sections and explanations
-- Keep key sections (history, medications, etc.) but rename them to be more patient-friendly
-- Simplify the language within each section
-- Add brief explanations of what each section means for the patient's health
-- Use {specific_instructions}
+# Function to record the telemetry of an LLM call for the performance dashboard
+def record_llm_call(method, target_group, telemetry):
+    try:
+        get_history_store().add_llm_call(method, target_group, telemetry)
+    except Exception as e:
+        st.warning(f"Could not save LLM call telemetry: {str(e)}")
+
+# Function to save a note finished by a background job like a note simplified in the demo.
+# Runs on the runner thread, outside any session, so it writes straight to the store; if saving
+# fails, the runner marks the note as failed with the error.
+def save_job_result(store, job, result):
+    if result["telemetry"]:
+        store.add_llm_call(job["method"], job["target_group"], result["telemetry"])
+    if not result["error"]:
+        store.add(
+            result["original_note"],
+            result["simplified_note"],
+            job["method"],
+            job["target_group"],
+            result["metrics"],
+            model=job["model"]
+        )
 
-Let me evaluate each approach for this specific note:
+# Function to profile a background job, if an admin asked for the next jobs to be profiled.
+# Samples the runner thread and the simplification worker threads.
+def profile_job(schedule, job_id):
+    return schedule.profile(
+        "job",
+        f"job_{job_id}",
+        threads=lambda thread: thread.name.startswith(("job-runner", "simplify"))
+    )
 
-Approach 1 Evaluation:
+# Function to resolve a server path entered on the demo page. The path must be the configured export
+# location or inside it, so the page cannot be used to read other files on the server.
+def resolve_export_path(path, root):
+    root = Path(root).resolve()
+    resolved = Path(path).resolve()
+    if resolved != root and root not in resolved.parents:
+        raise ValueError(f"{path} is outside {root}")
+    return resolved
+
+# Function to start the background job runner (one per server process, shared by all sessions).
+# Jobs are kept in JOB_DB_PATH, so their progress and results survive reruns and restarts.
+@st.cache_resource
+def get_job_runner():
+    job_queue = JobQueue(os.environ.get("JOB_DB_PATH", Path("streamlit_cache") / "jobs.db"), scrubber=get_phi_scrubber())
+    return JobRunner(
+        job_queue,
+        on_result=functools.partial(save_job_result, get_history_store()),
+        max_workers=int(os.environ.get("JOB_WORKERS", "4")),
+        profile_job=functools.partial(profile_job, get_profile_schedule())
+    )
 
-Approach 2 Evaluation:
+# Function to render a trace as a waterfall of its stages, one bar per stage on a shared time axis
+def render_waterfall(trace_dict):
+    total_ms = max(trace_dict["duration_ms"], 1e-6)
+    rows = []
+    for row in waterfall_rows(trace_dict):
+        offset = row["start_ms"] / total_ms * 100
+        width = max(row["duration_ms"] / total_ms * 100, 0.5)
+        details = ", ".join(f"{key}={value}" for key, value in row["attributes"].items() if value is not None)
+        rows.append(
+            f"<div class='waterfall-row' title='{html.escape(details, quote=True)}'>"
+            f"<span class='waterfall-label' style='padding-left: {row['depth']}rem'>{html.escape(row['name'])}</span>"
+            f"<span class='waterfall-track'><span class='waterfall-bar waterfall-depth-{min(row['depth'], 3)}' "
+            f"style='margin-left: {offset:.2f}%; width: {min(width, 100 - offset):.2f}%'></span></span>"
+            f"<span class='waterfall-time'>{row['duration_ms']:.1f} ms</span>"
+            f"</div>"
+        )
+    return "<div class='waterfall'>" + "".join(rows) + "</div>"
+
+# Function to show the background jobs with their progress and latest results.
+# Reruns on its own every few seconds while a job of this process is running.
+def render_background_jobs():
+    job_runner = get_job_runner()
+    jobs = job_runner.job_queue.jobs(limit=10)
+    if not jobs:
+        st.info("No background runs yet.")
+        return
+    
+    for job in jobs:
+        with st.container(border=True):
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                st.markdown(f"**Run {job['id']}** · {job['method']} · {job['target_group']} · {job['model']} · queued {job['created']}")
+                st.progress(job["progress"], text=f"{job['done']} of {job['total']} notes ({job['failed_items']} failed) · {job['status']}")
+            with col2:
+                if job["status"] in ("queued", "running"):
+                    if job_runner.is_attached(job["id"]):
+                        if st.button("Cancel", key=f"cancel_job_{job['id']}"):
+                            job_runner.cancel(job["id"])
+                            st.rerun(scope="fragment")
+                    elif st.button("Resume", key=f"resume_job_{job['id']}", help="This run was interrupted by a restart"):
+                        job_runner.resume(job["id"], get_llm_backend())
+                        st.rerun(scope="fragment")
+            
+            if job["done"]:
+                with st.expander("Latest results"):
+                    st.dataframe(
+                        [
+                            {
+                                "Note": item["position"] + 1,
+                                "Status": item["status"],
+                                "Readability": f"{item['metrics']['readability_score']:.1f}" if item["metrics"] else "",
+                                "Term Density": f"{item['metrics']['term_density']:.1f}%" if item["metrics"] else "",
+                                "Length Ratio": f"{item['metrics']['length_ratio']:.2f}" if item["metrics"] else "",
+                                "Error": item["error"] or ""
+                            }
+                            for item in job_runner.job_queue.results(job["id"], limit=20)
+                        ],
+                        hide_index=True
+                    )
+
+# Sort options for the Processing History table (label -> database column)
+HISTORY_SORT_COLUMNS = {
+    "ID": "id",
+    "Timestamp": "timestamp",
+    "Method": "method",
+    "Target Group": "target_group",
+    "Model": "model",
+    "Readability": "readability_score",
+    "Term Density": "term_density",
+    "Length Ratio": "length_ratio"
+}
 
-Approach 3 Evaluation:
+# Function to format history rows for display in the Processing History table
+def format_history_rows(rows):
+    return [
+        {
+            'ID': row['id'],
+            'Timestamp': row['timestamp'],
+            'Method': row['method'],
+            'Target Group': row['target_group'],
+            'Model': row['model'],
+            'Readability': f"{row['readability_score']:.1f}",
+            'Term Density': f"{row['term_density']:.1f}%",
+            'Length Ratio': f"{row['length_ratio']:.2f}"
+        }
+        for row in rows
+    ]
 
-Based on my evaluation, the most effective approach for this specific case is:
+# Time windows offered by the performance dashboard (None keeps the selected date range)
+PERFORMANCE_WINDOWS = {
+    "Selected dates": None,
+    "Last hour": timedelta(hours=1),
+    "Last 24 hours": timedelta(days=1),
+    "Last 7 days": timedelta(days=7)
+}
 
-Here's the simplified note using the best approach:
-"""
-    
-    try:
-        response = openai.ChatCompletion.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that specializes in making medical information accessible to patients."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=temp,
-            max_tokens=1500
+# Function to summarize the recorded LLM calls for the performance dashboard. The LLM call version
+# (the latest llm_calls id) is part of the cache key, so the calls are only read again once new
+# calls are recorded or the filters change.
+@st.cache_data(max_entries=64, show_spinner=False)
+def summarize_llm_calls(group_by, since, llm_call_version, history_filters):
+    return get_history_store().llm_call_summary(group_by=group_by, since=since, **history_filters)
+
+# Function to format LLM call statistics for the performance dashboard
+def format_performance_rows(rows, breakdown_labels, since=None):
+    table = []
+    for row in rows:
+        latency = row['metrics']['latency']
+        ttft = row['metrics']['time_to_first_token']
+        
+        # Calls per minute over the time window, or over the span of the calls without one
+        first_call = since or datetime.strptime(row['first_call'], '%Y-%m-%d %H:%M:%S')
+        last_call = datetime.now() if since else datetime.strptime(row['last_call'], '%Y-%m-%d %H:%M:%S')
+        minutes = max((last_call - first_call).total_seconds() / 60, 1)
+        
+        entry = {label: row[AGGREGATE_BREAKDOWNS[label]] for label in breakdown_labels}
+        entry.update({
+            'Calls': row['calls'],
+            'Calls/min': row['calls'] / minutes,
+            'p50 Latency (s)': latency.quantile(0.5),
+            'p90 Latency (s)': latency.quantile(0.9),
+            'p99 Latency (s)': latency.quantile(0.99),
+            'p50 TTFT (s)': ttft.quantile(0.5),
+            'p90 TTFT (s)': ttft.quantile(0.9),
+            'Tokens/s': row['metrics']['tokens_per_second'].mean,
+            'Error Rate (%)': 100 * row['errors'] / row['calls'],
+            'Retry Rate (%)': 100 * row['retried'] / row['calls']
+        })
+        table.append(entry)
+    return table
+
+# Function to build the Processing History CSV export. Passed to st.download_button as a callable,
+# so the file is only built when the button is clicked, one page of rows at a time.
+def build_history_csv(history_store, history_filters, batch_size=5000):
+    buffer = StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=['ID', 'Timestamp', 'Method', 'Target Group', 'Model', 'Readability', 'Term Density', 'Length Ratio'])
+    writer.writeheader()
+    
+    offset = 0
+    while True:
+        rows = history_store.page(limit=batch_size, offset=offset, **history_filters)
+        if not rows:
+            break
+        writer.writerows(format_history_rows(rows))
+        offset += len(rows)
+    
+    return buffer.getvalue()
+
+# Function to show the progress of the session's PDF report job, then its download button. Runs as a
+# fragment that reruns every second while the report is built, so the rest of the page stays usable.
+def render_report_job(polling):
+    report_job = st.session_state.get('report_job')
+    if report_job is None:
+        return
+    if polling and not report_job.running:
+        # Rerun the whole page once, which stops the polling
+        st.rerun()
+    
+    st.progress(report_job.progress)
+    if report_job.running:
+        st.caption(f"Rendering report: {report_job.items_done} of {report_job.total_items} items")
+    elif report_job.status == "done":
+        st.caption(f"Report ready: {report_job.total_items} items on {report_job.page_count} pages")
+        st.download_button(
+            "Download PDF Report",
+            data=report_job.path.read_bytes,
+            file_name="simplification_report.pdf",
+            mime="application/pdf"
         )
-        
-        return response.choices[0].message["content"].strip()
-    except Exception as e:
-        return f"Error: {str(e)}"
-
-# Function to calculate readability score (Flesch Reading Ease)
-def calculate_readability(text):
-    sentences = len(re.split(r'[.!?]+', text))
-    words = len(re.findall(r'\b\w+\b', text))
-    syllables = 0
-    for word in re.findall(r'\b\w+\b', text.lower()):
-        syllables += max(1, len(re.findall(r'[aeiouy]+', word)))
-    
-    if sentences == 0 or words == 0:
-        return 0
-    
-    flesch_score = 206.835 - 1.015 * (words / sentences) - 84.6 * (syllables / words)
-    return max(0, min(100, flesch_score))  # Clip between 0 and 100
-
-# Function to calculate medical term density
-def calculate_medical_term_density(text):
-    # Sample list of medical terms (would be expanded in a real application)
-    medical_terms = [
-        'hypertension', 'diabetes', 'mellitus', 'dyspnea', 'orthopnea', 'edema',
-        'hyperlipidemia', 'myocardial', 'infarction', 'stroke', 'arrhythmia',
-        'tachycardia', 'bradycardia', 'fibrillation', 'cholesterol', 'triglycerides',
-        'glucose', 'insulin', 'hyperglycemia', 'hypoglycemia', 'neuropathy',
-        'retinopathy', 'nephropathy', 'cardiomyopathy', 'angina', 'stent',
-        'bypass', 'angioplasty', 'catheterization', 'echocardiogram', 'electrocardiogram',
-        'coronary', 'atherosclerosis', 'atrial', 'congestive', 'creatinine',
-        'hemoglobin', 'ldl', 'troponin', 'bnp', 'copd', 'gerd', 'prn', 'bid',
-        'chronic', 'obstructive', 'pulmonary', 'gastroesophageal', 'reflux',
-        'albuterol', 'fluticasone', 'salmeterol', 'omeprazole', 'sertraline',
-        'metoprolol', 'warfarin', 'furosemide', 'lisinopril', 'atorvastatin',
-        'metformin', 'SpO2', 'FEV1', 'FVC'
-    ]
-    
-    words = re.findall(r'\b\w+\b', text.lower())
-    word_count = len(words)
-    
-    if word_count == 0:
-        return 0
-    
-    medical_term_count = sum(1 for word in words if word in medical_terms)
-    
-    return (medical_term_count / word_count) * 100  # Return as a percentage
-
-# Function to download results as text file
-def get_download_link(text, filename="simplified_medical_note.txt"):
-    b64 = base64.b64encode(text.encode()).decode()
-    href = f'<a href="data:file/txt;base64,{b64}" download="{filename}">Download as Text File</a>'
-    return href
+    else:
+        st.error(f"Could not generate the report: {str(report_job.error)}")
+
+# Function to delete generated files older than max_age from a cache directory. Downloads are read
+# lazily when the button is clicked, so files are kept long enough for their session to fetch them.
+def remove_old_files(directory, max_age=timedelta(hours=1)):
+    cutoff = time.time() - max_age.total_seconds()
+    for path in Path(directory).glob("*"):
+        try:
+            if path.is_file() and path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass  # Removed by another session
+
+SOURCE_ZIP_README = """
+# Medical Note Simplification with LLMs
 
-# Function to save results to session_state history
-def save_to_history(original_note, simplified_note, method, target_group, metrics):
-    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-    
-    history_item = {
-        "timestamp": timestamp,
-        "method": method,
-        "target_group": target_group,
-        "original_note": original_note,
-        "simplified_note": simplified_note,
-        "metrics": metrics
-    }
-    
-    st.session_state.processing_history.append(history_item)
-    
-    # Save to disk as well (for persistence between sessions)
-    try:
-        history_file = st.session_state.cache_dir / "processing_history.pkl"
-        with open(history_file, 'wb') as f:
-            pickle.dump(st.session_state.processing_history, f)
-    except Exception as e:
-        st.warning(f"Could not save history to disk: {str(e)}")
-  # Function to save results to session_state history
-def save_to_history(original_note, simplified_note, method, target_group, metrics):
-    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-    
-    history_item = {
-        "timestamp": timestamp,
-        "method": method,
-        "target_group": target_group,
-        "original_note": original_note,
-        "simplified_note": simplified_note,
-        "metrics": metrics
-    }
-    
-    st.session_state.processing_history.append(history_item)
-    
-    # Save to disk as well (for persistence between sessions)
-    try:
-        history_file = st.session_state.cache_dir / "processing_history.pkl"
-        with open(history_file, 'wb') as f:
-            pickle.dump(st.session_state.processing_history, f)
-    except Exception as e:
-        st.warning(f"Could not save history to disk: {str(e)}")
+This Streamlit application demonstrates how to use LLMs to simplify medical notes for various patient populations.
 
-# Function to load processing history from disk
-def load_history():
-    try:
-        history_file = st.session_state.cache_dir / "processing_history.pkl"
-        if history_file.exists():
-            with open(history_file, 'rb') as f:
-                return pickle.load(f)
-    except Exception as e:
-        st.warning(f"Could not load history from disk: {str(e)}")
-    
-    return []
+## Features
 
-# Try to load history at startup
-if len(st.session_state.processing_history) == 0:
-    st.session_state.processing_history = load_history()
+- Multiple LLM prompting techniques (Zero-Shot, Few-Shot, Chain of Thought, Tree of Thoughts)
+- Patient-specific simplification (General, Elderly, Low Literacy, ESL)
+- Quantitative evaluation metrics
+- Result visualization and analysis
+- Export functionality
 
-# Function to generate a report as a PDF
-def generate_report(history_items):
-    import matplotlib.pyplot as plt
-    from matplotlib.backends.backend_pdf import PdfPages
-    from matplotlib.ticker import MaxNLocator
-    from datetime import datetime
-    
-    pdf_buffer = BytesIO()
-    
-    with PdfPages(pdf_buffer) as pdf:
-        # Title page
-        plt.figure(figsize=(8.5, 11))
-        plt.text(0.5, 0.9, "Medical Note Simplification Report", ha='center', fontsize=24)
-        plt.text(0.5, 0.85, f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", ha='center', fontsize=14)
-        plt.text(0.5, 0.8, f"Contains analysis of {len(history_items)} simplified notes", ha='center', fontsize=14)
-        plt.axis('off')
-        pdf.savefig()
-        plt.close()
-        
-        # Summary statistics
-        plt.figure(figsize=(8.5, 11))
-        plt.subplot(2, 1, 1)
-        
-        # Group by method
-        methods = [item['method'] for item in history_items]
-        unique_methods = list(set(methods))
-        method_counts = [methods.count(m) for m in unique_methods]
-        
-        plt.bar(unique_methods, method_counts)
-        plt.title('Notes Simplified by Method')
-        plt.ylabel('Count')
-        plt.subplot(2, 1, 2)
-        
-        # Average readability by method
-        readability_by_method = {}
-        for method in unique_methods:
-            scores = [item['metrics']['readability_score'] for item in history_items if item['method'] == method]
-            readability_by_method[method] = sum(scores) / len(scores) if scores else 0
-        
-        methods = list(readability_by_method.keys())
-        scores = list(readability_by_method.values())
-        
-        plt.bar(methods, scores)
-        plt.title('Average Readability Score by Method')
-        plt.ylabel('Flesch Reading Ease Score')
-        
-        plt.tight_layout()
-        pdf.savefig()
-        plt.close()
-        
-        # Include sample notes (first 3 at most)
-        for i, item in enumerate(history_items[:3]):
-            plt.figure(figsize=(8.5, 11))
-            plt.text(0.5, 0.95, f"Sample Simplification #{i+1}", ha='center', fontsize=16)
-            plt.text(0.5, 0.9, f"Method: {item['method']} | Target: {item['target_group']}", ha='center', fontsize=12)
-            
-            # Metrics
-            metrics = item['metrics']
-            plt.text(0.5, 0.85, f"Readability: {metrics['readability_score']:.1f}/100 | Term Density: {metrics['term_density']:.1f}% | Length Ratio: {metrics['length_ratio']:.2f}", ha='center', fontsize=10)
-            
-            # Original note (truncated if very long)
-            original = item['original_note']
-            if len(original) > 500:
-                original = original[:500] + "..."
-            
-            wrapped_original = textwrap.fill(original, width=80)
-            plt.text(0.1, 0.8, "ORIGINAL NOTE:", fontsize=10, fontweight='bold')
-            plt.text(0.1, 0.78, wrapped_original, fontsize=8, va='top', linespacing=1.5)
-            
-            # Simplified note (truncated if very long)
-            simplified = item['simplified_note']
-            if len(simplified) > 500:
-                simplified = simplified[:500] + "..."
-                
-            wrapped_simplified = textwrap.fill(simplified, width=80)
-            plt.text(0.1, 0.45, "SIMPLIFIED NOTE:", fontsize=10, fontweight='bold')
-            plt.text(0.1, 0.43, wrapped_simplified, fontsize=8, va='top', linespacing=1.5)
-            
-            plt.axis('off')
-            pdf.savefig()
-            plt.close()
-    
-    pdf_buffer.seek(0)
-    return pdf_buffer
+## Installation
 
-# Prepare materials for the Tutorial tab
-def load_tutorial_content():
-    # Introduction Section
-    introduction = """
-    # Using LLMs for Medical Note Simplification
-    
-    This tutorial demonstrates how to apply Large Language Models (LLMs) to simplify medical notes and make healthcare information more accessible to patients with different levels of health literacy.
-    
-    ## The Healthcare Challenge
-    
-    Medical notes are written for healthcare professionals, not patients. They contain complex terminology, abbreviations, and clinical language that can be difficult for patients to understand. This communication barrier can lead to:
-    
-    - Confusion about diagnoses and treatment plans
-    - Poor medication adherence
-    - Increased anxiety about health conditions
-    - Reduced patient engagement in care
-    
-    According to research, approximately 36% of US adults have limited health literacy, making medical documents particularly challenging to understand.
-    
-    ## The Solution: LLM-Assisted Simplification
-    
-    Large Language Models like GPT can be used to translate complex medical information into more accessible language while preserving critical clinical details. This tutorial demonstrates how to use different prompting techniques to achieve optimal results.
-    """
-    
-    # Dataset Information
-    dataset_info = """
-    ## Dataset: Synthea™ Synthetic Patient Data
-    
-    This tutorial uses **Synthea™** - an open-source synthetic patient generator that creates realistic but not real patient data. This allows us to work with medical data without privacy concerns.
-    
-    ### About Synthea Data:
-    
-    - 100% synthetic - contains no real protected health information (PHI)
-    - Follows realistic clinical patterns and disease progression
-    - Uses standard medical coding systems (ICD-10, LOINC, etc.)
-    - Available in multiple formats (CSV, FHIR, etc.)
-    
-    The examples in this tutorial use a dataset containing 100 synthetic patients with various medical conditions, medications, and laboratory results.
-    """
-    
-    # Prompting Methods
-    prompting_methods = """
-    ## LLM Prompting Methods
-    
-    This tutorial explores four different prompting techniques for medical note simplification:
-    
-    ### 1. Zero-Shot Prompting
-    
-    Direct instructions without examples - relies on the model's pre-trained knowledge of medical terminology and plain language.
-    
-    ### 2. Few-Shot (In-Context Learning)
-    
-    Provides examples of medical notes paired with their simplified versions before asking the model to simplify a new note.
-    
-    ### 3. Chain of Thought (CoT)
-    
-    Guides the model through a step-by-step reasoning process for simplification, breaking down the task into explicit steps.
-    
-    ### 4. Tree of Thoughts (ToT)
-    
-    Explores multiple approaches to simplification, evaluates each, and selects the most effective one for the specific note.
-    """
-    
-    # Patient-Specific Approaches
-    patient_specific = """
-    ## Patient-Specific Approaches
-    
-    Different patient populations have different communication needs. This tutorial explores tailoring simplified notes for:
-    
-    ### Elderly Patients (70+ years)
-    - Larger conceptual chunks
-    - Clear organization with headings
-    - More context for medical terms
-    - Avoiding information overload
-    
-    ### Low Health Literacy Patients
-    - Very simple vocabulary (4th-5th grade level)
-    - Short sentences (8-10 words)
-    - Concrete examples and analogies
-    - Avoiding abbreviations
-    
-    ### ESL Patients (English as Second Language)
-    - Common vocabulary
-    - Avoiding idioms and cultural references
-    - Explicit connections between ideas
-    - Consistent terminology
-    
-    ### General Patients
-    - 8th grade reading level (standard health communication)
-    - Balance between simplicity and completeness
-    """
-    
-    # Evaluation Methods
-    evaluation_methods = """
-    ## Evaluation Methods
-    
-    How do we measure the success of our simplification efforts? This tutorial uses both quantitative and qualitative metrics:
-    
-    ### Quantitative Metrics
-    
-    1. **Flesch Reading Ease Score**
-       - Measures text readability from 0-100
-       - Higher scores indicate easier reading
-       - Target: 70-80 for general audiences (7th-8th grade level)
-    
-    2. **Medical Term Density**
-       - Percentage of specialized medical terms in the text
-       - Lower percentages indicate better simplification
-       - Calculated by comparing against a medical terminology dictionary
-    
-    3. **Length Ratio**
-       - Ratio of simplified text length to original note length
-       - Values near 1.0 indicate preserving information while reducing complexity
-       - Too low may indicate lost information; too high may indicate verbosity
-    
-    ### Qualitative Analysis
-    
-    1. **Information Accuracy**
-       - Are all essential diagnoses preserved?
-       - Are medication details accurately translated?
-       - Are test results presented with proper context?
-    
-    2. **Clarity of Explanations**
-       - How well are medical terms explained?
-       - Is context provided for values and results?
-       - Is there a logical flow to the information?
-    
-    3. **Organization and Structure**
-       - Is information grouped logically?
-       - Are headings clear and informative?
-       - Is the most important information prioritized?
-    """
-    
-    return {
-        "introduction": introduction,
-        "dataset_info": dataset_info,
-        "prompting_methods": prompting_methods,
-        "patient_specific": patient_specific,
-        "evaluation_methods": evaluation_methods
-    }
+```
+pip install -r requirements.txt
+```
 
-# Code examples for the Code tab
-def load_code_examples():
-    zero_shot_code = """
-# Zero-Shot Prompting
-def zero_shot_simplification(medical_note, target_group="General"):
-    # Customize for target patient group
-    if target_group == "Elderly":
-        audience = "elderly patients (70+ years)"
-        specific_instructions = "Use clear organization with headings."
-    elif target_group == "Low Literacy":
-        audience = "patients with low health literacy (4th-5th grade level)"
-        specific_instructions = "Use simple words and short sentences."
-    else:  # General or ESL
-        audience = "patients with limited health literacy"
-        specific_instructions = "Use plain language at 8th grade level."
-    
-    prompt = f'''
-Please simplify the following medical note for {audience}:
-
-{medical_note}
-
-The simplified note should:
-- Use plain language instead of medical jargon
-- Maintain all important medical information
-- Be organized in a clear structure
-- Explain medical terms when necessary
-- {specific_instructions}
-'''
-    
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You specialize in making medical information accessible."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.3,
-        max_tokens=1000
-    )
-    
-    return response.choices[0].message["content"].strip()
-"""
+## Usage
 
-    few_shot_code = """
-# Few-Shot (In-Context Learning) Prompting
-def few_shot_simplification(medical_note, target_group="General"):
-    # Define example pairs (original → simplified)
-    examples = '''
-EXAMPLE 1:
-ORIGINAL: 
-Patient is a 67-year-old male with hypertension, hyperlipidemia, and type 2 diabetes mellitus.
-
-SIMPLIFIED:
-You are a 67-year-old man with high blood pressure, high cholesterol, and type 2 diabetes.
-
-EXAMPLE 2:
-ORIGINAL:
-Patient presents with persistent cough for 2 weeks, associated with low-grade fever and myalgia.
-
-SIMPLIFIED:
-You came in with a cough that has lasted for 2 weeks, along with a mild fever and muscle aches.
-'''
-    
-    prompt = f'''
-I'll show you how to simplify medical notes for patients with limited health literacy.
-Here are some examples:
-
-{examples}
-
-Now, please simplify the following medical note in a similar way:
-
-{medical_note}
-'''
-    
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You specialize in making medical information accessible."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.3,
-        max_tokens=1000
-    )
-    
-    return response.choices[0].message["content"].strip()
-"""
+```
+streamlit run app.py
+```
 
-    chain_of_thought_code = """
-# Chain of Thought Prompting
-def chain_of_thought_simplification(medical_note, target_group="General"):
-    prompt = f'''
-Please simplify the following medical note for patients with limited health literacy. Think step by step:
-
-1. First, identify all medical terms and jargon that need simplification
-2. Determine the core medical information that must be preserved
-3. Rewrite each section using plain language
-4. Ensure all important information is included and accurate
-5. Organize the information in a patient-friendly format
-
-Medical Note:
-{medical_note}
-
-Now, first identify the medical terms that need simplification:
-'''
-    
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You specialize in making medical information accessible."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.3,
-        max_tokens=1500
-    )
-    
-    return response.choices[0].message["content"].strip()
-"""
+Set `LLM_BACKEND=mock` to run the app offline, without an OpenAI API key.
 
-    tree_of_thoughts_code = """
-# Tree of Thoughts Prompting
-def tree_of_thoughts_simplification(medical_note, target_group="General"):
-    prompt = f'''
-I will simplify this medical note by exploring different approaches and selecting the best one.
+Identifiers in notes (IDs, names, dates, phone numbers, ...) are replaced with tokens such as `[ID_1]` before notes are sent to the LLM or saved to the history, and put back into the simplified note. Set `PHI_SCRUBBING=0` to turn this off.
 
-Medical Note:
-{medical_note}
+The prompting methods, metrics and history store are in the `medsimplify` package, which can be used without Streamlit:
 
-Approach 1: Focus on simplifying vocabulary while maintaining the structure
-- Identify all medical terms
-- Replace with simpler alternatives or brief explanations
-- Keep the original structure of the note
+```
+from medsimplify import simplify
 
-Approach 2: Restructure the note to be more narrative and conversational
-- Convert the note into a summary of what happened and what it means
-- Use second-person perspective ("you have..." instead of "patient has...")
-- Group related information together regardless of original structure
+result = simplify(medical_note, method="Chain of Thought", target_group="Elderly")
+```
 
-Approach 3: Create a hybrid approach with simplified sections and explanations
-- Keep key sections (history, medications, etc.) but rename them to be patient-friendly
-- Simplify the language within each section
-- Add brief explanations of what each section means for the patient's health
+## Requirements
 
-Let me evaluate each approach for this specific note:
+- Python 3.7+
+- OpenAI API key
+- Streamlit
+- Pandas
+- Matplotlib
+- NLTK
+```
+"""
 
-Approach 1 Evaluation:
+# Function to build the source code archive offered on the Code Examples tab
+def build_source_zip():
+    app_dir = Path(__file__).parent
+    zip_buffer = BytesIO()
+    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for source_file in sorted(app_dir.glob('*.py')) + [app_dir / 'requirements.txt']:
+            if source_file.exists():
+                zf.write(source_file, source_file.name)
+        for resource_file in sorted((app_dir / 'medsimplify').glob('*.py')) + sorted(CONTENT_DIR.rglob('*')):
+            if resource_file.is_file() and '__pycache__' not in resource_file.parts:
+                zf.write(resource_file, resource_file.relative_to(app_dir).as_posix())
+        zf.writestr('README.md', SOURCE_ZIP_README)
+    return zip_buffer.getvalue()
+
+# Breakdowns and metrics offered in the Detailed Statistics table
+AGGREGATE_BREAKDOWNS = {
+    "Method": "method",
+    "Target Group": "target_group",
+    "Model": "model"
+}
 
-Approach 2 Evaluation:
+AGGREGATE_METRICS = {
+    "Readability": "readability_score",
+    "Term Density": "term_density",
+    "Length Ratio": "length_ratio",
+    "Processing Time": "processing_time"
+}
 
-Approach 3 Evaluation:
+# Function to read the mean of a metric from an aggregate summary row
+def aggregate_mean(row, metric):
+    stats = row['metrics'].get(metric)
+    return stats.mean if stats else None
+
+# Function to format aggregate summary rows for the Detailed Statistics table
+def format_aggregate_rows(rows, breakdown_labels, metric):
+    table = []
+    for row in rows:
+        stats = row['metrics'].get(metric)
+        if stats is None:
+            continue
+        entry = {label: row[AGGREGATE_BREAKDOWNS[label]] for label in breakdown_labels}
+        entry.update({
+            'Count': stats.count,
+            'Mean': stats.mean,
+            'Std. Dev.': stats.stddev,
+            'Min': stats.minimum,
+            'p50': stats.quantile(0.5),
+            'p90': stats.quantile(0.9),
+            'p99': stats.quantile(0.99),
+            'Max': stats.maximum
+        })
+        table.append(entry)
+    return table
+
+TUTORIAL_CHART_CATEGORIES = ['Original', 'Zero-Shot', 'Few-Shot', 'Chain of Thought', 'Tree of Thoughts']
+TUTORIAL_CHART_COLORS = ['#d32f2f'] + METHOD_COLORS
+
+# Function to render the static Tutorial evaluation charts (cached for the lifetime of the server)
+@st.cache_data(show_spinner=False)
+def render_tutorial_chart(chart):
+    if chart == "readability":
+        return render_bar_chart(
+            TUTORIAL_CHART_CATEGORIES, [35, 50, 65, 75, 72], 'Flesch Reading Ease Score',
+            colors=TUTORIAL_CHART_COLORS, ylim=(0, 100), value_format="{}", figsize=(10, 5),
+            target_lines=[
+                {'y': 60, 'color': 'r', 'label': 'Minimum Target (60)', 'text_x': 4.2, 'text_y': 62},
+                {'y': 80, 'color': 'g', 'label': 'Ideal Target (80)', 'text_x': 4.2, 'text_y': 82}
+            ]
+        )
+    return render_bar_chart(
+        TUTORIAL_CHART_CATEGORIES, [12.5, 8.3, 6.2, 3.5, 4.1], 'Medical Term Density (%)',
+        colors=TUTORIAL_CHART_COLORS, ylim=(0, 15), value_format="{}%", figsize=(10, 5)
+    )
 
-Based on my evaluation, the most effective approach for this specific case is:
+RESULTS_CHART_TITLES = {
+    "readability": "Average Readability by Method",
+    "term_density": "Average Medical Term Density by Method",
+    "processing_time": "Average Processing Time by Method"
+}
 
-Here's the simplified note using the best approach:
-'''
-    
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You specialize in making medical information accessible."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.3,
-        max_tokens=1500
+# Function to render a Results Explorer chart. The history version (the latest history id) is
+# part of the cache key, so cached images are reused until new items are saved or the filters change.
+@st.cache_data(max_entries=64, show_spinner=False)
+def render_results_chart(chart, history_version, history_filters, fmt="png"):
+    summary_rows = get_history_store().aggregate_summary(group_by=("method",), **history_filters)
+    methods = [row['method'] for row in summary_rows]
+    colors = METHOD_COLORS[:len(methods)]
+
+    if chart == "readability":
+        values = [aggregate_mean(row, 'readability_score') or 0 for row in summary_rows]
+        return render_bar_chart(
+            methods, values, 'Flesch Reading Ease Score', title=RESULTS_CHART_TITLES[chart],
+            colors=colors, ylim=(0, 100),
+            target_lines=[{'y': 70, 'color': 'g', 'label': 'Target Readability (70)', 'text_y': 72}],
+            fmt=fmt
+        )
+    if chart == "term_density":
+        values = [aggregate_mean(row, 'term_density') or 0 for row in summary_rows]
+        return render_bar_chart(
+            methods, values, 'Medical Term Density (%)', title=RESULTS_CHART_TITLES[chart],
+            colors=colors, ylim=(0, max(values) * 1.2 or 1), value_format="{:.1f}%",
+            target_lines=[{'y': 5, 'color': 'g', 'label': 'Target Density (5%)', 'text_y': 5.2}],
+            fmt=fmt
+        )
+    values = [aggregate_mean(row, 'processing_time') or 0 for row in summary_rows]
+    return render_bar_chart(
+        methods, values, 'Processing Time (seconds)', title=RESULTS_CHART_TITLES[chart],
+        colors=colors, value_format="{:.1f}s", fmt=fmt
     )
-    
-    return response.choices[0].message["content"].strip()
-"""
 
-    evaluation_code = """
-# Evaluation Functions
-
-# Calculate readability score (Flesch Reading Ease)
-def calculate_readability(text):
-    sentences = len(re.split(r'[.!?]+', text))
-    words = len(re.findall(r'\\b\\w+\\b', text))
-    syllables = 0
-    for word in re.findall(r'\\b\\w+\\b', text.lower()):
-        syllables += max(1, len(re.findall(r'[aeiouy]+', word)))
-    
-    if sentences == 0 or words == 0:
-        return 0
-    
-    flesch_score = 206.835 - 1.015 * (words / sentences) - 84.6 * (syllables / words)
-    return max(0, min(100, flesch_score))  # Clip between 0 and 100
-
-# Calculate medical term density
-def calculate_medical_term_density(text):
-    # Sample medical term list (would be expanded in a real application)
-    medical_terms = [
-        'hypertension', 'diabetes', 'mellitus', 'dyspnea', 'orthopnea', 
-        'hyperlipidemia', 'myocardial', 'infarction', 'arrhythmia',
-        'tachycardia', 'bradycardia', 'fibrillation', 'cholesterol', 
-        'glucose', 'insulin', 'hyperglycemia', 'hypoglycemia'
-        # Add many more terms in a real application
-    ]
-    
-    words = re.findall(r'\\b\\w+\\b', text.lower())
-    word_count = len(words)
-    
-    if word_count == 0:
-        return 0
-    
-    medical_term_count = sum(1 for word in words if word in medical_terms)
-    
-    return (medical_term_count / word_count) * 100  # Return as a percentage
-"""
+# Prepare materials for the Tutorial tab (read once per server process)
+@st.cache_data(show_spinner=False)
+def load_tutorial_content():
+    return {name: load_resource(f"tutorial/{name}.md") for name in TUTORIAL_SECTIONS}
 
-    return {
-        "zero_shot": zero_shot_code,
-        "few_shot": few_shot_code,
-        "chain_of_thought": chain_of_thought_code,
-        "tree_of_thoughts": tree_of_thoughts_code,
-        "evaluation": evaluation_code
-    }
+# Code examples for the Code tab (read once per server process)
+@st.cache_data(show_spinner=False)
+def load_code_examples():
+    return {name: load_resource(f"code/{name}.py") for name in CODE_EXAMPLES}
 
 # Main app layout based on selected tab
 if st.session_state.current_tab == "tutorial":
@@ -1511,30 +935,7 @@ if st.session_state.current_tab == "tutorial":
         with col1:
             st.markdown("#### Flesch Reading Ease Score")
             
-            # Simple chart showing score ranges
-            chart_data = pd.DataFrame({
-                'Category': ['Original', 'Zero-Shot', 'Few-Shot', 'Chain of Thought', 'Tree of Thoughts'],
-                'Score': [35, 50, 65, 75, 72]
-            })
-            
-            fig, ax = plt.subplots(figsize=(10, 5))
-            bars = ax.bar(chart_data['Category'], chart_data['Score'], color=['#d32f2f', '#8884d8', '#82ca9d', '#ffc658', '#ff8042'])
-            ax.axhline(y=60, color='r', linestyle='--', alpha=0.7)
-            ax.axhline(y=80, color='g', linestyle='--', alpha=0.7)
-            ax.set_ylim(0, 100)
-            ax.set_ylabel('Flesch Reading Ease Score')
-            ax.text(4.2, 62, 'Minimum Target (60)', color='r', ha='right')
-            ax.text(4.2, 82, 'Ideal Target (80)', color='g', ha='right')
-            
-            for bar in bars:
-                height = bar.get_height()
-                ax.annotate(f'{height}',
-                            xy=(bar.get_x() + bar.get_width() / 2, height),
-                            xytext=(0, 3),
-                            textcoords="offset points",
-                            ha='center', va='bottom')
-            
-            st.pyplot(fig)
+            st.image(render_tutorial_chart("readability"))
             
             st.markdown("""
             **Interpreting the Scores:**
@@ -1550,28 +951,7 @@ if st.session_state.current_tab == "tutorial":
         with col2:
             st.markdown("#### Medical Term Density")
             
-            # Medical Term Density chart
-            term_data = pd.DataFrame({
-                'Category': ['Original', 'Zero-Shot', 'Few-Shot', 'Chain of Thought', 'Tree of Thoughts'],
-                'Density': [12.5, 8.3, 6.2, 3.5, 4.1]
-            })
-            
-            fig2, ax2 = plt.subplots(figsize=(10, 5))
-            bars2 = ax2.bar(term_data['Category'], term_data['Density'], color=['#d32f2f', '#8884d8', '#82ca9d', '#ffc658', '#ff8042'])
-            ax2.set_ylim(0, 15)
-            ax2.set_ylabel('Medical Term Density (%)')
-            
-            for bar in bars2:
-                height = bar.get_
-            for bar in bars2:
-                height = bar.get_height()
-                ax2.annotate(f'{height}%',
-                            xy=(bar.get_x() + bar.get_width() / 2, height),
-                            xytext=(0, 3),
-                            textcoords="offset points",
-                            ha='center', va='bottom')
-            
-            st.pyplot(fig2)
+            st.image(render_tutorial_chart("term_density"))
             
             st.markdown("""
             **Medical Term Density:**
@@ -1612,7 +992,7 @@ if st.session_state.current_tab == "tutorial":
             # Load your medical notes
             # For Synthea data, you might process CSVs to create notes
             def create_medical_note(patient_data, conditions, medications, observations):
-            note = f"""
+            note = f'''
             PATIENT MEDICAL NOTE
             Patient ID: {patient_data['Id']}
             Demographics: {patient_data['age']} year old {patient_data['GENDER']}, {patient_data['RACE']}, {patient_data['ETHNICITY']}
@@ -1624,7 +1004,7 @@ if st.session_state.current_tab == "tutorial":
             {', '.join(medications['DESCRIPTION'].tolist())}
         
             LABORATORY RESULTS:
-            """
+            '''
         
             for _, obs in observations.iterrows():
             note += f"- {obs['DATE']}: {obs['DESCRIPTION']} - {obs['VALUE']} {obs['UNITS']}\\n"
@@ -1731,12 +1111,30 @@ elif st.session_state.current_tab == "demo":
         medical_note = sample_notes[note_selection]
         st.text_area("Medical Note:", value=medical_note, height=300, disabled=True)
     
+    # What the parser found in the note (parsed notes are cached, so simplifying it reuses this)
+    parsed_note = parse_note(medical_note) if medical_note else None
+    if parsed_note is not None and parsed_note.sections:
+        with st.expander("Note structure"):
+            col1, col2 = st.columns(2)
+            with col1:
+                st.markdown("**Conditions**\n" + "".join(f"\n- {condition}" for condition in parsed_note.conditions))
+                st.markdown("**Medications**\n" + "".join(f"\n- {medication}" for medication in parsed_note.medications))
+            with col2:
+                # Lists rather than tables, so this page does not load pandas
+                st.markdown("**Laboratory Results**\n" + "".join(
+                    f"\n- {date}: {test} {value} {units}".rstrip() for date, test, value, units in parsed_note.observations
+                ))
+                st.markdown("**Encounters**\n" + "".join(
+                    f"\n- {date}: {description}" + (f" ({reason})" if reason else "")
+                    for date, description, reason in parsed_note.encounters
+                ))
+    
     # Prompting method selection
     st.subheader("Step 2: Choose Simplification Method")
     
     prompting_method = st.radio(
         "Select a prompting technique:",
-        options=["Zero-Shot", "Few-Shot (In-Context Learning)", "Chain of Thought", "Tree of Thoughts"],
+        options=list(METHODS),
         help="Different prompting techniques instruct the LLM in different ways"
     )
     
@@ -1783,7 +1181,7 @@ elif st.session_state.current_tab == "demo":
         
         target_group = st.radio(
             "Who is this simplified note for?",
-            options=["General", "Elderly", "Low Literacy", "ESL (English as Second Language)"],
+            options=list(TARGET_GROUPS),
             help="Different patient populations have different communication needs"
         )
         
@@ -1800,7 +1198,7 @@ elif st.session_state.current_tab == "demo":
             <b>Low Literacy Focus:</b> Very simple words (1-2 syllables), short sentences (8-10 words), and concrete examples.
             </div>
             """, unsafe_allow_html=True)
-        elif target_group == "ESL":
+        elif target_group.startswith("ESL"):
             st.markdown("""
             <div class="disclaimer">
             <b>ESL Patient Focus:</b> Common everyday vocabulary, no idioms or cultural references, and consistent terminology.
@@ -1840,117 +1238,190 @@ elif st.session_state.current_tab == "demo":
     if process_clicked and st.session_state.api_key_configured and medical_note:
         st.subheader("Step 4: Review Results")
         
-        with st.spinner("Simplifying medical note... Please wait."):
-            start_time = time.time()
-            
-            if prompting_method == "Zero-Shot":
-                simplified_note = zero_shot_simplification(
-                    medical_note, 
-                    target_group=target_group,
-                    model=model_choice,
-                    temp=temperature
-                )
-            elif prompting_method == "Few-Shot (In-Context Learning)":
-                simplified_note = few_shot_simplification(
-                    medical_note, 
-                    target_group=target_group,
-                    model=model_choice,
-                    temp=temperature
-                )
-            elif prompting_method == "Chain of Thought":
-                simplified_note = chain_of_thought_simplification(
-                    medical_note, 
+        # Time each stage of the request; the breakdown is shown below and written to the trace log
+        with trace("demo_simplify", method=prompting_method, target_group=target_group, model=model_choice) as demo_trace:
+            with st.spinner("Simplifying medical note... Please wait."):
+                result = simplify(
+                    medical_note,
+                    method=prompting_method,
                     target_group=target_group,
                     model=model_choice,
-                    temp=temperature
+                    temperature=temperature,
+                    backend=get_llm_backend()
                 )
-            else:  # Tree of Thoughts
-                simplified_note = tree_of_thoughts_simplification(
-                    medical_note, 
-                    target_group=target_group,
-                    model=model_choice,
-                    temp=temperature
-                )
-            
-            processing_time = time.time() - start_time
-        
-        if "Error:" in simplified_note:
-            st.error(simplified_note)
-        else:
-            # Display simplified note
-            st.markdown("### Simplified Medical Note")
-            st.markdown(f"<div class='highlight'>{simplified_note.replace(chr(10), '<br>')}</div>", unsafe_allow_html=True)
-            
-            # Calculate metrics
-            readability_score = calculate_readability(simplified_note)
-            original_readability = calculate_readability(medical_note)
-            term_density = calculate_medical_term_density(simplified_note)
-            original_term_density = calculate_medical_term_density(medical_note)
-            simplified_words = len(re.findall(r'\b\w+\b', simplified_note))
-            original_words = len(re.findall(r'\b\w+\b', medical_note))
-            length_ratio = simplified_words / original_words if original_words > 0 else 0
-            
-            metrics = {
-                "readability_score": readability_score,
-                "original_readability": original_readability,
-                "term_density": term_density,
-                "original_term_density": original_term_density,
-                "length_ratio": length_ratio,
-                "processing_time": processing_time
-            }
-            
-            # Save to history
-            save_to_history(medical_note, simplified_note, prompting_method, target_group, metrics)
-            
-            # Display metrics
-            st.markdown("### Evaluation Metrics")
             
-            col1, col2, col3 = st.columns(3)
+            if result["telemetry"]:
+                with span("record_telemetry"):
+                    record_llm_call(prompting_method, target_group, result["telemetry"])
             
+            if result["error"]:
+                st.error(f"Error: {result['error']}")
+            else:
+                simplified_note = result["simplified_note"]
+                metrics = result["metrics"]
+                
+                # Save to history
+                with span("save_history"):
+                    save_to_history(medical_note, simplified_note, prompting_method, target_group, metrics, model=model_choice)
+                
+                with span("render"):
+                    # Display simplified note
+                    st.markdown("### Simplified Medical Note")
+                    st.markdown(f"<div class='highlight'>{simplified_note.replace(chr(10), '<br>')}</div>", unsafe_allow_html=True)
+                    
+                    readability_score = metrics["readability_score"]
+                    original_readability = metrics["original_readability"]
+                    term_density = metrics["term_density"]
+                    original_term_density = metrics["original_term_density"]
+                    length_ratio = metrics["length_ratio"]
+                    processing_time = metrics["processing_time"]
+                    
+                    # Display metrics
+                    st.markdown("### Evaluation Metrics")
+                    
+                    col1, col2, col3 = st.columns(3)
+                    
+                    with col1:
+                        st.metric(
+                            "Readability Score", 
+                            f"{readability_score:.1f}/100", 
+                            delta=f"{readability_score - original_readability:.1f}",
+                            delta_color="normal"
+                        )
+                        st.caption("Higher is more readable. 70-80 is good for general audiences.")
+                    
+                    with col2:
+                        st.metric(
+                            "Medical Term Density", 
+                            f"{term_density:.1f}%", 
+                            delta=f"{term_density - original_term_density:.1f}%", 
+                            delta_color="inverse"
+                        )
+                        st.caption("Lower percentages indicate better simplification of terminology.")
+                    
+                    with col3:
+                        st.metric(
+                            "Length Ratio", 
+                            f"{length_ratio:.2f}", 
+                            delta=None
+                        )
+                        st.caption("Ratio of simplified to original length. Target: 0.8-1.2")
+                    
+                    # Processing information
+                    st.markdown(f"Processing time: {processing_time:.2f} seconds")
+                    if metrics.get("facts_retained") is not None:
+                        st.markdown(f"Medications and lab values kept: {metrics['facts_retained']:.0f}%")
+                    
+                    # Download option
+                    st.download_button(
+                        "Download as Text File",
+                        data=simplified_note,
+                        file_name="simplified_medical_note.txt",
+                        mime="text/plain",
+                        on_click="ignore"
+                    )
+                    
+                    # Suggestion for improvement
+                    st.markdown("### Potential Improvements")
+                    
+                    if readability_score < 60:
+                        st.warning("The simplified note could be more readable. Consider using shorter sentences and simpler vocabulary.")
+                    elif term_density > 5:
+                        st.warning("The medical term density is still high. Further simplification of technical terms might be helpful.")
+                    else:
+                        st.success("The simplification looks good! The readability is improved, and medical terminology is well-simplified.")
+        
+        with st.expander("Timing breakdown"):
+            st.markdown(render_waterfall(demo_trace.to_dict()), unsafe_allow_html=True)
+    
+    # Background batch runs
+    if st.session_state.api_key_configured:
+        st.markdown("---")
+        st.subheader("Background Batch Runs")
+        st.markdown("""
+        Queue many notes (the samples, your own files or a Synthea or FHIR export) with the method, target group and model selected above. Runs are processed in the background,
+        so you can keep using the app, and finished notes are added to the Results Explorer as they complete.
+        """)
+        
+        batch_source = st.radio("Notes from", ["Sample notes", "Uploaded files", "Synthea CSV export", "FHIR bundle"], horizontal=True)
+        
+        if batch_source == "Sample notes":
+            col1, col2 = st.columns([3, 1])
             with col1:
-                st.metric(
-                    "Readability Score", 
-                    f"{readability_score:.1f}/100", 
-                    delta=f"{readability_score - original_readability:.1f}",
-                    delta_color="normal"
+                batch_notes = st.multiselect(
+                    "Notes to process",
+                    options=[name for name, note in sample_notes.items() if note],
+                    default=[name for name, note in sample_notes.items() if note]
                 )
-                st.caption("Higher is more readable. 70-80 is good for general audiences.")
-            
             with col2:
-                st.metric(
-                    "Medical Term Density", 
-                    f"{term_density:.1f}%", 
-                    delta=f"{term_density - original_term_density:.1f}%", 
-                    delta_color="inverse"
-                )
-                st.caption("Lower percentages indicate better simplification of terminology.")
-            
-            with col3:
-                st.metric(
-                    "Length Ratio", 
-                    f"{length_ratio:.2f}", 
-                    delta=None
-                )
-                st.caption("Ratio of simplified to original length. Target: 0.8-1.2")
-            
-            # Processing information
-            st.markdown(f"Processing time: {processing_time:.2f} seconds")
-            
-            # Download option
-            st.markdown(get_download_link(simplified_note), unsafe_allow_html=True)
-            
-            # Suggestion for improvement
-            st.markdown("### Potential Improvements")
+                batch_repeats = st.number_input("Runs per note", min_value=1, max_value=500, value=1)
+            
+            if st.button("Queue Background Run", disabled=not batch_notes):
+                notes = [sample_notes[name] for name in batch_notes] * int(batch_repeats)
+                get_job_runner().submit(notes, prompting_method, target_group, model_choice, temperature, get_llm_backend())
+                st.success(f"Queued {len(notes)} notes.")
+        elif batch_source == "Uploaded files":
+            uploaded_files = st.file_uploader(
+                "Note files",
+                type=list(UPLOAD_TYPES),
+                accept_multiple_files=True,
+                help="Text files with notes separated by '---' lines, CSV or JSONL files with a 'note' column or field, or ZIP archives of them"
+            )
             
-            if readability_score < 60:
-                st.warning("The simplified note could be more readable. Consider using shorter sentences and simpler vocabulary.")
-            elif term_density > 5:
-                st.warning("The medical term density is still high. Further simplification of technical terms might be helpful.")
+            if st.button("Queue Background Run", disabled=not uploaded_files):
+                # The files are split into notes while they are queued, without holding all notes in memory
+                try:
+                    with st.spinner("Reading the uploaded files..."):
+                        notes = (note for uploaded_file in uploaded_files for note in iter_file_notes(uploaded_file))
+                        job_id = get_job_runner().submit(notes, prompting_method, target_group, model_choice, temperature, get_llm_backend())
+                    st.success(f"Queued {get_job_runner().job_queue.job(job_id)['total']} notes.")
+                except ValueError as e:
+                    st.error(f"Could not read the uploaded files: {str(e)}")
+        else:
+            # Notes are built one patient at a time while they are queued, so large exports fit in memory
+            if batch_source == "Synthea CSV export":
+                export_label = "Synthea CSV directory on the server"
+                export_setting = "SYNTHEA_CSV_DIR"
+                export_root = os.environ.get(export_setting, "synthea/output/csv")
+                export_help = "The directory with patients.csv, conditions.csv, medications.csv, encounters.csv and observations.csv"
+                read_export = iter_synthea_notes
             else:
-                st.success("The simplification looks good! The readability is improved, and medical terminology is well-simplified.")
+                export_label = "FHIR bundle on the server"
+                export_setting = "FHIR_BUNDLE_PATH"
+                export_root = os.environ.get(export_setting, "synthea/output/fhir")
+                export_help = "A FHIR R4 bundle (.json), a Bulk Data file (.ndjson) or a directory of them"
+                read_export = iter_fhir_notes
+            
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                # Only admins may pick another location, and only inside the configured one
+                if is_admin():
+                    export_path = st.text_input(export_label, value=export_root, help=export_help)
+                else:
+                    export_path = export_root
+                    st.text_input(export_label, value=export_root, help=f"{export_help}. Set by {export_setting}.", disabled=True)
+            with col2:
+                export_limit = st.number_input("Patients", min_value=1, max_value=100000, value=100)
+            
+            if st.button("Queue Background Run", disabled=not export_path):
+                try:
+                    with st.spinner("Reading the export and building notes..."):
+                        export_path = resolve_export_path(export_path, export_root)
+                        notes = read_export(export_path, limit=int(export_limit))
+                        job_id = get_job_runner().submit(notes, prompting_method, target_group, model_choice, temperature, get_llm_backend())
+                    st.success(f"Queued {get_job_runner().job_queue.job(job_id)['total']} notes.")
+                except (OSError, KeyError, ValueError) as e:
+                    st.error(f"Could not read the export: {str(e)}")
+        
+        job_runner = get_job_runner()
+        jobs_running = any(job_runner.is_attached(job_id) for job_id in job_runner.job_queue.unfinished_jobs())
+        st.fragment(render_background_jobs, run_every=2 if jobs_running else None)()
 
 elif st.session_state.current_tab == "results":
     # RESULTS EXPLORER TAB
+    # pandas is only needed for the tables on this tab
+    import pandas as pd
+    
     st.title("📊 Results Explorer")
     
     st.markdown("""
@@ -1960,174 +1431,276 @@ elif st.session_state.current_tab == "results":
     </div>
     """, unsafe_allow_html=True)
     
+    history_store = get_history_store()
+    
     # Check if we have any history
-    if len(st.session_state.processing_history) == 0:
+    if history_store.count() == 0:
         st.warning("No processing history found. Try simplifying some medical notes in the Live Demo tab first.")
     else:
+        # Filters applied to every query below
+        first_date, last_date = history_store.date_bounds()
+        
+        filter_col1, filter_col2, filter_col3 = st.columns(3)
+        
+        with filter_col1:
+            date_range = st.date_input(
+                "Date range",
+                value=(first_date, last_date),
+                min_value=first_date,
+                max_value=last_date
+            )
+        
+        with filter_col2:
+            selected_groups = st.multiselect(
+                "Target groups",
+                options=history_store.target_groups(),
+                help="Leave empty to include all target groups"
+            )
+        
+        with filter_col3:
+            selected_methods = st.multiselect(
+                "Methods",
+                options=history_store.methods(),
+                help="Leave empty to include all methods"
+            )
+        
+        # The date picker returns a single date while a range is being selected
+        if isinstance(date_range, (tuple, list)) and len(date_range) == 2:
+            start_date, end_date = date_range
+        else:
+            start_date = end_date = date_range[0] if isinstance(date_range, (tuple, list)) else date_range
+        
+        history_filters = {
+            "start_date": start_date,
+            "end_date": end_date,
+            "target_groups": selected_groups,
+            "methods": selected_methods
+        }
+        
         # Summary statistics
         st.subheader("Summary Statistics")
         
-        # Count by method
-        methods = [item['method'] for item in st.session_state.processing_history]
-        unique_methods = list(set(methods))
-        method_counts = [methods.count(m) for m in unique_methods]
+        # Per-method statistics, precomputed on every history write
+        summary_rows = history_store.aggregate_summary(group_by=("method",), **history_filters)
         
-        # Average readability by method
-        readability_by_method = {}
-        term_density_by_method = {}
-        processing_time_by_method = {}
+        if not summary_rows:
+            st.info("No history items match the selected filters.")
+            st.stop()
         
-        for method in unique_methods:
-            scores = [item['metrics']['readability_score'] for item in st.session_state.processing_history if item['method'] == method]
-            readability_by_method[method] = sum(scores) / len(scores) if scores else 0
-            
-            densities = [item['metrics']['term_density'] for item in st.session_state.processing_history if item['method'] == method]
-            term_density_by_method[method] = sum(densities) / len(densities) if densities else 0
-            
-            times = [item['metrics']['processing_time'] for item in st.session_state.processing_history if item['method'] == method]
-            processing_time_by_method[method] = sum(times) / len(times) if times else 0
+        unique_methods = [row['method'] for row in summary_rows]
         
         # Create DataFrame for easier visualization
         summary_df = pd.DataFrame({
             'Method': unique_methods,
-            'Count': method_counts,
-            'Avg. Readability': [readability_by_method[m] for m in unique_methods],
-            'Avg. Term Density': [term_density_by_method[m] for m in unique_methods],
-            'Avg. Processing Time': [processing_time_by_method[m] for m in unique_methods]
+            'Count': [row['count'] for row in summary_rows],
+            'Avg. Readability': [aggregate_mean(row, 'readability_score') for row in summary_rows],
+            'Avg. Term Density': [aggregate_mean(row, 'term_density') for row in summary_rows],
+            'Avg. Processing Time': [aggregate_mean(row, 'processing_time') for row in summary_rows]
         })
         
         # Display summary table
         st.dataframe(summary_df.round(2))
         
+        # Spread and percentiles, broken down by method, target group and/or model
+        with st.expander("Detailed Statistics"):
+            stats_col1, stats_col2 = st.columns(2)
+            
+            with stats_col1:
+                breakdown_labels = st.multiselect(
+                    "Break down by",
+                    options=list(AGGREGATE_BREAKDOWNS.keys()),
+                    default=["Method"]
+                )
+            
+            with stats_col2:
+                stats_metric_label = st.selectbox("Metric", options=list(AGGREGATE_METRICS.keys()))
+            
+            breakdown = tuple(AGGREGATE_BREAKDOWNS[label] for label in breakdown_labels)
+            breakdown_rows = history_store.aggregate_summary(group_by=breakdown, **history_filters)
+            
+            st.dataframe(pd.DataFrame(
+                format_aggregate_rows(breakdown_rows, breakdown_labels, AGGREGATE_METRICS[stats_metric_label])
+            ).round(2))
+            st.caption("Percentiles are estimated from streaming sketches and are accurate to within 1%.")
+        
         # Visualizations
         st.subheader("Performance Comparison")
         
         col1, col2 = st.columns(2)
         
+        # Rendered charts are cached until new history items are saved
+        history_version = history_store.latest_id()
+        
         with col1:
-            # Readability comparison
-            fig, ax = plt.subplots(figsize=(10, 6))
-            bars = ax.bar(
-                summary_df['Method'], 
-                summary_df['Avg. Readability'],
-                color=['#8884d8', '#82ca9d', '#ffc658', '#ff8042'][:len(unique_methods)]
-            )
-            ax.set_ylim(0, 100)
-            ax.set_ylabel('Flesch Reading Ease Score')
-            ax.set_title('Average Readability by Method')
-            
-            # Add target line
-            ax.axhline(y=70, color='g', linestyle='--', alpha=0.7)
-            ax.text(len(unique_methods)-0.5, 72, 'Target Readability (70)', color='g', ha='right')
-            
-            # Add values on bars
-            for bar in bars:
-                height = bar.get_height()
-                ax.annotate(f'{height:.1f}',
-                            xy=(bar.get_x() + bar.get_width() / 2, height),
-                            xytext=(0, 3),
-                            textcoords="offset points",
-                            ha='center', va='bottom')
-            
-            st.pyplot(fig)
+            st.image(render_results_chart("readability", history_version, history_filters))
         
         with col2:
-            # Term density comparison
-            fig2, ax2 = plt.subplots(figsize=(10, 6))
-            bars2 = ax2.bar(
-                summary_df['Method'], 
-                summary_df['Avg. Term Density'],
-                color=['#8884d8', '#82ca9d', '#ffc658', '#ff8042'][:len(unique_methods)]
+            st.image(render_results_chart("term_density", history_version, history_filters))
+        
+        st.image(render_results_chart("processing_time", history_version, history_filters))
+        
+        # Latency percentiles and throughput from the recorded LLM call telemetry
+        st.subheader("Latency and Throughput")
+        
+        perf_col1, perf_col2 = st.columns(2)
+        
+        with perf_col1:
+            performance_window = st.selectbox("Time window", options=list(PERFORMANCE_WINDOWS.keys()))
+        
+        with perf_col2:
+            performance_labels = st.multiselect(
+                "Break down by",
+                options=list(AGGREGATE_BREAKDOWNS.keys()),
+                default=["Method", "Model"],
+                key="performance_breakdown"
             )
-            ax2.set_ylim(0, max(summary_df['Avg. Term Density'])*1.2)
-            ax2.set_ylabel('Medical Term Density (%)')
-            ax2.set_title('Average Medical Term Density by Method')
-            
-            # Add target line
-            ax2.axhline(y=5, color='g', linestyle='--', alpha=0.7)
-            ax2.text(len(unique_methods)-0.5, 5.2, 'Target Density (5%)', color='g', ha='right')
-            
-            # Add values on bars
-            for bar in bars2:
-                height = bar.get_height()
-                ax2.annotate(f'{height:.1f}%',
-                            xy=(bar.get_x() + bar.get_width() / 2, height),
-                            xytext=(0, 3),
-                            textcoords="offset points",
-                            ha='center', va='bottom')
-            
-            st.pyplot(fig2)
-        
-        # Processing time comparison
-        fig3, ax3 = plt.subplots(figsize=(10, 6))
-        bars3 = ax3.bar(
-            summary_df['Method'], 
-            summary_df['Avg. Processing Time'],
-            color=['#8884d8', '#82ca9d', '#ffc658', '#ff8042'][:len(unique_methods)]
-        )
-        ax3.set_ylabel('Processing Time (seconds)')
-        ax3.set_title('Average Processing Time by Method')
         
-        # Add values on bars
-        for bar in bars3:
-            height = bar.get_height()
-            ax3.annotate(f'{height:.1f}s',
-                        xy=(bar.get_x() + bar.get_width() / 2, height),
-                        xytext=(0, 3),
-                        textcoords="offset points",
-                        ha='center', va='bottom')
+        # The window start is rounded to the minute, so reruns within a minute share a cached summary
+        performance_since = None
+        if PERFORMANCE_WINDOWS[performance_window] is not None:
+            performance_since = (datetime.now() - PERFORMANCE_WINDOWS[performance_window]).replace(second=0, microsecond=0)
         
-        st.pyplot(fig3)
+        performance_rows = summarize_llm_calls(
+            tuple(AGGREGATE_BREAKDOWNS[label] for label in performance_labels),
+            performance_since,
+            history_store.latest_llm_call_id(),
+            history_filters
+        )
         
-        # Detailed history table
+        if performance_rows:
+            st.dataframe(pd.DataFrame(
+                format_performance_rows(performance_rows, performance_labels, since=performance_since)
+            ).round(2))
+            st.caption("TTFT is the time to the first streamed token. Latency, TTFT and tokens/s only count successful calls; retried calls are those that needed at least one retry.")
+        else:
+            st.info("No LLM calls have been recorded for the selected filters yet.")
+        
+        # Detailed history table, sorted and paged by the database
         st.subheader("Processing History")
         
-        # Prepare data for table
-        history_table = []
-        for i, item in enumerate(st.session_state.processing_history):
-            history_table.append({
-                'ID': i+1,
-                'Timestamp': item['timestamp'],
-                'Method': item['method'],
-                'Target Group': item['target_group'],
-                'Readability': f"{item['metrics']['readability_score']:.1f}",
-                'Term Density': f"{item['metrics']['term_density']:.1f}%",
-                'Length Ratio': f"{item['metrics']['length_ratio']:.2f}"
-            })
-        
-        history_df = pd.DataFrame(history_table)
+        total_items = history_store.count(**history_filters)
+        
+        table_col1, table_col2, table_col3, table_col4 = st.columns(4)
+        
+        with table_col1:
+            sort_label = st.selectbox("Sort by", options=list(HISTORY_SORT_COLUMNS.keys()))
+        
+        with table_col2:
+            sort_order = st.radio("Order", options=["Descending", "Ascending"], horizontal=True)
+        
+        with table_col3:
+            page_size = st.selectbox("Rows per page", options=[25, 50, 100])
+        
+        page_count = max(1, math.ceil(total_items / page_size))
+        
+        with table_col4:
+            page_number = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1)
+        
+        # Only the visible page is loaded and formatted
+        page_rows = history_store.page(
+            sort_by=HISTORY_SORT_COLUMNS[sort_label],
+            descending=(sort_order == "Descending"),
+            limit=page_size,
+            offset=(page_number - 1) * page_size,
+            **history_filters
+        )
+        
+        history_df = pd.DataFrame(format_history_rows(page_rows))
         st.dataframe(history_df)
         
+        first_row = (page_number - 1) * page_size + 1
+        st.caption(f"Showing {first_row}-{first_row + len(page_rows) - 1} of {total_items} items (page {page_number} of {page_count})")
+        
         # Export options
         st.subheader("Export Options")
         
-        col1, col2 = st.columns(2)
+        col1, col2, col3 = st.columns(3)
         
         with col1:
-            if st.button("Generate PDF Report"):
-                pdf_buffer = generate_report(st.session_state.processing_history)
-                b64_pdf = base64.b64encode(pdf_buffer.read()).decode()
-                href = f'<a href="data:application/pdf;base64,{b64_pdf}" download="simplification_report.pdf">Download PDF Report</a>'
-                st.markdown(href, unsafe_allow_html=True)
+            report_format = st.selectbox("Report format", options=["PDF", "HTML", "Markdown"])
+            
+            if report_format == "PDF":
+                # The report covers every matching item and is built in the background
+                if st.button("Generate PDF Report"):
+                    remove_old_files(Path("streamlit_cache") / "reports")
+                    report_path = Path("streamlit_cache") / "reports" / f"simplification_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.pdf"
+                    try:
+                        st.session_state.report_job = ReportJob(history_store, report_path, summary_rows, **history_filters).start()
+                    except ImportError as e:
+                        st.error(str(e))
+                
+                report_job = st.session_state.get('report_job')
+                report_running = report_job is not None and report_job.running
+                st.fragment(render_report_job, run_every=1 if report_running else None)(report_running)
+            
+            # HTML and Markdown reports are plain text and quick to write, even for the full history
+            elif st.button(f"Generate {report_format} Report"):
+                text_format = report_format.lower()
+                remove_old_files(Path("streamlit_cache") / "reports")
+                # Each report gets its own file, so sessions generating reports at the same time do not overwrite each other
+                report_path = Path("streamlit_cache") / "reports" / f"simplification_report_{uuid.uuid4().hex[:8]}{REPORT_FORMATS[text_format]}"
+                report_charts = [
+                    (title, render_results_chart(chart, history_version, history_filters, fmt="svg"))
+                    for chart, title in RESULTS_CHART_TITLES.items()
+                ]
+                item_count = write_text_report(
+                    history_store, report_path, summary_rows, fmt=text_format, charts=report_charts, **history_filters
+                )
+                st.download_button(
+                    f"Download {report_format} Report ({item_count} items)",
+                    data=report_path.read_bytes,
+                    file_name=report_path.name,
+                    mime="text/html" if text_format == "html" else "text/markdown",
+                    on_click="ignore"
+                )
         
         with col2:
-            if st.button("Export Data (CSV)"):
-                csv = history_df.to_csv(index=False)
-                b64_csv = base64.b64encode(csv.encode()).decode()
-                href = f'<a href="data:file/csv;base64,{b64_csv}" download="simplification_history.csv">Download CSV Data</a>'
-                st.markdown(href, unsafe_allow_html=True)
+            st.download_button(
+                "Export Data (CSV)",
+                data=functools.partial(build_history_csv, history_store, history_filters),
+                file_name="simplification_history.csv",
+                mime="text/csv"
+            )
+        
+        with col3:
+            # Typed export of the full history, including the notes, for offline analysis
+            export_format = st.selectbox("Full history format", options=list(EXPORT_FORMATS.keys()))
+            
+            if st.button("Export Full History"):
+                # Each export gets its own file, so sessions exporting at the same time do not overwrite each other
+                export_dir = Path("streamlit_cache") / "exports"
+                remove_old_files(export_dir)
+                export_path = export_dir / f"simplification_history_{uuid.uuid4().hex}{EXPORT_FORMATS[export_format]}"
+                try:
+                    row_count = export_history(history_store, export_path, fmt=export_format, **history_filters)
+                    st.download_button(
+                        f"Download {export_format.title()} File ({row_count} items)",
+                        data=export_path.read_bytes,
+                        file_name=f"simplification_history{EXPORT_FORMATS[export_format]}",
+                        mime="application/octet-stream",
+                        on_click="ignore"
+                    )
+                except ImportError as e:
+                    st.error(str(e))
         
         # Note example detail viewer
         st.subheader("View Example Details")
         
+        example_query = st.text_input(
+            "Search examples:",
+            placeholder="Filter by ID, method, model or date",
+            help="Only the 50 most recent matches are listed"
+        )
+        example_matches = history_store.search(example_query, limit=50, **history_filters)
+        
         selected_example = st.selectbox(
             "Select an example to view:", 
-            [f"Example {i+1}: {item['method']} ({item['timestamp']})" for i, item in enumerate(st.session_state.processing_history)]
+            [f"Example {row['id']}: {row['method']} ({row['timestamp']})" for row in example_matches]
         )
         
         if selected_example:
-            example_index = int(selected_example.split(':')[0].replace('Example ', '')) - 1
-            example = st.session_state.processing_history[example_index]
+            example_id = int(selected_example.split(':')[0].replace('Example ', ''))
+            example = history_store.get(example_id)
             
             st.markdown(f"**Method:** {example['method']} | **Target Group:** {example['target_group']}")
             
@@ -2326,66 +1899,13 @@ elif st.session_state.current_tab == "code":
         2. Download the source code using the button below
         """)
         
-        if st.button("Download Complete Source Code"):
-            # Create a zip file with the source code
-            try:
-                with open(__file__, 'r') as f:
-                    source_code = f.read()
-                
-                zip_buffer = BytesIO()
-                with zipfile.ZipFile(zip_buffer, 'w') as zf:
-                    zf.writestr('app.py', source_code)
-                    zf.writestr('README.md', """
-  zf.writestr('README.md', """
-# Medical Note Simplification with LLMs
-
-This Streamlit application demonstrates how to use LLMs to simplify medical notes for various patient populations.
-
-## Features
-
-- Multiple LLM prompting techniques (Zero-Shot, Few-Shot, Chain of Thought, Tree of Thoughts)
-- Patient-specific simplification (General, Elderly, Low Literacy, ESL)
-- Quantitative evaluation metrics
-- Result visualization and analysis
-- Export functionality
-
-## Installation
-
-```
-pip install -r requirements.txt
-```
-
-## Usage
-
-```
-streamlit run app.py
-```
-
-## Requirements
-
-- Python 3.7+
-- OpenAI API key
-- Streamlit
-- Pandas
-- Matplotlib
-- NLTK
-```
-""")
-                    zf.writestr('requirements.txt', """
-streamlit>=1.22.0
-openai>=0.27.0
-pandas>=1.3.5
-matplotlib>=3.5.1
-seaborn>=0.11.2
-nltk>=3.7
-""")
-                
-                zip_buffer.seek(0)
-                b64_zip = base64.b64encode(zip_buffer.getvalue()).decode()
-                href = f'<a href="data:application/zip;base64,{b64_zip}" download="medical_note_simplification.zip">Download Source Code ZIP</a>'
-                st.markdown(href, unsafe_allow_html=True)
-            except Exception as e:
-                st.error(f"Failed to create download: {str(e)}")
+        # The archive is only built when the button is clicked
+        st.download_button(
+            "Download Complete Source Code",
+            data=build_source_zip,
+            file_name="medical_note_simplification.zip",
+            mime="application/zip"
+        )
 
 elif st.session_state.current_tab == "about":
     # ABOUT TAB
@@ -2448,7 +1968,7 @@ elif st.session_state.current_tab == "about":
     ## Disclaimer
     
     This tutorial is for educational purposes only. While the simplified notes aim to be accurate, any real medical application should involve healthcare professionals in the review process. The simplifications generated should complement, not replace, direct communication between healthcare providers and patients.
-    )
+    """)
     
     # Contact information
     st.markdown("---")
@@ -2463,6 +1983,83 @@ elif st.session_state.current_tab == "about":
     We welcome contributions and suggestions for improving this tutorial.
     """)
 
+elif st.session_state.current_tab == "profiler" and is_admin():
+    # PROFILER TAB (admins only)
+    st.title("🩺 Profiler")
+    
+    st.markdown("""
+    Profile the next script runs or background jobs of this server to find out where the time goes.
+    A sampling profiler records the stack of the profiled threads every 10 ms, so profiled runs stay
+    at close to full speed. The runs profiled are the next ones from any session, not only yours.
+    """)
+    
+    profile_schedule = get_profile_schedule()
+    col1, col2 = st.columns(2)
+    with col1:
+        script_runs = st.number_input("Script runs to profile", min_value=0, max_value=100, value=5)
+        if st.button("Profile Next Script Runs"):
+            profile_schedule.arm("script", script_runs)
+        st.caption(f"{profile_schedule.remaining('script')} script runs left to profile")
+    with col2:
+        job_runs = st.number_input("Background runs to profile", min_value=0, max_value=20, value=1)
+        if st.button("Profile Next Background Runs"):
+            profile_schedule.arm("job", job_runs)
+        st.caption(f"{profile_schedule.remaining('job')} background runs left to profile")
+    
+    st.subheader("Profiles")
+    profiles = list_profiles(profile_schedule.directory)
+    if not profiles:
+        st.info("No profiles yet. Arm the profiler above, then use the app or queue a background run.")
+    else:
+        st.dataframe(
+            [
+                {
+                    "Profile": profile["name"],
+                    "Created": profile["created"].strftime("%Y-%m-%d %H:%M:%S"),
+                    "Size": f"{profile['size'] / 1024:.1f} KB"
+                }
+                for profile in profiles
+            ],
+            hide_index=True
+        )
+        
+        profiles_by_name = {profile["name"]: profile for profile in profiles}
+        selected_profile = profiles_by_name[st.selectbox("Inspect profile", options=list(profiles_by_name))]
+        stacks = read_collapsed(selected_profile["path"])
+        st.caption(f"{sum(stacks.values())} samples. Self is time at the top of the stack, total is time anywhere on it.")
+        st.dataframe(
+            [
+                {
+                    "Function": row["function"],
+                    "Self %": f"{row['self_percent']:.1f}",
+                    "Total %": f"{row['total_percent']:.1f}",
+                    "Self Samples": row["self_samples"],
+                    "Total Samples": row["total_samples"]
+                }
+                for row in top_functions(stacks)
+            ],
+            hide_index=True
+        )
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(
+                "Download Collapsed Stacks",
+                data=selected_profile["path"].read_bytes,
+                file_name=selected_profile["path"].name,
+                mime="text/plain",
+                on_click="ignore"
+            )
+        with col2:
+            if st.button("Delete Profile"):
+                selected_profile["path"].unlink(missing_ok=True)
+                st.rerun()
+        st.caption("Open the collapsed stacks in speedscope (speedscope.app) or render them with flamegraph.pl.")
+
+# Write the profile of this script run
+if st.session_state.get("script_profiler") is not None:
+    get_profile_schedule().finish(st.session_state.pop("script_profiler"), f"script_{st.session_state.current_tab}")
+
 # Run the app
 if __name__ == '__main__':
     st.sidebar.markdown("---")
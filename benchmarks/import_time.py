@@ -0,0 +1,145 @@
+"""Cold-start benchmark for the Streamlit app.
+
+Each page of the app is rendered once in a fresh interpreter with Streamlit's
+AppTest, the way a new worker renders its first page. The benchmark reports
+the time of that first run, the peak memory of the process and the heavy
+libraries that were imported. It fails when a page imports a heavy library it
+does not need, or when a run is slower than ``--budget`` seconds, so
+regressions in cold start are caught before they ship. The ``medsimplify``
+core package is measured the same way and must not import Streamlit or any
+heavy library.
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --budget 5 --json import_time.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+APP_PATH = REPO_DIR / "app.py"
+
+# numpy is not listed: Streamlit imports it for the st.image logo on every page
+HEAVY_MODULES = ("pandas", "matplotlib", "seaborn", "openai", "pyarrow", "pypdf")
+
+# Navigation label of each page and the heavy libraries it may import on its first run
+PAGES = {
+    "tutorial": ("📚 Tutorial", {"matplotlib"}),
+    "demo": ("🔬 Live Demo", set()),
+    "results": ("📊 Results Explorer", {"pandas", "pyarrow", "matplotlib"}),
+    "code": ("📝 Code Examples", set()),
+    "about": ("ℹ️ About", set()),
+}
+
+# Runs in a fresh interpreter: renders one page and prints its measurements as JSON
+_CHILD = """
+import json, resource, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+streamlit_seconds = time.perf_counter() - start
+
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+at.session_state["navigation"] = sys.argv[2]
+start = time.perf_counter()
+at.run()
+run_seconds = time.perf_counter() - start
+
+print(json.dumps({
+    "streamlit_seconds": streamlit_seconds,
+    "run_seconds": run_seconds,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_modules": sorted(name for name in json.loads(sys.argv[3]) if name in sys.modules),
+    "exceptions": [exception.message for exception in at.exception],
+}))
+"""
+
+# Runs in a fresh interpreter: imports the core package and prints its measurements as JSON
+_CORE_CHILD = """
+import json, resource, sys, time
+sys.path.insert(0, sys.argv[1])
+start = time.perf_counter()
+import medsimplify
+import_seconds = time.perf_counter() - start
+
+print(json.dumps({
+    "run_seconds": import_seconds,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_modules": sorted(name for name in json.loads(sys.argv[2]) if name in sys.modules),
+    "exceptions": [],
+}))
+"""
+
+
+def measure_core():
+    """Imports the medsimplify package in a new interpreter and returns its measurements."""
+    result = subprocess.run(
+        [sys.executable, "-c", _CORE_CHILD, str(REPO_DIR), json.dumps(HEAVY_MODULES + ("streamlit",))],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure_page(label, work_dir):
+    """Renders one page in a new interpreter and returns its measurements."""
+    env = dict(os.environ, HISTORY_DB_PATH=str(Path(work_dir) / "history.db"))
+    result = subprocess.run(
+        [sys.executable, "-c", _CHILD, str(APP_PATH), label, json.dumps(HEAVY_MODULES)],
+        cwd=work_dir,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cold start of each page of the app.")
+    parser.add_argument("--pages", nargs="+", choices=["core"] + list(PAGES), default=["core"] + list(PAGES))
+    parser.add_argument("--budget", type=float, default=None, help="Maximum seconds for the first run of a page")
+    parser.add_argument("--json", dest="json_path", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    failures = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for page in args.pages:
+            if page == "core":
+                result, allowed = measure_core(), set()
+            else:
+                label, allowed = PAGES[page]
+                result = measure_page(label, work_dir)
+            results[page] = result
+
+            unexpected = sorted(set(result["heavy_modules"]) - allowed)
+            if unexpected:
+                failures.append(f"{page}: imports {', '.join(unexpected)}")
+            if result["exceptions"]:
+                failures.append(f"{page}: raised {result['exceptions'][0]}")
+            if args.budget is not None and result["run_seconds"] > args.budget:
+                failures.append(f"{page}: first run took {result['run_seconds']:.2f}s (budget {args.budget:.2f}s)")
+
+            print(
+                f"{page:<10} run {result['run_seconds']:6.2f}s  "
+                f"peak RSS {result['peak_rss_mb']:7.1f} MB  "
+                f"heavy modules: {', '.join(result['heavy_modules']) or '-'}"
+            )
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(results, indent=2))
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
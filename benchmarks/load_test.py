@@ -0,0 +1,245 @@
+"""Load test for one instance of the Streamlit app.
+
+Simulated trainee sessions walk through a realistic flow: open the Tutorial,
+simplify a note with each prompting method in the Live Demo, open the Results
+Explorer and generate an HTML report. Each session runs the app with
+Streamlit's AppTest in its own process: AppTest replaces process-wide state
+such as ``st.secrets`` and the Streamlit runtime for every run, so sessions on
+threads of one process would run against each other's state. The sessions
+share the machine's CPU and the history and job databases; in-process caches
+are not shared, so a real replica, whose sessions share them, does somewhat
+better than measured here. The LLM is the offline mock backend.
+
+For each number of concurrent sessions the test reports the render latency of
+every page and action (median and 95th percentile), completed flows per
+second, the CPU the sessions used (in cores) and the peak memory of a
+session's process. The saturation point is the first level at which adding
+sessions no longer raises throughput by ``--min-gain``, or at which the 95th
+percentile latency of a step exceeds ``--budget`` seconds. Size replicas to
+stay below it.
+
+Usage:
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --sessions 1 4 16 32 --mock-latency 2 --json load_test.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+APP_PATH = REPO_DIR / "app.py"
+sys.path.insert(0, str(REPO_DIR))
+
+from medsimplify import METHODS  # noqa: E402
+
+NAVIGATION = {
+    "tutorial": "📚 Tutorial",
+    "demo": "🔬 Live Demo",
+    "results": "📊 Results Explorer",
+}
+
+
+def share_script_cache():
+    """Compiles the app once per session process, as the Streamlit server does.
+
+    AppTest compiles the script again on every run with a fresh ScriptCache,
+    which would add compile time the server does not have.
+    """
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    shared = ScriptCache()
+    get_bytecode = ScriptCache.get_bytecode
+    ScriptCache.get_bytecode = lambda self, script_path: get_bytecode(shared, script_path)
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Session:
+    """One simulated user; records how long each rerun of the app took."""
+
+    def __init__(self):
+        from streamlit.testing.v1 import AppTest
+
+        self.at = AppTest.from_file(str(APP_PATH), default_timeout=600)
+        self.timings = defaultdict(list)
+        self.errors = []
+
+    def timed(self, step, action):
+        start = time.perf_counter()
+        action.run()
+        self.timings[step].append(time.perf_counter() - start)
+        self.errors.extend(f"{step}: {exception.message}" for exception in self.at.exception)
+
+    def widget(self, kind, label):
+        return next(element for element in getattr(self.at, kind) if element.label == label)
+
+    def run_flow(self):
+        at = self.at
+        self.timed("tutorial", at)
+
+        self.timed("demo", at.sidebar.radio[0].set_value(NAVIGATION["demo"]))
+        for method in METHODS:
+            self.widget("radio", "Select a prompting technique:").set_value(method)
+            self.timed("demo.simplify", self.widget("button", "Simplify Medical Note").click())
+
+        self.timed("results", at.sidebar.radio[0].set_value(NAVIGATION["results"]))
+        self.widget("selectbox", "Report format").set_value("HTML").run()
+        self.timed("results.report", self.widget("button", "Generate HTML Report").click())
+
+        at.sidebar.radio[0].set_value(NAVIGATION["tutorial"])
+
+
+def run_session(flows_per_session, ready, start, results):
+    """Runs in a session's own process: sets up, waits for the level to start, then runs the flows."""
+    share_script_cache()
+    result = {"timings": {}, "errors": [], "cpu_seconds": 0.0}
+    try:
+        session = Session()
+    except Exception as e:
+        result["errors"].append(f"session: {type(e).__name__}: {e}")
+        session = None
+    ready.put(True)
+    start.wait()
+
+    cpu_start = cpu_seconds()
+    if session is not None:
+        try:
+            for _ in range(flows_per_session):
+                session.run_flow()
+        except Exception as e:
+            session.errors.append(f"session: {type(e).__name__}: {e}")
+        result["timings"] = dict(session.timings)
+        result["errors"].extend(session.errors)
+    result["cpu_seconds"] = cpu_seconds() - cpu_start
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    results.put(result)
+
+
+def run_level(sessions, flows_per_session):
+    """Runs ``sessions`` concurrent sessions, one process each, and returns the measurements of the level."""
+    context = multiprocessing.get_context("spawn")
+    ready = context.Queue()
+    start = context.Event()
+    results = context.Queue()
+    processes = [
+        context.Process(target=run_session, args=(flows_per_session, ready, start, results), name=f"session-{index}")
+        for index in range(sessions)
+    ]
+    for process in processes:
+        process.start()
+    # Importing Streamlit and loading the app is not part of the measurement
+    for _ in processes:
+        ready.get()
+
+    begin = time.perf_counter()
+    start.set()
+    session_results = [results.get() for _ in processes]
+    wall = time.perf_counter() - begin
+    for process in processes:
+        process.join()
+
+    timings = defaultdict(list)
+    errors = []
+    for result in session_results:
+        for step, values in result["timings"].items():
+            timings[step].extend(values)
+        errors.extend(result["errors"])
+
+    steps = {}
+    for step, values in timings.items():
+        values = sorted(values)
+        steps[step] = {
+            "count": len(values),
+            "p50": statistics.median(values),
+            "p95": values[min(len(values) - 1, int(0.95 * len(values)))],
+            "max": values[-1],
+        }
+    return {
+        "sessions": sessions,
+        "flows": sessions * flows_per_session,
+        "wall_seconds": wall,
+        "flows_per_second": sessions * flows_per_session / wall,
+        "cpu_cores": sum(result["cpu_seconds"] for result in session_results) / wall,
+        "peak_rss_mb": max(result["peak_rss_mb"] for result in session_results),
+        "steps": steps,
+        "errors": errors[:20],
+    }
+
+
+def find_saturation(levels, budget, min_gain):
+    """Returns the first level past the point where more sessions stop paying off, and why."""
+    for previous, level in zip([None] + levels, levels):
+        slow = [step for step, stats in level["steps"].items() if stats["p95"] > budget]
+        if slow:
+            return level["sessions"], f"p95 of {', '.join(sorted(slow))} above {budget:.1f}s"
+        if previous is not None and level["flows_per_second"] < previous["flows_per_second"] * (1 + min_gain):
+            return level["sessions"], f"throughput grew less than {min_gain:.0%} over {previous['sessions']} sessions"
+    return None, "not reached"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive concurrent simulated sessions through the app.")
+    parser.add_argument("--sessions", nargs="+", type=int, default=[1, 2, 4, 8, 16], help="Concurrent sessions per level")
+    parser.add_argument("--flows", type=int, default=1, help="Flows each session runs per level")
+    parser.add_argument("--mock-latency", type=float, default=1.0, help="Seconds each mock LLM call takes")
+    parser.add_argument("--budget", type=float, default=10.0, help="Highest acceptable p95 latency of a step, in seconds")
+    parser.add_argument("--min-gain", type=float, default=0.1, help="Throughput gain below which a level counts as saturated")
+    parser.add_argument("--json", dest="json_path", help="Write the results to this JSON file")
+    args = parser.parse_args()
+    json_path = Path(args.json_path).resolve() if args.json_path else None
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        # The app keeps its cache and databases under the working directory, which the
+        # session processes inherit along with the environment
+        os.chdir(work_dir)
+        os.environ.update({
+            "STREAMLIT_LOGGER_LEVEL": "error",
+            "LLM_BACKEND": "mock",
+            "LLM_MOCK_LATENCY": str(args.mock_latency),
+            "HISTORY_DB_PATH": str(Path(work_dir) / "history.db"),
+            "JOB_DB_PATH": str(Path(work_dir) / "jobs.db"),
+        })
+
+        levels = []
+        for sessions in args.sessions:
+            level = run_level(sessions, args.flows)
+            levels.append(level)
+            print(
+                f"{sessions:>4} sessions  {level['flows_per_second']:6.2f} flows/s  "
+                f"CPU {level['cpu_cores']:5.2f} cores  peak RSS per session {level['peak_rss_mb']:7.1f} MB"
+                + (f"  {len(level['errors'])} errors" if level["errors"] else "")
+            )
+            for step, stats in level["steps"].items():
+                print(f"      {step:<16} p50 {stats['p50']:7.2f}s  p95 {stats['p95']:7.2f}s  max {stats['max']:7.2f}s")
+
+    saturation, reason = find_saturation(levels, args.budget, args.min_gain)
+    if saturation is None:
+        print(f"Saturation: not reached up to {args.sessions[-1]} sessions")
+    else:
+        print(f"Saturation: {saturation} sessions ({reason})")
+
+    if json_path:
+        json_path.write_text(json.dumps({
+            "mock_latency": args.mock_latency,
+            "cpu_count": os.cpu_count(),
+            "levels": levels,
+            "saturation": {"sessions": saturation, "reason": reason},
+        }, indent=2))
+
+    return 1 if any(level["errors"] for level in levels) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
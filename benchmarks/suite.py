@@ -0,0 +1,316 @@
+"""Offline benchmark suite for the simplification core.
+
+Measures, without network access:
+
+- prompts:  time to build the messages of each method for each target group
+- simplify: latency of ``simplify`` and throughput of ``simplify_stream`` for
+            each method against a deterministic ``MockBackend``
+- metrics:  throughput of ``calculate_readability`` and
+            ``calculate_medical_term_density`` on notes of 1 KB to 1 MB
+- history:  cost of saving one item and of reading the history back
+            (first page, summary, full scan) versus history length
+- reports:  time to write the HTML, Markdown and PDF reports versus item count
+
+Every result has a ``benchmark`` name, its ``params`` and the ``seconds`` one
+operation took (the best of a few repeats). Results are written as JSON
+together with the git commit they were measured on, and ``--compare`` prints
+the change against an earlier results file.
+
+Usage:
+    python benchmarks/suite.py --json benchmarks/results.json
+    python benchmarks/suite.py --quick --only metrics history
+    python benchmarks/suite.py --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+from medsimplify import (  # noqa: E402
+    METHODS,
+    TARGET_GROUPS,
+    HistoryStore,
+    MockBackend,
+    build_messages,
+    calculate_medical_term_density,
+    calculate_readability,
+    simplify,
+    simplify_stream,
+)
+from medsimplify.history_report import REPORT_FORMATS, ReportJob, write_text_report  # noqa: E402
+
+# The first sample note of the Live Demo, in the layout the app's notes use
+SAMPLE_NOTE = (REPO_DIR / "content" / "samples" / "diabetes_hypertension.txt").read_text(encoding="utf-8").rstrip("\n")
+
+SIMPLIFIED_NOTE = """You have high blood pressure, type 2 diabetes, high cholesterol and mild kidney disease.
+Keep taking your three medicines every day. Your sugar and cholesterol levels are a little high.
+Come back for your follow-up visit so we can check how you are doing."""
+
+METRICS = {
+    "readability_score": 72.5,
+    "original_readability": 31.0,
+    "term_density": 1.5,
+    "original_term_density": 12.0,
+    "length_ratio": 0.6,
+    "processing_time": 2.5,
+}
+
+FULL_SIZES = {
+    "note_bytes": (1_000, 10_000, 100_000, 1_000_000),
+    "history_lengths": (1_000, 10_000, 100_000),
+    "text_report_items": (100, 1_000, 10_000),
+    "pdf_report_items": (50, 200),
+    "stream_notes": 200,
+    "repeat": 5,
+}
+
+QUICK_SIZES = {
+    "note_bytes": (1_000, 10_000, 100_000),
+    "history_lengths": (1_000, 10_000),
+    "text_report_items": (100, 1_000),
+    "pdf_report_items": (50,),
+    "stream_notes": 50,
+    "repeat": 3,
+}
+
+MOCK_LATENCY = 0.01
+
+
+def best_of(func, repeat, number=1):
+    """Runs ``func`` ``number`` times per repeat and returns the best seconds per call."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = (time.perf_counter() - start) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def make_note(size):
+    """Returns a note of about ``size`` bytes made of repeated sample notes."""
+    return (SAMPLE_NOTE * (size // len(SAMPLE_NOTE) + 1))[:size]
+
+
+def make_items(count, start=None):
+    """Returns ``count`` history items in the dictionary layout of ``HistoryStore.import_items``."""
+    rng = random.Random(count)
+    start = start or datetime.now() - timedelta(days=90)
+    methods = list(METHODS)
+    return [
+        {
+            "timestamp": (start + timedelta(minutes=index)).strftime("%Y-%m-%d %H:%M:%S"),
+            "method": methods[index % len(methods)],
+            "target_group": TARGET_GROUPS[index % len(TARGET_GROUPS)],
+            "model": "gpt-3.5-turbo",
+            # A few distinct notes, as in real runs over a fixed sample set
+            "original_note": SAMPLE_NOTE.replace("Patient ID: ", f"Patient ID: {index % 50}-", 1),
+            "simplified_note": f"{SIMPLIFIED_NOTE}\n(item {index})",
+            "metrics": {name: value * rng.uniform(0.8, 1.2) for name, value in METRICS.items()},
+        }
+        for index in range(count)
+    ]
+
+
+def bench_prompts(sizes):
+    results = []
+    for method in METHODS:
+        for target_group in TARGET_GROUPS:
+            seconds = best_of(lambda: build_messages(SAMPLE_NOTE, method, target_group), sizes["repeat"], number=1000)
+            results.append({
+                "benchmark": "prompts.build_messages",
+                "params": {"method": method, "target_group": target_group},
+                "seconds": seconds,
+            })
+    return results
+
+
+def bench_simplify(sizes):
+    results = []
+    note_count = sizes["stream_notes"]
+    for method in METHODS:
+        backend = MockBackend(latency=MOCK_LATENCY, seed=0)
+        seconds = best_of(lambda: simplify(SAMPLE_NOTE, method=method, backend=backend), sizes["repeat"], number=10)
+        results.append({
+            "benchmark": "simplify.latency",
+            "params": {"method": method, "backend_latency": MOCK_LATENCY},
+            "seconds": seconds,
+            "overhead_seconds": seconds - MOCK_LATENCY,
+        })
+
+        for max_workers in (1, 8):
+            start = time.perf_counter()
+            for result in simplify_stream([SAMPLE_NOTE] * note_count, method=method, backend=backend, max_workers=max_workers):
+                pass
+            elapsed = time.perf_counter() - start
+            results.append({
+                "benchmark": "simplify.stream",
+                "params": {"method": method, "backend_latency": MOCK_LATENCY, "max_workers": max_workers, "notes": note_count},
+                "seconds": elapsed / note_count,
+                "notes_per_second": note_count / elapsed,
+            })
+    return results
+
+
+def bench_metrics(sizes):
+    results = []
+    for size in sizes["note_bytes"]:
+        note = make_note(size)
+        repeat = sizes["repeat"] if size < 1_000_000 else 1
+        for name, func in (("readability", calculate_readability), ("term_density", calculate_medical_term_density)):
+            seconds = best_of(lambda: func(note), repeat)
+            results.append({
+                "benchmark": f"metrics.{name}",
+                "params": {"note_bytes": size},
+                "seconds": seconds,
+                "mb_per_second": size / seconds / 1e6,
+            })
+    return results
+
+
+def bench_history(sizes, work_dir):
+    results = []
+    for length in sizes["history_lengths"]:
+        store = HistoryStore(Path(work_dir) / f"history_{length}.db")
+        store.import_items(make_items(length))
+
+        checks = {
+            "history.add": lambda: store.add(SAMPLE_NOTE, SIMPLIFIED_NOTE, "Zero-Shot", "General", METRICS, model="gpt-3.5-turbo"),
+            "history.first_page": lambda: store.page(limit=25),
+            "history.count": lambda: store.count(),
+            "history.aggregate_summary": lambda: store.aggregate_summary(group_by=("method",)),
+            "history.full_scan": lambda: sum(len(rows) for rows in store.iter_rows()),
+        }
+        for name, check in checks.items():
+            repeat = 1 if name == "history.full_scan" and length >= 100_000 else sizes["repeat"]
+            results.append({
+                "benchmark": name,
+                "params": {"history_length": length},
+                "seconds": best_of(check, repeat, number=20 if name == "history.add" else 1),
+            })
+        store.close()
+    return results
+
+
+def bench_reports(sizes, work_dir):
+    results = []
+    work_dir = Path(work_dir)
+    for count in sorted(set(sizes["text_report_items"]) | set(sizes["pdf_report_items"])):
+        store = HistoryStore(work_dir / f"report_{count}.db")
+        store.import_items(make_items(count))
+        method_summary = store.aggregate_summary(group_by=("method",))
+
+        if count in sizes["text_report_items"]:
+            for fmt, suffix in REPORT_FORMATS.items():
+                path = work_dir / f"report_{count}{suffix}"
+                results.append({
+                    "benchmark": f"reports.{fmt}",
+                    "params": {"items": count},
+                    "seconds": best_of(lambda: write_text_report(store, path, method_summary, fmt=fmt), sizes["repeat"]),
+                })
+
+        if count in sizes["pdf_report_items"]:
+            def pdf_report():
+                job = ReportJob(store, work_dir / f"report_{count}.pdf", method_summary).start()
+                job.wait()
+                if job.status != "done":
+                    raise RuntimeError(f"PDF report failed: {job.error}")
+
+            results.append({
+                "benchmark": "reports.pdf",
+                "params": {"items": count},
+                "seconds": best_of(pdf_report, 1),
+            })
+        store.close()
+    return results
+
+
+BENCHMARKS = {
+    "prompts": bench_prompts,
+    "simplify": bench_simplify,
+    "metrics": bench_metrics,
+    "history": bench_history,
+    "reports": bench_reports,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def result_key(result):
+    return result["benchmark"] + " " + json.dumps(result['params'], sort_keys=True)
+
+
+def format_params(params):
+    return ", ".join(f"{name}={value}" for name, value in params.items())
+
+
+def compare(results, baseline_path):
+    """Prints the change in seconds per operation against an earlier results file."""
+    baseline = json.loads(Path(baseline_path).read_text())
+    before = {result_key(result): result["seconds"] for result in baseline["results"]}
+    print(f"\nCompared with {baseline['meta'].get('commit') or baseline_path}:")
+    for result in results:
+        old = before.get(result_key(result))
+        if old:
+            change = (result["seconds"] - old) / old * 100
+            print(f"{result['benchmark']:<26} {format_params(result['params']):<72} {change:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite.")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--quick", action="store_true", help="Use smaller sizes for a fast check")
+    parser.add_argument("--json", dest="json_path", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare with the results in this JSON file")
+    args = parser.parse_args()
+
+    sizes = QUICK_SIZES if args.quick else FULL_SIZES
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name in args.only:
+            benchmark = BENCHMARKS[name]
+            group = benchmark(sizes, work_dir) if name in ("history", "reports") else benchmark(sizes)
+            for result in group:
+                print(f"{result['benchmark']:<26} {format_params(result['params']):<72} {result['seconds'] * 1000:12.4f} ms")
+            results.extend(group)
+
+    if args.json_path:
+        output = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "quick": args.quick,
+            },
+            "results": results,
+        }
+        Path(args.json_path).write_text(json.dumps(output, indent=2))
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
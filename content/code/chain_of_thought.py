@@ -0,0 +1,28 @@
+# Chain of Thought Prompting
+def chain_of_thought_simplification(medical_note, target_group="General"):
+    prompt = f'''
+Please simplify the following medical note for patients with limited health literacy. Think step by step:
+
+1. First, identify all medical terms and jargon that need simplification
+2. Determine the core medical information that must be preserved
+3. Rewrite each section using plain language
+4. Ensure all important information is included and accurate
+5. Organize the information in a patient-friendly format
+
+Medical Note:
+{medical_note}
+
+Now, first identify the medical terms that need simplification:
+'''
+    
+    response = openai.ChatCompletion.create(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": "You specialize in making medical information accessible."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.3,
+        max_tokens=1500
+    )
+    
+    return response.choices[0].message["content"].strip()
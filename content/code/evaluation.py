@@ -0,0 +1,36 @@
+# Evaluation Functions
+
+# Calculate readability score (Flesch Reading Ease)
+def calculate_readability(text):
+    sentences = len(re.split(r'[.!?]+', text))
+    words = len(re.findall(r'\b\w+\b', text))
+    syllables = 0
+    for word in re.findall(r'\b\w+\b', text.lower()):
+        syllables += max(1, len(re.findall(r'[aeiouy]+', word)))
+    
+    if sentences == 0 or words == 0:
+        return 0
+    
+    flesch_score = 206.835 - 1.015 * (words / sentences) - 84.6 * (syllables / words)
+    return max(0, min(100, flesch_score))  # Clip between 0 and 100
+
+# Calculate medical term density
+def calculate_medical_term_density(text):
+    # Sample medical term list (would be expanded in a real application)
+    medical_terms = [
+        'hypertension', 'diabetes', 'mellitus', 'dyspnea', 'orthopnea', 
+        'hyperlipidemia', 'myocardial', 'infarction', 'arrhythmia',
+        'tachycardia', 'bradycardia', 'fibrillation', 'cholesterol', 
+        'glucose', 'insulin', 'hyperglycemia', 'hypoglycemia'
+        # Add many more terms in a real application
+    ]
+    
+    words = re.findall(r'\b\w+\b', text.lower())
+    word_count = len(words)
+    
+    if word_count == 0:
+        return 0
+    
+    medical_term_count = sum(1 for word in words if word in medical_terms)
+    
+    return (medical_term_count / word_count) * 100  # Return as a percentage
@@ -0,0 +1,41 @@
+# Few-Shot (In-Context Learning) Prompting
+def few_shot_simplification(medical_note, target_group="General"):
+    # Define example pairs (original → simplified)
+    examples = '''
+EXAMPLE 1:
+ORIGINAL: 
+Patient is a 67-year-old male with hypertension, hyperlipidemia, and type 2 diabetes mellitus.
+
+SIMPLIFIED:
+You are a 67-year-old man with high blood pressure, high cholesterol, and type 2 diabetes.
+
+EXAMPLE 2:
+ORIGINAL:
+Patient presents with persistent cough for 2 weeks, associated with low-grade fever and myalgia.
+
+SIMPLIFIED:
+You came in with a cough that has lasted for 2 weeks, along with a mild fever and muscle aches.
+'''
+    
+    prompt = f'''
+I'll show you how to simplify medical notes for patients with limited health literacy.
+Here are some examples:
+
+{examples}
+
+Now, please simplify the following medical note in a similar way:
+
+{medical_note}
+'''
+    
+    response = openai.ChatCompletion.create(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": "You specialize in making medical information accessible."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.3,
+        max_tokens=1000
+    )
+    
+    return response.choices[0].message["content"].strip()
@@ -0,0 +1,47 @@
+# Tree of Thoughts Prompting
+def tree_of_thoughts_simplification(medical_note, target_group="General"):
+    prompt = f'''
+I will simplify this medical note by exploring different approaches and selecting the best one.
+
+Medical Note:
+{medical_note}
+
+Approach 1: Focus on simplifying vocabulary while maintaining the structure
+- Identify all medical terms
+- Replace with simpler alternatives or brief explanations
+- Keep the original structure of the note
+
+Approach 2: Restructure the note to be more narrative and conversational
+- Convert the note into a summary of what happened and what it means
+- Use second-person perspective ("you have..." instead of "patient has...")
+- Group related information together regardless of original structure
+
+Approach 3: Create a hybrid approach with simplified sections and explanations
+- Keep key sections (history, medications, etc.) but rename them to be patient-friendly
+- Simplify the language within each section
+- Add brief explanations of what each section means for the patient's health
+
+Let me evaluate each approach for this specific note:
+
+Approach 1 Evaluation:
+
+Approach 2 Evaluation:
+
+Approach 3 Evaluation:
+
+Based on my evaluation, the most effective approach for this specific case is:
+
+Here's the simplified note using the best approach:
+'''
+    
+    response = openai.ChatCompletion.create(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": "You specialize in making medical information accessible."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.3,
+        max_tokens=1500
+    )
+    
+    return response.choices[0].message["content"].strip()
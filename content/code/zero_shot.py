@@ -0,0 +1,37 @@
+# Zero-Shot Prompting
+def zero_shot_simplification(medical_note, target_group="General"):
+    # Customize for target patient group
+    if target_group == "Elderly":
+        audience = "elderly patients (70+ years)"
+        specific_instructions = "Use clear organization with headings."
+    elif target_group == "Low Literacy":
+        audience = "patients with low health literacy (4th-5th grade level)"
+        specific_instructions = "Use simple words and short sentences."
+    else:  # General or ESL
+        audience = "patients with limited health literacy"
+        specific_instructions = "Use plain language at 8th grade level."
+    
+    prompt = f'''
+Please simplify the following medical note for {audience}:
+
+{medical_note}
+
+The simplified note should:
+- Use plain language instead of medical jargon
+- Maintain all important medical information
+- Be organized in a clear structure
+- Explain medical terms when necessary
+- {specific_instructions}
+'''
+    
+    response = openai.ChatCompletion.create(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": "You specialize in making medical information accessible."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.3,
+        max_tokens=1000
+    )
+    
+    return response.choices[0].message["content"].strip()
@@ -0,0 +1,44 @@
+"""Medical note simplification with LLMs, without the Streamlit UI.
+
+The package holds everything the app does apart from rendering pages: the
+prompting methods, the evaluation metrics, the LLM backends, the history
+store and the report and export writers. Importing it pulls in no UI or
+plotting libraries, so workers, notebooks and services can use it directly::
+
+    from medsimplify import MockBackend, simplify_stream
+
+    for result in simplify_stream(notes, method="Chain of Thought", backend=MockBackend()):
+        print(result["index"], result["metrics"]["readability_score"])
+
+Reports (``medsimplify.history_report``), columnar exports
+(``medsimplify.history_export``) and charts (``medsimplify.charts``) are
+imported from their modules.
+"""
+
+from .backends import BACKENDS, MockBackend, OpenAIBackend, get_backend
+from .history_store import HistoryStore
+from .methods import METHODS, TARGET_GROUPS, build_messages
+from .metrics import calculate_medical_term_density, calculate_readability, evaluate_simplification
+from .note_parser import ParsedNote, parse_note
+from .phi import PhiScrubber, PhiScrubbingBackend
+from .pipeline import simplify, simplify_stream
+
+__all__ = [
+    "BACKENDS",
+    "METHODS",
+    "TARGET_GROUPS",
+    "HistoryStore",
+    "MockBackend",
+    "OpenAIBackend",
+    "ParsedNote",
+    "PhiScrubber",
+    "PhiScrubbingBackend",
+    "build_messages",
+    "calculate_medical_term_density",
+    "calculate_readability",
+    "evaluate_simplification",
+    "get_backend",
+    "parse_note",
+    "simplify",
+    "simplify_stream",
+]
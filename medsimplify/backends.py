@@ -0,0 +1,117 @@
+"""LLM backends that simplification requests are sent to.
+
+A backend has a single method, ``complete(messages, model, temperature,
+max_tokens, on_complete=None)``, which returns the completion text and hands
+the call's telemetry (see ``llm_client.chat_completion``) to ``on_complete``.
+``OpenAIBackend`` talks to the OpenAI API; ``MockBackend`` answers offline so
+the app, the service and the benchmarks can run without an API key.
+"""
+
+import random
+import threading
+import time
+
+from .llm_client import DEFAULT_MAX_RETRIES, chat_completion
+from .tracing import add_span
+
+MOCK_RESPONSE = """YOUR HEALTH SUMMARY
+
+You have a few health problems that your care team is watching closely.
+
+What we found:
+- Your tests show some changes that we need to keep an eye on.
+- Your medicines help control your symptoms.
+
+What to do now:
+- Take your medicines every day as directed.
+- Come back for your next check-up.
+- Call us if you feel worse or have new symptoms."""
+
+
+class MockBackendError(RuntimeError):
+    """Failure injected by ``MockBackend``."""
+
+
+class OpenAIBackend:
+    """Sends chat completions to the OpenAI API, with retries and streaming."""
+
+    def __init__(self, api_key=None, max_retries=DEFAULT_MAX_RETRIES):
+        self.api_key = api_key
+        self.max_retries = max_retries
+
+    def complete(self, messages, model="gpt-3.5-turbo", temperature=0.3, max_tokens=1000, on_complete=None):
+        return chat_completion(
+            messages,
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            max_retries=self.max_retries,
+            on_complete=on_complete,
+            api_key=self.api_key,
+        )
+
+
+class MockBackend:
+    """Answers every prompt with a canned plain-language note, without network access.
+
+    ``latency`` is the time a call takes in seconds, of which
+    ``time_to_first_token`` is spent before the first token. A fraction
+    ``error_rate`` of the calls fail with ``MockBackendError``. ``seed`` makes
+    the injected failures reproducible.
+    """
+
+    def __init__(self, latency=0.05, time_to_first_token=None, error_rate=0.0, response=MOCK_RESPONSE, seed=None):
+        self.latency = latency
+        self.time_to_first_token = latency * 0.3 if time_to_first_token is None else time_to_first_token
+        self.error_rate = error_rate
+        self.response = response
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def complete(self, messages, model="mock", temperature=0.3, max_tokens=1000, on_complete=None):
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+
+        start = time.perf_counter()
+        time.sleep(self.time_to_first_token)
+        telemetry = {
+            "model": model,
+            "latency": None,
+            "time_to_first_token": time.perf_counter() - start,
+            "completion_tokens": 0,
+            "retries": 0,
+            "error": None,
+        }
+        try:
+            if failed:
+                raise MockBackendError("Injected mock backend failure")
+            time.sleep(max(self.latency - self.time_to_first_token, 0))
+            telemetry["completion_tokens"] = len(self.response.split())
+            return self.response
+        except Exception as e:
+            telemetry["time_to_first_token"] = None
+            telemetry["error"] = type(e).__name__
+            raise
+        finally:
+            end = time.perf_counter()
+            if telemetry["time_to_first_token"] is not None:
+                add_span("wait_first_token", start, start + telemetry["time_to_first_token"])
+                add_span("stream_response", start + telemetry["time_to_first_token"], end)
+            else:
+                add_span("request", start, end, error=telemetry["error"])
+            telemetry["latency"] = end - start
+            if on_complete is not None:
+                on_complete(telemetry)
+
+
+BACKENDS = {
+    "openai": OpenAIBackend,
+    "mock": MockBackend,
+}
+
+
+def get_backend(name="openai", **options):
+    """Creates the backend registered under ``name`` with the given options."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend {name!r}, expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name](**options)
@@ -0,0 +1,54 @@
+"""Bar charts rendered straight to image bytes.
+
+Charts are drawn on standalone ``matplotlib.figure.Figure`` objects instead of
+pyplot figures. They are never registered with pyplot's global figure manager,
+so nothing accumulates across Streamlit reruns, and the rendered PNG/SVG bytes
+can be cached and reused by the caller.
+"""
+
+from io import BytesIO
+
+METHOD_COLORS = ['#8884d8', '#82ca9d', '#ffc658', '#ff8042']
+
+
+def render_bar_chart(categories, values, ylabel, title=None, colors=None, ylim=None,
+                     target_lines=(), value_format="{:.1f}", figsize=(10, 6), fmt="png", dpi=100):
+    """Renders a bar chart with value labels and returns the image bytes.
+
+    ``target_lines`` is a sequence of dicts with ``y``, ``color`` and ``label``
+    keys, and optionally ``text_x``/``text_y`` to position the label.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    try:
+        ax = fig.subplots()
+        bars = ax.bar(categories, values, color=colors)
+
+        if ylim is not None:
+            ax.set_ylim(*ylim)
+        ax.set_ylabel(ylabel)
+        if title:
+            ax.set_title(title)
+
+        for line in target_lines:
+            ax.axhline(y=line['y'], color=line['color'], linestyle='--', alpha=0.7)
+            ax.text(line.get('text_x', len(categories) - 0.5), line.get('text_y', line['y']),
+                    line['label'], color=line['color'], ha='right')
+
+        # Add values on bars
+        for bar in bars:
+            height = bar.get_height()
+            ax.annotate(value_format.format(height),
+                        xy=(bar.get_x() + bar.get_width() / 2, height),
+                        xytext=(0, 3),
+                        textcoords="offset points",
+                        ha='center', va='bottom')
+
+        buffer = BytesIO()
+        fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches='tight')
+        return buffer.getvalue()
+    finally:
+        fig.clear()
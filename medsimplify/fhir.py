@@ -0,0 +1,333 @@
+"""Streaming ingestion of FHIR R4 bundles.
+
+EHR exports are often single FHIR ``Bundle`` documents of hundreds of
+megabytes. ``iter_resources`` walks the ``entry`` array of a bundle without
+parsing the whole document: the file is read in chunks into a sliding text
+buffer and each entry is decoded on its own with
+``json.JSONDecoder.raw_decode``, after which the consumed text is dropped.
+Memory use is bounded by the chunk size and the largest single entry. FHIR
+Bulk Data exports (``.ndjson``, one resource per line) are read the same way.
+
+``iter_fhir_notes`` turns the Patient, Condition, MedicationRequest,
+Encounter and Observation resources into one medical note per patient, in
+the format of the app's sample notes. Exports list the resources of a
+patient together (Synthea writes one bundle per patient), so a patient's
+note is emitted as soon as the stream moves on to the next patient and only
+one patient is held in memory. Pass ``grouped=False`` for exports that
+interleave patients; every patient is then summarised until the end of the
+input, which still keeps only what each note lists.
+
+Usage:
+    python -m medsimplify.fhir synthea/output/fhir --limit 100 > notes.jsonl
+    python -m medsimplify.fhir export.json --simplify --backend mock --method "Chain of Thought"
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import date
+from pathlib import Path
+
+from .backends import BACKENDS, MockBackend, OpenAIBackend
+from .methods import METHODS, TARGET_GROUPS
+from .notes import DEFAULT_MAX_ENCOUNTERS, DEFAULT_MAX_OBSERVATIONS, PatientRecord, age_in_years, format_demographics
+from .pipeline import DEFAULT_MAX_WORKERS, simplify_stream
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+FHIR_SUFFIXES = (".json", ".ndjson")
+
+NOTE_RESOURCES = ("Patient", "Condition", "MedicationRequest", "Encounter", "Observation")
+
+US_CORE_RACE = "http://hl7.org/fhir/us/core/StructureDefinition/us-core-race"
+US_CORE_ETHNICITY = "http://hl7.org/fhir/us/core/StructureDefinition/us-core-ethnicity"
+ETHNICITIES = {"Hispanic or Latino": "Hispanic", "Not Hispanic or Latino": "Non-Hispanic"}
+
+
+class FhirFormatError(ValueError):
+    """A FHIR file that is not a bundle or NDJSON stream of resources."""
+
+
+class _JsonStream:
+    """Decodes consecutive JSON values from a text file through a sliding buffer."""
+
+    _WHITESPACE = " \t\n\r"
+
+    def __init__(self, file, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    def _fill(self):
+        """Drops the consumed text and reads more; returns False at the end of the file."""
+        if self.eof:
+            return False
+        # Reading at least as much as is buffered keeps decoding a huge entry linear overall
+        chunk = self.file.read(max(self.chunk_size, len(self.buffer) - self.position))
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        self.eof = not chunk
+        return not self.eof
+
+    def peek(self):
+        """Returns the next non-whitespace character without consuming it, or "" at the end."""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in self._WHITESPACE:
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._fill():
+                return ""
+
+    def expect(self, character):
+        if self.peek() != character:
+            found = self.buffer[self.position:self.position + 20] or "end of file"
+            raise FhirFormatError(f"Expected {character!r} but found {found!r}")
+        self.position += 1
+
+    def value(self):
+        """Decodes and consumes the next JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError as e:
+                if self._fill():
+                    continue
+                raise FhirFormatError(f"Invalid JSON: {e}") from None
+            # A number or literal at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and not isinstance(value, (dict, list, str)) and self._fill():
+                continue
+            self.position = end
+            return value
+
+
+def _bundle_resources(stream):
+    stream.expect("{")
+    while stream.peek() != "}":
+        key = stream.value()
+        stream.expect(":")
+        if key == "entry":
+            stream.expect("[")
+            while stream.peek() != "]":
+                resource = stream.value().get("resource")
+                if resource is not None:
+                    yield resource
+                if stream.peek() == ",":
+                    stream.expect(",")
+            stream.expect("]")
+        else:
+            stream.value()
+        if stream.peek() == ",":
+            stream.expect(",")
+    stream.expect("}")
+
+
+def _fhir_files(path):
+    path = Path(path)
+    if path.is_dir():
+        return sorted(child for child in path.iterdir() if child.suffix in FHIR_SUFFIXES)
+    if not path.exists():
+        raise FileNotFoundError(f"No FHIR bundle at {path}")
+    return [path]
+
+
+def iter_resources(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yields the resources of a bundle or NDJSON file, or of every such file in a directory."""
+    for file_path in _fhir_files(path):
+        with open(file_path, encoding="utf-8") as file:
+            stream = _JsonStream(file, chunk_size)
+            if file_path.suffix == ".ndjson":
+                while stream.peek():
+                    yield stream.value()
+            else:
+                yield from _bundle_resources(stream)
+
+
+def _reference_id(reference):
+    """Returns the id in a reference such as ``Patient/123`` or ``urn:uuid:123``."""
+    value = (reference or {}).get("reference") or ""
+    return value.rsplit("/", 1)[-1].rsplit(":", 1)[-1] or None
+
+
+def _patient_id(resource):
+    if resource["resourceType"] == "Patient":
+        return resource.get("id")
+    return _reference_id(resource.get("subject") or resource.get("patient"))
+
+
+def _concept_text(concept):
+    """Returns the text of a CodeableConcept, falling back to its first coding's display."""
+    if not concept:
+        return ""
+    if concept.get("text"):
+        return concept["text"]
+    return next((coding["display"] for coding in concept.get("coding", ()) if coding.get("display")), "")
+
+
+def _codes(concept):
+    return {coding.get("code") for coding in (concept or {}).get("coding", ())}
+
+
+def _extension_text(resource, url):
+    for extension in resource.get("extension", ()):
+        if extension.get("url") == url:
+            for part in extension.get("extension", ()):
+                if part.get("url") == "text":
+                    return part.get("valueString")
+    return None
+
+
+def _format_value(value):
+    return str(round(value, 2)) if isinstance(value, float) else str(value)
+
+
+def _add_patient(record, resource, as_of):
+    age = None
+    if resource.get("birthDate"):
+        end = date.fromisoformat(resource["deceasedDateTime"][:10]) if resource.get("deceasedDateTime") else as_of
+        age = age_in_years(date.fromisoformat(resource["birthDate"][:10]), end)
+    ethnicity = _extension_text(resource, US_CORE_ETHNICITY)
+    record.demographics = format_demographics(
+        age,
+        resource.get("gender"),
+        _extension_text(resource, US_CORE_RACE),
+        ETHNICITIES.get(ethnicity, ethnicity),
+    )
+
+
+def _add_resource(record, resource, as_of):
+    """Adds what the note lists from one resource to the patient's record."""
+    kind = resource["resourceType"]
+    if kind == "Patient":
+        _add_patient(record, resource, as_of)
+
+    elif kind == "Condition":
+        status = _codes(resource.get("clinicalStatus"))
+        if ("active" in status if status else not resource.get("abatementDateTime")):
+            record.add_condition(_concept_text(resource.get("code")))
+
+    elif kind == "MedicationRequest":
+        if resource.get("status") == "active":
+            name = _concept_text(resource.get("medicationCodeableConcept"))
+            name = name or (resource.get("medicationReference") or {}).get("display", "")
+            if name:
+                record.add_medication(name)
+
+    elif kind == "Encounter":
+        start = (resource.get("period") or {}).get("start")
+        if start:
+            record.add_encounter(
+                start[:10],
+                _concept_text((resource.get("type") or [None])[0]) or _concept_text(resource.get("serviceType")),
+                _concept_text((resource.get("reasonCode") or [None])[0]),
+            )
+
+    elif kind == "Observation":
+        categories = set().union(*(_codes(category) for category in resource.get("category", ())))
+        effective = resource.get("effectiveDateTime") or (resource.get("effectivePeriod") or {}).get("start")
+        if "laboratory" not in categories or not effective:
+            return
+        if "valueQuantity" in resource:
+            quantity = resource["valueQuantity"]
+            value, units = _format_value(quantity.get("value")), quantity.get("unit") or quantity.get("code") or ""
+        elif "valueCodeableConcept" in resource:
+            value, units = _concept_text(resource["valueCodeableConcept"]), ""
+        elif "valueString" in resource:
+            value, units = resource["valueString"], ""
+        else:
+            # Panels carry their results in components or in separate observations
+            return
+        record.add_observation(effective[:10], _concept_text(resource.get("code")), value, units)
+
+
+def iter_fhir_notes(path, limit=None, grouped=True, max_encounters=DEFAULT_MAX_ENCOUNTERS,
+                    max_observations=DEFAULT_MAX_OBSERVATIONS, as_of=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yields one medical note per patient in a FHIR bundle, NDJSON file or directory of them.
+
+    With ``grouped`` (the default) a patient's note is emitted when the
+    resources of another patient start; otherwise all notes are emitted at
+    the end of the input. At most ``limit`` notes are emitted.
+    """
+    as_of = as_of or date.today()
+    records = {}
+    current = None
+    emitted = 0
+
+    for resource in iter_resources(path, chunk_size=chunk_size):
+        if resource.get("resourceType") not in NOTE_RESOURCES:
+            continue
+        patient_id = _patient_id(resource)
+        if patient_id is None:
+            continue
+
+        if grouped and current is not None and patient_id != current and current in records:
+            yield records.pop(current).render()
+            emitted += 1
+            if limit is not None and emitted >= limit:
+                return
+        current = patient_id
+
+        record = records.get(patient_id)
+        if record is None:
+            record = records[patient_id] = PatientRecord(patient_id, max_encounters, max_observations)
+        _add_resource(record, resource, as_of)
+
+    for record in records.values():
+        if limit is not None and emitted >= limit:
+            return
+        yield record.render()
+        emitted += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build medical notes from FHIR bundles as JSON lines.")
+    parser.add_argument("path", help="A FHIR bundle (.json), a Bulk Data file (.ndjson) or a directory of them")
+    parser.add_argument("--limit", type=int, help="Stop after this many patients")
+    parser.add_argument("--interleaved", action="store_true", help="Patients' resources are not listed together")
+    parser.add_argument("--max-encounters", type=int, default=DEFAULT_MAX_ENCOUNTERS)
+    parser.add_argument("--max-observations", type=int, default=DEFAULT_MAX_OBSERVATIONS)
+    parser.add_argument("--simplify", action="store_true", help="Simplify each note and write the results instead")
+    parser.add_argument("--method", choices=list(METHODS), default="Zero-Shot")
+    parser.add_argument("--target-group", choices=list(TARGET_GROUPS), default="General")
+    parser.add_argument("--model", default="gpt-3.5-turbo")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--backend", choices=list(BACKENDS), default=os.environ.get("LLM_BACKEND", "openai"))
+    parser.add_argument("--mock-latency", type=float, default=0.5, help="Seconds per call of the mock backend")
+    args = parser.parse_args()
+
+    notes = iter_fhir_notes(
+        args.path,
+        limit=args.limit,
+        grouped=not args.interleaved,
+        max_encounters=args.max_encounters,
+        max_observations=args.max_observations,
+    )
+    if not args.simplify:
+        for note in notes:
+            print(json.dumps({"note": note}))
+        return
+
+    if args.backend == "mock":
+        backend = MockBackend(latency=args.mock_latency)
+    else:
+        backend = OpenAIBackend(api_key=os.environ.get("OPENAI_API_KEY"))
+    results = simplify_stream(
+        notes,
+        method=args.method,
+        target_group=args.target_group,
+        model=args.model,
+        backend=backend,
+        max_workers=args.workers,
+    )
+    for result in results:
+        print(json.dumps(result))
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
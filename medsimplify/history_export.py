@@ -0,0 +1,124 @@
+"""Columnar export of the processing history for offline analysis.
+
+The full history, including the raw notes and the numeric metrics, is written
+to Parquet or Arrow IPC files one row group at a time. Exports can be read back
+through memory maps, so analysts get typed columns without parsing CSV.
+
+Usage:
+    python -m medsimplify.history_export streamlit_cache/history.db history.parquet
+    python -m medsimplify.history_export streamlit_cache/history.db history.arrow --format arrow
+"""
+
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+from .history_store import METRIC_COLUMNS, TIMESTAMP_FORMAT, HistoryStore
+
+EXPORT_FORMATS = {
+    "parquet": ".parquet",
+    "arrow": ".arrow",
+}
+
+DEFAULT_ROW_GROUP_SIZE = 10000
+
+
+def _require_pyarrow():
+    """Imports pyarrow on first use; it is optional and only exports need it."""
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("pyarrow is required for Parquet/Arrow exports. Install it with 'pip install pyarrow'.")
+    return pa, pq
+
+
+def history_schema():
+    """Returns the Arrow schema of an exported history table."""
+    pa, _ = _require_pyarrow()
+    return pa.schema(
+        [
+            ("id", pa.int64()),
+            ("timestamp", pa.timestamp("s")),
+            ("method", pa.string()),
+            ("target_group", pa.string()),
+            ("model", pa.string()),
+            ("original_note", pa.large_string()),
+            ("simplified_note", pa.large_string()),
+        ]
+        + [(name, pa.float64()) for name in METRIC_COLUMNS]
+    )
+
+
+def _rows_to_batch(pa, rows, schema):
+    columns = {name: [row[name] for row in rows] for name in schema.names}
+    columns["timestamp"] = [datetime.strptime(value, TIMESTAMP_FORMAT) for value in columns["timestamp"]]
+    return pa.RecordBatch.from_pydict(columns, schema=schema)
+
+
+def export_history(store, path, fmt="parquet", row_group_size=DEFAULT_ROW_GROUP_SIZE, **filters):
+    """Writes the matching history rows to ``path`` and returns the row count.
+
+    Rows are read from the store and written in chunks of ``row_group_size``,
+    so memory use does not grow with the size of the history. Parquet files
+    are zstd-compressed; Arrow IPC files are left uncompressed so they can be
+    memory-mapped without copying.
+    """
+    pa, pq = _require_pyarrow()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}, expected one of {', '.join(EXPORT_FORMATS)}")
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    schema = history_schema()
+
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(str(path), schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_file(str(path), schema)
+
+    row_count = 0
+    try:
+        # Each batch from the store becomes one row group / record batch
+        for rows in store.iter_rows(batch_size=row_group_size, **filters):
+            writer.write_batch(_rows_to_batch(pa, rows, schema))
+            row_count += len(rows)
+    finally:
+        writer.close()
+
+    return row_count
+
+
+def read_history_export(path, columns=None):
+    """Loads an exported history file as a ``pyarrow.Table`` through a memory map.
+
+    The format is taken from the file extension. Selecting ``columns`` avoids
+    touching the note texts when only the metrics are needed.
+    """
+    pa, pq = _require_pyarrow()
+    path = Path(path)
+
+    if path.suffix == EXPORT_FORMATS["arrow"]:
+        source = pa.memory_map(str(path), "r")
+        table = pa.ipc.open_file(source).read_all()
+        return table.select(columns) if columns else table
+
+    return pq.read_table(str(path), columns=columns, memory_map=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the processing history to Parquet or Arrow IPC.")
+    parser.add_argument("database", help="Path to the history database (streamlit_cache/history.db)")
+    parser.add_argument("output", help="Path of the file to write")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="parquet")
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE)
+    args = parser.parse_args()
+
+    store = HistoryStore(args.database)
+    row_count = export_history(store, args.output, fmt=args.format, row_group_size=args.row_group_size)
+    print(f"Exported {row_count} history items to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,498 @@
+"""Reports on the processing history, as PDF, HTML or Markdown.
+
+PDF reports cover every matching history item. Items are read from the store
+in chunks and each chunk is laid out and rendered to its own part file by a
+pool of worker processes, so rendering uses every core and no more than a few
+chunks are ever held in memory. When all parts are written they are merged
+into the final PDF on disk with pypdf. Pages are drawn on standalone
+``matplotlib.figure.Figure`` objects, never on pyplot figures, so the workers
+need no global figure state.
+
+``ReportJob.start()`` builds the report in a separate ``python -m
+medsimplify.history_report`` process and follows its progress on a thread.
+Forking a multithreaded server such as Streamlit is unsafe, and spawned
+workers would re-run the server's ``__main__`` (the Streamlit script), so the
+worker pool is only ever started from that process, with "spawn".
+
+HTML and Markdown reports are filled in from ``string.Template`` sections and
+streamed to disk one batch of items at a time. Charts are passed in already
+rendered as SVG and embedded once, so even large reports take seconds.
+"""
+
+import base64
+import html
+import json
+import multiprocessing
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from string import Template
+
+DEFAULT_CHUNK_SIZE = 50
+DEFAULT_BATCH_SIZE = 1000
+
+REPORT_FORMATS = {
+    "html": ".html",
+    "markdown": ".md",
+}
+
+PAGE_SIZE = (8.5, 11)
+
+# Note text layout, in figure coordinates
+WRAP_WIDTH = 95
+LINE_HEIGHT = 0.0145
+TOP_MARGIN = 0.8
+CONTINUED_TOP_MARGIN = 0.93
+BOTTOM_MARGIN = 0.05
+
+
+def _require_pypdf():
+    """Imports pypdf on first use; it is optional and only PDF reports need it."""
+    try:
+        from pypdf import PdfWriter
+    except ImportError:
+        raise ImportError("pypdf is required for PDF reports. Install it with 'pip install pypdf'.")
+    return PdfWriter
+
+
+def _new_page():
+    from matplotlib.figure import Figure
+
+    return Figure(figsize=PAGE_SIZE)
+
+
+def _save_page(pdf, fig):
+    try:
+        pdf.savefig(fig)
+    finally:
+        fig.clear()
+
+
+def _note_lines(item):
+    """Returns the ``(text, is_heading)`` lines of an item's notes, wrapped but not truncated."""
+    lines = []
+    for heading, key in (("ORIGINAL NOTE:", "original_note"), ("SIMPLIFIED NOTE:", "simplified_note")):
+        if lines:
+            lines.append(("", False))
+        lines.append((heading, True))
+        for paragraph in item[key].splitlines() or [""]:
+            wrapped = textwrap.wrap(paragraph, width=WRAP_WIDTH) or [""]
+            lines.extend((line, False) for line in wrapped)
+    return lines
+
+
+def render_summary_pages(path, methods, counts, scores, total_items):
+    """Writes the title and summary pages to ``path``. Runs in a worker process."""
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    with PdfPages(path) as pdf:
+        # Title page
+        fig = _new_page()
+        fig.text(0.5, 0.9, "Medical Note Simplification Report", ha='center', fontsize=24)
+        fig.text(0.5, 0.85, f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", ha='center', fontsize=14)
+        fig.text(0.5, 0.8, f"Contains analysis of {total_items} simplified notes", ha='center', fontsize=14)
+        _save_page(pdf, fig)
+
+        # Summary statistics
+        fig = _new_page()
+        count_ax, score_ax = fig.subplots(2, 1)
+        count_ax.bar(methods, counts)
+        count_ax.set_title('Notes Simplified by Method')
+        count_ax.set_ylabel('Count')
+        score_ax.bar(methods, scores)
+        score_ax.set_title('Average Readability Score by Method')
+        score_ax.set_ylabel('Flesch Reading Ease Score')
+        fig.tight_layout()
+        _save_page(pdf, fig)
+
+
+def render_item_pages(path, items, first_number):
+    """Writes one or more pages per history item to ``path`` and returns the page count.
+
+    Runs in a worker process. Long notes flow onto continuation pages.
+    """
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    page_count = 0
+    with PdfPages(path) as pdf:
+        for number, item in enumerate(items, start=first_number):
+            fig = _new_page()
+            fig.text(0.5, 0.95, f"Simplification #{number}", ha='center', fontsize=16)
+            fig.text(0.5, 0.9, f"Method: {item['method']} | Target: {item['target_group']} | {item['timestamp']}", ha='center', fontsize=12)
+            fig.text(0.5, 0.85, f"Readability: {item['readability_score']:.1f}/100 | Term Density: {item['term_density']:.1f}% | Length Ratio: {item['length_ratio']:.2f}", ha='center', fontsize=10)
+
+            y = TOP_MARGIN
+            for text, is_heading in _note_lines(item):
+                if y < BOTTOM_MARGIN:
+                    _save_page(pdf, fig)
+                    page_count += 1
+                    fig = _new_page()
+                    fig.text(0.5, 0.95, f"Simplification #{number} (continued)", ha='center', fontsize=12)
+                    y = CONTINUED_TOP_MARGIN
+                if is_heading:
+                    fig.text(0.1, y, text, fontsize=10, fontweight='bold', va='top')
+                    y -= LINE_HEIGHT * 1.5
+                else:
+                    fig.text(0.1, y, text, fontsize=8, va='top', family='monospace')
+                    y -= LINE_HEIGHT
+
+            _save_page(pdf, fig)
+            page_count += 1
+    return page_count
+
+
+class ReportJob:
+    """Builds the PDF report for the matching history items in the background.
+
+    ``start()`` returns immediately; poll ``status``, ``progress`` and ``error``
+    to follow the job. The finished report is written to ``path``. ``run()``
+    builds the report in the calling process instead.
+    """
+
+    def __init__(self, store, path, method_summary, chunk_size=DEFAULT_CHUNK_SIZE, max_workers=None, **filters):
+        self.store = store
+        self.path = Path(path)
+        self.methods = [row['method'] for row in method_summary]
+        self.counts = [row['count'] for row in method_summary]
+        self.scores = [
+            row['metrics']['readability_score'].mean if 'readability_score' in row['metrics'] else 0
+            for row in method_summary
+        ]
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.filters = filters
+
+        self.status = "pending"
+        self.error = None
+        self.total_items = 0
+        self.items_done = 0
+        self.page_count = 0
+        self._thread = None
+        self._on_progress = None
+
+    @property
+    def progress(self):
+        """Fraction of the items rendered so far (the merge counts as the last step)."""
+        if self.status == "done":
+            return 1.0
+        if not self.total_items:
+            return 0.0
+        return min(self.items_done / self.total_items, 0.99)
+
+    @property
+    def running(self):
+        return self.status in ("pending", "running")
+
+    def start(self):
+        _require_pypdf()
+        self._thread = threading.Thread(target=self._run_in_subprocess, name="report-job", daemon=True)
+        self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run_in_subprocess(self):
+        self.status = "running"
+        spec = {
+            "db_path": str(self.store.db_path),
+            "path": str(self.path),
+            "methods": self.methods,
+            "counts": self.counts,
+            "scores": self.scores,
+            "chunk_size": self.chunk_size,
+            "max_workers": self.max_workers,
+            "filters": self.filters,
+        }
+        # The package may only be importable through the server's sys.path
+        env = dict(os.environ)
+        package_root = str(Path(__file__).resolve().parent.parent)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, (package_root, env.get("PYTHONPATH"))))
+        try:
+            process = subprocess.Popen(
+                [sys.executable, "-m", __name__], stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env
+            )
+            with process.stdin:
+                pickle.dump(spec, process.stdin)
+            error = None
+            for line in process.stdout:
+                update = json.loads(line)
+                error = update.pop("error", error)
+                for name, value in update.items():
+                    setattr(self, name, value)
+            process.wait()
+            if process.returncode != 0:
+                raise RuntimeError(error or f"The report process exited with code {process.returncode}")
+            self.status = "done"
+        except Exception as e:
+            self.error = e
+            self.status = "failed"
+
+    def run(self, on_progress=None):
+        """Builds the report in this process; ``on_progress(job)`` is called as items are rendered."""
+        self._on_progress = on_progress
+        self.status = "running"
+        self.total_items = self.store.count(**self.filters)
+        self._report_progress()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=self.path.parent) as work_dir:
+            parts = self._render_parts(Path(work_dir))
+            self._merge(parts)
+        self.status = "done"
+        self._report_progress()
+
+    def _report_progress(self):
+        if self._on_progress is not None:
+            self._on_progress(self)
+
+    def _render_parts(self, work_dir):
+        context = multiprocessing.get_context("spawn")
+        parts = [work_dir / "part-00000.pdf"]
+        # Bound the chunks in flight so memory stays flat however long the history is
+        pending = deque()
+        max_pending = self.max_workers * 2
+
+        with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context) as executor:
+            summary = executor.submit(
+                render_summary_pages, str(parts[0]), self.methods, self.counts, self.scores, self.total_items
+            )
+
+            first_number = 1
+            for rows in self.store.iter_rows(batch_size=self.chunk_size, **self.filters):
+                part = work_dir / f"part-{len(parts):05d}.pdf"
+                parts.append(part)
+                pending.append((executor.submit(render_item_pages, str(part), rows, first_number), len(rows)))
+                first_number += len(rows)
+
+                while len(pending) >= max_pending:
+                    self._collect(pending.popleft())
+
+            while pending:
+                self._collect(pending.popleft())
+            summary.result()
+            self.page_count += 2
+
+        return parts
+
+    def _collect(self, entry):
+        future, item_count = entry
+        self.page_count += future.result()
+        self.items_done += item_count
+        self._report_progress()
+
+    def _merge(self, parts):
+        writer = _require_pypdf()()
+        for part in parts:
+            writer.append(str(part))
+
+        # Write next to the destination and rename, so a half-written report is never served
+        partial_path = self.path.with_name(self.path.name + ".partial")
+        with open(partial_path, 'wb') as f:
+            writer.write(f)
+        writer.close()
+        os.replace(partial_path, self.path)
+
+
+HTML_HEADER = Template("""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Medical Note Simplification Report</title>
+<style>
+  body { font-family: sans-serif; margin: 2rem auto; max-width: 1100px; color: #222; }
+  h1, h2, h3 { color: #0e4c92; }
+  table { border-collapse: collapse; }
+  th, td { border: 1px solid #ddd; padding: 0.3rem 0.6rem; text-align: right; }
+  th:first-child, td:first-child { text-align: left; }
+  .charts svg { max-width: 100%; height: auto; }
+  .meta { color: #555; margin: 0.2rem 0; }
+  .notes { display: grid; grid-template-columns: 1fr 1fr; gap: 1rem; }
+  pre { white-space: pre-wrap; background: #f5f5f5; padding: 0.6rem; }
+</style>
+</head>
+<body>
+<h1>Medical Note Simplification Report</h1>
+<p>Generated on $generated. Contains analysis of $total_items simplified notes.</p>
+<h2>Summary</h2>
+<table>
+<tr><th>Method</th><th>Count</th><th>Avg. Readability</th><th>Avg. Term Density</th><th>Avg. Processing Time</th></tr>
+$summary_rows
+</table>
+<div class="charts">
+$charts
+</div>
+<h2>Simplifications</h2>
+""")
+
+HTML_SUMMARY_ROW = Template("<tr><td>$method</td><td>$count</td><td>$readability</td><td>$term_density</td><td>$processing_time</td></tr>\n")
+
+HTML_ITEM = Template("""<section>
+<h3>Simplification #$number</h3>
+<p class="meta">Method: $method | Target: $target_group | $timestamp</p>
+<p class="meta">Readability: $readability_score/100 | Term Density: $term_density% | Length Ratio: $length_ratio</p>
+<div class="notes">
+<div><h4>Original Note</h4><pre>$original_note</pre></div>
+<div><h4>Simplified Note</h4><pre>$simplified_note</pre></div>
+</div>
+</section>
+""")
+
+HTML_FOOTER = "</body>\n</html>\n"
+
+MARKDOWN_HEADER = Template("""# Medical Note Simplification Report
+
+Generated on $generated. Contains analysis of $total_items simplified notes.
+
+## Summary
+
+| Method | Count | Avg. Readability | Avg. Term Density | Avg. Processing Time |
+| --- | ---: | ---: | ---: | ---: |
+$summary_rows
+
+$charts
+## Simplifications
+
+""")
+
+MARKDOWN_SUMMARY_ROW = Template("| $method | $count | $readability | $term_density | $processing_time |\n")
+
+MARKDOWN_ITEM = Template("""### Simplification #$number
+
+Method: $method | Target: $target_group | $timestamp
+
+Readability: $readability_score/100 | Term Density: $term_density% | Length Ratio: $length_ratio
+
+**Original Note**
+
+$original_note
+
+**Simplified Note**
+
+$simplified_note
+
+""")
+
+
+def _summary_mean(row, metric, value_format):
+    stats = row['metrics'].get(metric)
+    return value_format.format(stats.mean) if stats and stats.count else "-"
+
+
+def _svg_element(svg):
+    """Strips the XML prolog so an SVG document can be inlined in HTML."""
+    text = svg.decode("utf-8") if isinstance(svg, bytes) else svg
+    return text[text.find("<svg"):]
+
+
+def _markdown_quote(text):
+    # Blockquote every line so note text cannot be read as Markdown structure
+    return "\n".join("> " + line if line else ">" for line in text.splitlines()) or ">"
+
+
+def write_text_report(store, path, method_summary, fmt="html", charts=(), batch_size=DEFAULT_BATCH_SIZE, **filters):
+    """Writes an HTML or Markdown report of the matching history items to ``path``.
+
+    ``charts`` is a sequence of ``(title, svg)`` pairs, embedded once near the
+    top of the report. Items are read from the store and written in batches,
+    so memory use does not grow with the size of the history. Returns the
+    number of items written.
+    """
+    if fmt not in REPORT_FORMATS:
+        raise ValueError(f"Unknown report format {fmt!r}, expected one of {', '.join(REPORT_FORMATS)}")
+
+    if fmt == "html":
+        header, summary_row, item_template, footer = HTML_HEADER, HTML_SUMMARY_ROW, HTML_ITEM, HTML_FOOTER
+        escape, note = html.escape, html.escape
+        chart_block = "\n".join(f'<figure aria-label="{html.escape(title)}">{_svg_element(svg)}</figure>' for title, svg in charts)
+    else:
+        header, summary_row, item_template, footer = MARKDOWN_HEADER, MARKDOWN_SUMMARY_ROW, MARKDOWN_ITEM, ""
+        escape, note = lambda text: text.replace("|", "\\|"), _markdown_quote
+        chart_block = "".join(
+            f"![{title}](data:image/svg+xml;base64,{base64.b64encode(svg if isinstance(svg, bytes) else svg.encode()).decode()})\n\n"
+            for title, svg in charts
+        )
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    summary_rows = "".join(
+        summary_row.substitute(
+            method=escape(row['method']),
+            count=row['count'],
+            readability=_summary_mean(row, 'readability_score', "{:.1f}"),
+            term_density=_summary_mean(row, 'term_density', "{:.1f}%"),
+            processing_time=_summary_mean(row, 'processing_time', "{:.2f}s"),
+        )
+        for row in method_summary
+    )
+
+    item_count = 0
+    # Write next to the destination and rename, so a half-written report is never served
+    partial_path = path.with_name(path.name + ".partial")
+    with open(partial_path, 'w', encoding='utf-8') as f:
+        f.write(header.substitute(
+            generated=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            total_items=store.count(**filters),
+            summary_rows=summary_rows.rstrip("\n"),
+            charts=chart_block,
+        ))
+
+        for rows in store.iter_rows(batch_size=batch_size, **filters):
+            f.write("".join(
+                item_template.substitute(
+                    number=item_count + offset,
+                    method=escape(item['method']),
+                    target_group=escape(item['target_group']),
+                    timestamp=item['timestamp'],
+                    readability_score=f"{item['readability_score']:.1f}",
+                    term_density=f"{item['term_density']:.1f}",
+                    length_ratio=f"{item['length_ratio']:.2f}",
+                    original_note=note(item['original_note']),
+                    simplified_note=note(item['simplified_note']),
+                )
+                for offset, item in enumerate(rows, start=1)
+            ))
+            item_count += len(rows)
+
+        f.write(footer)
+    os.replace(partial_path, path)
+
+    return item_count
+
+
+def main():
+    """Builds a PDF report described by a pickled ``ReportJob`` spec on stdin (see ``ReportJob.start``).
+
+    Progress is written to stdout as JSON lines of job attributes.
+    """
+    from .history_store import HistoryStore
+
+    spec = pickle.load(sys.stdin.buffer)
+
+    def report(job):
+        print(json.dumps({"total_items": job.total_items, "items_done": job.items_done, "page_count": job.page_count}),
+              flush=True)
+
+    store = HistoryStore(spec["db_path"])
+    summary = [{"method": method, "count": count, "metrics": {}} for method, count in zip(spec["methods"], spec["counts"])]
+    job = ReportJob(store, spec["path"], summary, spec["chunk_size"], spec["max_workers"], **spec["filters"])
+    job.scores = spec["scores"]
+    try:
+        job.run(on_progress=report)
+    except Exception as e:
+        print(json.dumps({"error": f"{type(e).__name__}: {e}"}), flush=True)
+        sys.exit(1)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
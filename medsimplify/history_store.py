@@ -0,0 +1,686 @@
+"""SQLite-backed storage for the processing history.
+
+The Results Explorer used to keep every simplified note in session memory and
+recompute its statistics with list comprehensions on each rerun. History now
+lives in an embedded SQLite database with indexes on the columns we filter
+and group by, and summary statistics are computed with SQL aggregates.
+
+Note texts are kept in a separate content-addressed table (see ``note_blobs``):
+history rows only hold the hashes of their original and simplified notes, and
+the texts are decompressed when an item is actually opened.
+
+Every write also updates running aggregates (see ``running_stats``) per day,
+method, target group and model in the same transaction, so dashboards read
+precomputed statistics instead of scanning the history.
+
+The telemetry of every LLM call (latency, time to first token, tokens, retries
+and errors) is kept in its own table for the performance dashboard.
+
+With a ``scrubber`` (see ``phi``) notes are de-identified before they are
+stored; the surrogates are not kept, so stored notes cannot be restored.
+"""
+
+import pickle
+import queue
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from .note_blobs import compress_note, decompress_note, note_hash
+from .phi import kept_tokens
+from .running_stats import QuantileSketch, RunningStats
+
+# Metrics stored as typed columns, in the order they appear in a history item
+METRIC_COLUMNS = (
+    "readability_score",
+    "original_readability",
+    "term_density",
+    "original_term_density",
+    "length_ratio",
+    "processing_time",
+)
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+DATE_FORMAT = "%Y-%m-%d"
+
+SCHEMA_VERSION = 4
+
+# Dimensions the running aggregates are broken down by
+AGGREGATE_DIMENSIONS = ("method", "target_group", "model")
+
+# Statistics kept for successful LLM calls
+LLM_CALL_METRICS = ("latency", "time_to_first_token", "tokens_per_second")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    method TEXT NOT NULL,
+    target_group TEXT NOT NULL,
+    model TEXT,
+    original_note_hash TEXT NOT NULL,
+    simplified_note_hash TEXT NOT NULL,
+    readability_score REAL,
+    original_readability REAL,
+    term_density REAL,
+    original_term_density REAL,
+    length_ratio REAL,
+    processing_time REAL
+);
+CREATE INDEX IF NOT EXISTS idx_history_method ON history (method);
+CREATE INDEX IF NOT EXISTS idx_history_target_group ON history (target_group);
+CREATE INDEX IF NOT EXISTS idx_history_model ON history (model);
+CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history (timestamp);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (key, value)
+);
+
+CREATE TABLE IF NOT EXISTS note_blobs (
+    hash TEXT PRIMARY KEY,
+    codec TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    body BLOB NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS aggregates (
+    day TEXT NOT NULL,
+    method TEXT NOT NULL,
+    target_group TEXT NOT NULL,
+    model TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    total REAL NOT NULL,
+    total_sq REAL NOT NULL,
+    minimum REAL,
+    maximum REAL,
+    sketch TEXT NOT NULL,
+    PRIMARY KEY (day, method, target_group, model, metric)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS llm_calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    method TEXT NOT NULL,
+    target_group TEXT NOT NULL,
+    model TEXT,
+    latency REAL NOT NULL,
+    time_to_first_token REAL,
+    completion_tokens INTEGER,
+    retries INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_llm_calls_timestamp ON llm_calls (timestamp);
+"""
+
+_HISTORY_INDEXES = ("idx_history_method", "idx_history_target_group", "idx_history_model", "idx_history_timestamp")
+
+_INSERT_HISTORY = f"""INSERT INTO history (id, timestamp, method, target_group, model,
+                                            original_note_hash, simplified_note_hash, {', '.join(METRIC_COLUMNS)})
+                      VALUES ({', '.join('?' * (7 + len(METRIC_COLUMNS)))})"""
+
+_INSERT_BLOB = "INSERT OR IGNORE INTO note_blobs (hash, codec, size, body) VALUES (?, ?, ?, ?)"
+
+# Columns the history table can be sorted by
+SORTABLE_COLUMNS = (
+    "id",
+    "timestamp",
+    "method",
+    "target_group",
+    "model",
+    "readability_score",
+    "term_density",
+    "length_ratio",
+    "processing_time",
+)
+
+# Columns needed to list history items without loading the note texts
+_LISTING_COLUMNS = "id, timestamp, method, target_group, model, " + ", ".join(METRIC_COLUMNS)
+
+
+def _build_filters(start_date=None, end_date=None, target_groups=None, methods=None, since=None, time_column="timestamp"):
+    """Returns a WHERE clause and its parameters for the common history filters.
+
+    ``start_date`` and ``end_date`` are inclusive ``datetime.date`` values and
+    ``since`` is an optional ``datetime`` lower bound. Empty ``target_groups``
+    or ``methods`` sequences mean "all".
+    """
+    clauses = []
+    params = []
+
+    if since is not None:
+        clauses.append(f"{time_column} >= ?")
+        params.append(since.strftime(TIMESTAMP_FORMAT))
+
+    if start_date is not None:
+        clauses.append(f"{time_column} >= ?")
+        params.append(start_date.strftime(DATE_FORMAT))
+    if end_date is not None:
+        clauses.append(f"{time_column} < ?")
+        params.append((end_date + timedelta(days=1)).strftime(DATE_FORMAT))
+    if target_groups:
+        clauses.append(f"target_group IN ({', '.join('?' * len(target_groups))})")
+        params.extend(target_groups)
+    if methods:
+        clauses.append(f"method IN ({', '.join('?' * len(methods))})")
+        params.extend(methods)
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+
+def _row_to_item(row):
+    """Converts a history row into the dictionary layout used by the app.
+
+    Note texts are included only when the row was loaded with them.
+    """
+    keys = row.keys()
+    item = {
+        "id": row["id"],
+        "timestamp": row["timestamp"],
+        "method": row["method"],
+        "target_group": row["target_group"],
+        "model": row["model"],
+        "original_note_hash": row["original_note_hash"],
+        "simplified_note_hash": row["simplified_note_hash"],
+        "metrics": {name: row[name] for name in METRIC_COLUMNS},
+    }
+    if "original_body" in keys:
+        item["original_note"] = decompress_note(row["original_codec"], row["original_body"])
+        item["simplified_note"] = decompress_note(row["simplified_codec"], row["simplified_body"])
+    return item
+
+
+def _insert_items(conn, items):
+    """Inserts history items (with note texts) and their note blobs on ``conn``."""
+    blobs = {}
+    rows = []
+    for item in items:
+        hashes = []
+        for text in (item["original_note"], item["simplified_note"]):
+            digest = note_hash(text)
+            if digest not in blobs:
+                codec, body = compress_note(text)
+                blobs[digest] = (digest, codec, len(text), body)
+            hashes.append(digest)
+
+        rows.append(
+            (item.get("id"), item["timestamp"], item["method"], item["target_group"], item.get("model"))
+            + tuple(hashes)
+            + tuple(item["metrics"].get(name) for name in METRIC_COLUMNS)
+        )
+
+    conn.executemany(_INSERT_BLOB, blobs.values())
+    cursor = conn.executemany(_INSERT_HISTORY, rows) if len(rows) > 1 else conn.execute(_INSERT_HISTORY, rows[0])
+    _update_aggregates(conn, items)
+    return cursor.lastrowid
+
+
+def _stats_from_row(row):
+    return RunningStats(
+        count=row["count"],
+        total=row["total"],
+        total_sq=row["total_sq"],
+        minimum=row["minimum"],
+        maximum=row["maximum"],
+        sketch=QuantileSketch.from_json(row["sketch"]),
+    )
+
+
+def _update_aggregates(conn, items):
+    """Folds the metrics of new history items into the running aggregates.
+
+    Items are first combined in memory per aggregate key, so the cost is one
+    read and one write per key touched, independent of the history size.
+    """
+    pending = {}
+    for item in items:
+        key = (item["timestamp"][:10], item["method"], item["target_group"], item.get("model") or "")
+        for name in METRIC_COLUMNS:
+            value = item["metrics"].get(name)
+            if value is not None:
+                pending.setdefault(key + (name,), RunningStats()).add(value)
+
+    for key, stats in pending.items():
+        row = conn.execute(
+            "SELECT * FROM aggregates WHERE day = ? AND method = ? AND target_group = ? AND model = ? AND metric = ?",
+            key,
+        ).fetchone()
+        if row is not None:
+            stats.merge(_stats_from_row(row))
+        conn.execute(
+            "INSERT OR REPLACE INTO aggregates VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            key + (stats.count, stats.total, stats.total_sq, stats.minimum, stats.maximum, stats.sketch.to_json()),
+        )
+
+
+def _rebuild_aggregates(conn):
+    """Recomputes the running aggregates from the stored history."""
+    conn.execute("DELETE FROM aggregates")
+    last_id = 0
+    while True:
+        rows = conn.execute("SELECT * FROM history WHERE id > ? ORDER BY id LIMIT 5000", (last_id,)).fetchall()
+        if not rows:
+            return
+        _update_aggregates(conn, [_row_to_item(row) for row in rows])
+        last_id = rows[-1]["id"]
+
+
+# Joins a history row with both of its note bodies
+_WITH_NOTES = """SELECT h.*,
+                        o.codec AS original_codec, o.body AS original_body,
+                        s.codec AS simplified_codec, s.body AS simplified_body
+                 FROM history h
+                 JOIN note_blobs o ON o.hash = h.original_note_hash
+                 JOIN note_blobs s ON s.hash = h.simplified_note_hash"""
+
+
+def _create_schema(conn):
+    # Statements are run one by one; executescript() would commit the open transaction
+    for statement in _SCHEMA.split(";"):
+        if statement.strip():
+            conn.execute(statement)
+
+
+class HistoryStore:
+    """Persists simplification results in a SQLite database.
+
+    One database file can be shared by every Streamlit session and by several
+    app processes on the same host. The database runs in WAL mode so readers
+    never block the writer, every write is a single ``BEGIN IMMEDIATE``
+    transaction, and a busy timeout makes concurrent writers wait for each
+    other instead of failing. SQLite locking is not reliable on network file
+    systems, so replicas on different hosts need a local database each.
+
+    With a ``scrubber`` (a ``phi.PhiScrubber``) identifiers in the original
+    and simplified notes are replaced before they are written; a simplified
+    note reuses the tokens of its original.
+    """
+
+    def __init__(self, db_path, busy_timeout=30.0, scrubber=None):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.busy_timeout = busy_timeout
+        self.scrubber = scrubber
+        self._idle_connections = queue.LifoQueue()
+
+        with self._write() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            self._migrate(conn)
+            _create_schema(conn)
+            if version < 3:
+                _rebuild_aggregates(conn)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _connect(self):
+        # isolation_level=None leaves transaction control to _write()
+        conn = sqlite3.connect(
+            str(self.db_path),
+            timeout=self.busy_timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        """Borrows a connection from the pool; each thread uses its own while borrowed."""
+        try:
+            conn = self._idle_connections.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            self._idle_connections.put(conn)
+
+    @contextmanager
+    def _write(self):
+        """Runs the block in a write transaction that other writers wait for."""
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _migrate(self, conn):
+        """Moves note texts of a version 1 database into the blob table."""
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(history)")}
+        if "original_note" not in columns:
+            return
+
+        conn.execute("ALTER TABLE history RENAME TO history_v1")
+        for index in _HISTORY_INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {index}")
+        _create_schema(conn)
+
+        last_id = 0
+        while True:
+            rows = conn.execute("SELECT * FROM history_v1 WHERE id > ? ORDER BY id LIMIT 5000", (last_id,)).fetchall()
+            if not rows:
+                break
+            _insert_items(conn, [dict(row, metrics={name: row[name] for name in METRIC_COLUMNS}) for row in rows])
+            last_id = rows[-1]["id"]
+
+        conn.execute("DROP TABLE history_v1")
+
+    def close(self):
+        while True:
+            try:
+                self._idle_connections.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _query(self, sql, params=()):
+        with self._connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def _scrub_items(self, items):
+        """Returns the items with identifiers replaced in their notes, when there is a scrubber."""
+        if self.scrubber is None:
+            return items
+        originals = self.scrubber.scrub_batch(item["original_note"] for item in items)
+        scrubbed = []
+        for item, (original_note, surrogates) in zip(items, originals):
+            # An original that was scrubbed before (as job results are) has no surrogates of its own, so
+            # the tokens already in it are kept too and new identifiers are numbered after them
+            surrogates = dict(kept_tokens(original_note), **surrogates)
+            simplified_note, _ = self.scrubber.scrub(item["simplified_note"], surrogates)
+            scrubbed.append(dict(item, original_note=original_note, simplified_note=simplified_note))
+        return scrubbed
+
+    def add(self, original_note, simplified_note, method, target_group, metrics, model=None, timestamp=None):
+        """Stores one simplification result and returns its id."""
+        if timestamp is None:
+            timestamp = time.strftime(TIMESTAMP_FORMAT)
+
+        item = {
+            "timestamp": timestamp,
+            "method": method,
+            "target_group": target_group,
+            "model": model,
+            "original_note": original_note,
+            "simplified_note": simplified_note,
+            "metrics": metrics,
+        }
+        items = self._scrub_items([item])
+        with self._write() as conn:
+            return _insert_items(conn, items)
+
+    def import_items(self, items):
+        """Bulk-inserts history items in the legacy dictionary layout."""
+        items = self._scrub_items([dict(item, id=None) for item in items])
+        if not items:
+            return 0
+        with self._write() as conn:
+            _insert_items(conn, items)
+        return len(items)
+
+    def migrate_pickle(self, pickle_path):
+        """Imports a legacy ``processing_history.pkl`` file once.
+
+        The import is recorded in the database in the same transaction, so
+        processes starting at the same time cannot import the file twice.
+        The file is renamed afterwards.
+        """
+        pickle_path = Path(pickle_path)
+        if not pickle_path.exists():
+            return 0
+
+        with self._write() as conn:
+            marker = ("legacy_pickle_imported", str(pickle_path.resolve()))
+            if conn.execute("SELECT 1 FROM meta WHERE key = ? AND value = ?", marker).fetchone():
+                imported = 0
+            else:
+                with open(pickle_path, "rb") as f:
+                    items = pickle.load(f)
+                if items:
+                    _insert_items(conn, self._scrub_items([dict(item, id=None) for item in items]))
+                conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", marker)
+                imported = len(items)
+
+        try:
+            pickle_path.rename(pickle_path.with_name(pickle_path.name + ".migrated"))
+        except OSError:
+            pass  # Another process renamed it first
+        return imported
+
+    def latest_id(self):
+        """Returns the id of the newest history item (0 when empty).
+
+        Ids only grow, so this doubles as a version number for the history:
+        anything derived from the history can be cached until it changes.
+        """
+        return self._query("SELECT COALESCE(MAX(id), 0) FROM history")[0][0]
+
+    def latest_llm_call_id(self):
+        """Returns the id of the newest recorded LLM call (0 when none); a version number like ``latest_id``."""
+        return self._query("SELECT COALESCE(MAX(id), 0) FROM llm_calls")[0][0]
+
+    def load_note(self, digest):
+        """Returns the text stored under a note hash, or None."""
+        rows = self._query("SELECT codec, body FROM note_blobs WHERE hash = ?", (digest,))
+        return decompress_note(rows[0]["codec"], rows[0]["body"]) if rows else None
+
+    def storage_stats(self):
+        """Returns the number of stored notes and their text and compressed sizes in bytes."""
+        row = self._query(
+            "SELECT COUNT(*) AS notes, SUM(size) AS text_bytes, SUM(LENGTH(body)) AS stored_bytes FROM note_blobs"
+        )[0]
+        return dict(row)
+
+    def count(self, start_date=None, end_date=None, target_groups=None, methods=None):
+        where, params = _build_filters(start_date, end_date, target_groups, methods)
+        return self._query(f"SELECT COUNT(*) FROM history {where}", params)[0][0]
+
+    def aggregate_summary(self, group_by=("method",), **filters):
+        """Returns precomputed statistics for each combination of ``group_by`` values.
+
+        ``group_by`` is any subset of ``AGGREGATE_DIMENSIONS``. Each result has
+        the dimension values, an item ``count`` and a ``metrics`` dictionary
+        mapping metric names to ``RunningStats`` (mean, stddev, min/max and
+        quantiles). Date filters apply at day granularity.
+        """
+        for dimension in group_by:
+            if dimension not in AGGREGATE_DIMENSIONS:
+                raise ValueError(f"Cannot group aggregates by {dimension!r}")
+
+        where, params = _build_filters(time_column="day", **filters)
+        groups = {}
+        for row in self._query(f"SELECT * FROM aggregates {where}", params):
+            key = tuple(row[dimension] or None for dimension in group_by)
+            metrics = groups.setdefault(key, {})
+            metrics.setdefault(row["metric"], RunningStats()).merge(_stats_from_row(row))
+
+        summary = []
+        for key in sorted(groups, key=lambda values: tuple(value or "" for value in values)):
+            metrics = groups[key]
+            entry = dict(zip(group_by, key))
+            entry["count"] = max(stats.count for stats in metrics.values())
+            entry["metrics"] = metrics
+            summary.append(entry)
+        return summary
+
+    def add_llm_call(self, method, target_group, telemetry, timestamp=None):
+        """Records the telemetry of one LLM call (see ``llm_client.chat_completion``)."""
+        if timestamp is None:
+            timestamp = time.strftime(TIMESTAMP_FORMAT)
+
+        with self._write() as conn:
+            conn.execute(
+                """INSERT INTO llm_calls (timestamp, method, target_group, model, latency,
+                                          time_to_first_token, completion_tokens, retries, error)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    timestamp,
+                    method,
+                    target_group,
+                    telemetry.get("model"),
+                    telemetry["latency"],
+                    telemetry.get("time_to_first_token"),
+                    telemetry.get("completion_tokens"),
+                    telemetry.get("retries", 0),
+                    telemetry.get("error"),
+                ),
+            )
+
+    def llm_call_summary(self, group_by=("method",), **filters):
+        """Returns latency, throughput, error and retry statistics of the recorded LLM calls.
+
+        ``group_by`` is any subset of ``AGGREGATE_DIMENSIONS``. Each result has
+        the dimension values, the number of ``calls``, ``errors`` and
+        ``retried`` calls, the timestamps of the ``first_call`` and
+        ``last_call``, and a ``metrics`` dictionary mapping ``latency``,
+        ``time_to_first_token`` and ``tokens_per_second`` to ``RunningStats``.
+        Only successful calls contribute to the metrics.
+        """
+        for dimension in group_by:
+            if dimension not in AGGREGATE_DIMENSIONS:
+                raise ValueError(f"Cannot group LLM calls by {dimension!r}")
+
+        where, params = _build_filters(**filters)
+        groups = {}
+        for row in self._query(
+            f"""SELECT timestamp, method, target_group, model, latency, time_to_first_token,
+                       completion_tokens, retries, error
+                FROM llm_calls {where} ORDER BY id""",
+            params,
+        ):
+            key = tuple(row[dimension] for dimension in group_by)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = {
+                    "calls": 0,
+                    "errors": 0,
+                    "retried": 0,
+                    "first_call": row["timestamp"],
+                    "last_call": row["timestamp"],
+                    "metrics": {name: RunningStats() for name in LLM_CALL_METRICS},
+                }
+            group["calls"] += 1
+            group["last_call"] = row["timestamp"]
+            if row["retries"]:
+                group["retried"] += 1
+            if row["error"] is not None:
+                group["errors"] += 1
+                continue
+
+            metrics = group["metrics"]
+            metrics["latency"].add(row["latency"])
+            ttft = row["time_to_first_token"]
+            if ttft is not None:
+                metrics["time_to_first_token"].add(ttft)
+            # Generation speed after the first token, when the timings allow it
+            generation_time = row["latency"] - (ttft or 0)
+            if row["completion_tokens"] and generation_time > 0:
+                metrics["tokens_per_second"].add(row["completion_tokens"] / generation_time)
+
+        summary = []
+        for key in sorted(groups, key=lambda values: tuple(value or "" for value in values)):
+            entry = dict(zip(group_by, key))
+            entry.update(groups[key])
+            summary.append(entry)
+        return summary
+
+    def items(self, start_date=None, end_date=None, target_groups=None, methods=None, with_notes=False, limit=None):
+        """Returns the matching history items, oldest first.
+
+        Note texts are only decompressed and included when ``with_notes`` is set.
+        """
+        where, params = _build_filters(start_date, end_date, target_groups, methods)
+        source = _WITH_NOTES if with_notes else "SELECT * FROM history"
+        rows = self._query(f"{source} {where} ORDER BY id LIMIT ?", params + [-1 if limit is None else limit])
+        return [_row_to_item(row) for row in rows]
+
+    def page(self, sort_by="id", descending=True, limit=25, offset=0, **filters):
+        """Returns one page of history rows without the note texts.
+
+        Sorting, filtering and paging all happen in the database, so only the
+        requested rows are materialised.
+        """
+        if sort_by not in SORTABLE_COLUMNS:
+            raise ValueError(f"Cannot sort history by {sort_by!r}")
+
+        where, params = _build_filters(**filters)
+        direction = "DESC" if descending else "ASC"
+        rows = self._query(
+            f"""SELECT {_LISTING_COLUMNS} FROM history {where}
+                ORDER BY {sort_by} {direction}, id {direction}
+                LIMIT ? OFFSET ?""",
+            params + [limit, offset],
+        )
+        return [dict(row) for row in rows]
+
+    def search(self, query="", limit=50, **filters):
+        """Returns up to ``limit`` rows whose id, method, model or timestamp match ``query``."""
+        where, params = _build_filters(**filters)
+        query = query.strip()
+        if query:
+            clause = "(CAST(id AS TEXT) = ? OR method LIKE ? OR model LIKE ? OR timestamp LIKE ?)"
+            pattern = f"%{query}%"
+            where = f"{where} AND {clause}" if where else f"WHERE {clause}"
+            params += [query, pattern, pattern, pattern]
+
+        rows = self._query(
+            f"SELECT id, timestamp, method, target_group FROM history {where} ORDER BY id DESC LIMIT ?",
+            params + [limit],
+        )
+        return [dict(row) for row in rows]
+
+    def iter_rows(self, batch_size=5000, **filters):
+        """Yields batches of complete history rows (notes included), oldest first.
+
+        Batches are fetched with keyset pagination on ``id`` so exports never
+        hold more than one batch in memory.
+        """
+        where, params = _build_filters(**filters)
+        id_clause = f"{where} AND id > ?" if where else "WHERE id > ?"
+        last_id = 0
+        while True:
+            rows = self._query(
+                f"{_WITH_NOTES} {id_clause} ORDER BY id LIMIT ?",
+                params + [last_id, batch_size],
+            )
+            if not rows:
+                return
+            batch = []
+            for row in rows:
+                item = _row_to_item(row)
+                flat = {key: item[key] for key in item if key != "metrics"}
+                flat.update(item["metrics"])
+                batch.append(flat)
+            yield batch
+            last_id = rows[-1]["id"]
+
+    def get(self, item_id):
+        """Returns one history item with its note texts."""
+        rows = self._query(f"{_WITH_NOTES} WHERE id = ?", (item_id,))
+        return _row_to_item(rows[0]) if rows else None
+
+    def target_groups(self):
+        rows = self._query("SELECT DISTINCT target_group FROM history ORDER BY target_group")
+        return [row[0] for row in rows]
+
+    def methods(self):
+        rows = self._query("SELECT DISTINCT method FROM history ORDER BY method")
+        return [row[0] for row in rows]
+
+    def date_bounds(self):
+        """Returns the dates of the oldest and newest history items."""
+        first, last = self._query("SELECT MIN(timestamp), MAX(timestamp) FROM history")[0]
+        if first is None:
+            return None, None
+        return (
+            datetime.strptime(first, TIMESTAMP_FORMAT).date(),
+            datetime.strptime(last, TIMESTAMP_FORMAT).date(),
+        )
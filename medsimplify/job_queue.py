@@ -0,0 +1,477 @@
+"""Persistent queue of batch simplification jobs.
+
+A job is a list of notes simplified with one method, target group and model.
+Jobs and the result of every note are kept in a SQLite database, so progress
+and partial results survive reruns of the Streamlit script and restarts of
+the server. ``JobRunner`` works through the queue on background threads,
+outside the script thread, so a user can queue a run of hundreds of notes
+and keep using the app while it runs.
+
+LLM backends (and the API keys in them) are never written to the database.
+A job that was interrupted by a restart stays in the queue until it is
+resumed with a backend. With a ``scrubber`` (see ``phi``) notes are
+de-identified before they are queued and results before they are stored;
+the surrogates are not kept, so the stored notes cannot be restored.
+
+Several processes can share one queue. A runner leases each note it claims
+and renews its leases while it runs; a note whose lease has expired, because
+its runner stopped, is claimed again by the next runner that works on the
+job, while notes held by a live runner are never taken from it.
+"""
+
+import itertools
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from .phi import kept_tokens
+from .pipeline import DEFAULT_MAX_WORKERS, simplify_stream
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Notes stored per transaction when a job is submitted
+SUBMIT_BATCH_SIZE = 500
+
+# Seconds a claimed note stays leased to its runner without being renewed
+DEFAULT_LEASE_SECONDS = 60.0
+
+# Statuses of a job; queued and running jobs are unfinished
+JOB_STATUSES = ("queued", "running", "completed", "cancelled", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created TEXT NOT NULL,
+    finished TEXT,
+    status TEXT NOT NULL,
+    method TEXT NOT NULL,
+    target_group TEXT NOT NULL,
+    model TEXT NOT NULL,
+    temperature REAL NOT NULL,
+    total INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id INTEGER NOT NULL REFERENCES jobs (id),
+    position INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    original_note TEXT NOT NULL,
+    simplified_note TEXT,
+    metrics TEXT,
+    error TEXT,
+    finished TEXT,
+    owner TEXT,
+    lease_expires REAL,
+    PRIMARY KEY (job_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_job_items_status ON job_items (job_id, status);
+"""
+
+# Created after _migrate, which adds the owner column to older databases
+_RUNNING_INDEX = "CREATE INDEX IF NOT EXISTS idx_job_items_running ON job_items (owner) WHERE status = 'running'"
+
+
+def _job_from_row(row):
+    job = dict(row)
+    job["done"] = job["completed_items"] + job["failed_items"]
+    job["progress"] = job["done"] / job["total"] if job["total"] else 1.0
+    return job
+
+
+class JobQueue:
+    """Stores jobs and their per-note results in a SQLite database.
+
+    Connections are pooled and writes run in ``BEGIN IMMEDIATE`` transactions,
+    the same way as in ``HistoryStore``, so the script thread and the runner
+    threads can use one queue concurrently.
+
+    With a ``scrubber`` (a ``phi.PhiScrubber``) identifiers in the queued
+    notes and in the simplified notes are replaced before they are written,
+    so the runner simplifies the scrubbed notes.
+    """
+
+    def __init__(self, db_path, busy_timeout=30.0, scrubber=None):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.busy_timeout = busy_timeout
+        self.scrubber = scrubber
+        self._idle_connections = queue.LifoQueue()
+
+        with self._write() as conn:
+            for statement in _SCHEMA.split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+            self._migrate(conn)
+            conn.execute(_RUNNING_INDEX)
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            str(self.db_path),
+            timeout=self.busy_timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        try:
+            conn = self._idle_connections.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            self._idle_connections.put(conn)
+
+    @contextmanager
+    def _write(self):
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _migrate(self, conn):
+        """Adds the lease columns to a database created before notes were leased."""
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(job_items)")}
+        if "owner" not in columns:
+            conn.execute("ALTER TABLE job_items ADD COLUMN owner TEXT")
+            conn.execute("ALTER TABLE job_items ADD COLUMN lease_expires REAL")
+
+    def close(self):
+        while True:
+            try:
+                self._idle_connections.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def submit(self, notes, method, target_group, model, temperature=0.3):
+        """Queues a job for ``notes`` and returns its id.
+
+        ``notes`` is read lazily and stored ``SUBMIT_BATCH_SIZE`` at a time,
+        each batch in its own transaction, so it can be a generator over an
+        export far larger than memory without holding up running jobs. If
+        reading ``notes`` fails, the partly stored job is removed.
+        """
+        with self._write() as conn:
+            cursor = conn.execute(
+                """INSERT INTO jobs (created, status, method, target_group, model, temperature, total)
+                   VALUES (?, 'queued', ?, ?, ?, ?, 0)""",
+                (time.strftime(TIMESTAMP_FORMAT), method, target_group, model, temperature),
+            )
+            job_id = cursor.lastrowid
+
+        items = ((job_id, position, note) for position, note in enumerate(notes))
+        total = 0
+        try:
+            while True:
+                batch = list(itertools.islice(items, SUBMIT_BATCH_SIZE))
+                if not batch:
+                    break
+                if self.scrubber is not None:
+                    scrubbed = self.scrubber.scrub_batch(note for _, _, note in batch)
+                    batch = [(job_id, position, note) for (job_id, position, _), (note, _) in zip(batch, scrubbed)]
+                with self._write() as conn:
+                    conn.executemany("INSERT INTO job_items (job_id, position, original_note) VALUES (?, ?, ?)", batch)
+                    total += len(batch)
+                    conn.execute("UPDATE jobs SET total = ? WHERE id = ?", (total, job_id))
+        except BaseException:
+            with self._write() as conn:
+                conn.execute("DELETE FROM job_items WHERE job_id = ?", (job_id,))
+                conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            raise
+        return job_id
+
+    def _jobs(self, where="", params=(), limit=None):
+        sql = f"""SELECT jobs.*,
+                         COALESCE(SUM(job_items.status = 'completed'), 0) AS completed_items,
+                         COALESCE(SUM(job_items.status = 'failed'), 0) AS failed_items
+                  FROM jobs LEFT JOIN job_items ON job_items.job_id = jobs.id
+                  {where}
+                  GROUP BY jobs.id ORDER BY jobs.id DESC"""
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self._connection() as conn:
+            return [_job_from_row(row) for row in conn.execute(sql, params)]
+
+    def job(self, job_id):
+        """Returns a job with its progress, or None if it does not exist."""
+        jobs = self._jobs("WHERE jobs.id = ?", (job_id,))
+        return jobs[0] if jobs else None
+
+    def jobs(self, limit=20):
+        """Returns the most recent jobs, newest first."""
+        return self._jobs(limit=limit)
+
+    def unfinished_jobs(self):
+        """Returns the ids of queued and running jobs, oldest first."""
+        with self._connection() as conn:
+            rows = conn.execute("SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY id").fetchall()
+        return [row["id"] for row in rows]
+
+    def results(self, job_id, limit=None, with_notes=False):
+        """Returns the finished items of a job, most recently finished first."""
+        columns = "position, status, metrics, error, finished"
+        if with_notes:
+            columns += ", original_note, simplified_note"
+        sql = f"""SELECT {columns} FROM job_items
+                  WHERE job_id = ? AND status IN ('completed', 'failed')
+                  ORDER BY finished DESC, position DESC"""
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self._connection() as conn:
+            rows = conn.execute(sql, (job_id,)).fetchall()
+        return [dict(row, metrics=json.loads(row["metrics"]) if row["metrics"] else None) for row in rows]
+
+    def claim_item(self, job_id, owner, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Leases the next note of a job to ``owner`` and returns ``(position, note)``, or None.
+
+        Pending notes are claimed first, then running notes whose lease has
+        expired because the runner holding them stopped.
+        """
+        now = time.time()
+        with self._write() as conn:
+            conn.execute("UPDATE jobs SET status = 'running' WHERE id = ? AND status = 'queued'", (job_id,))
+            row = conn.execute(
+                """SELECT position, original_note FROM job_items
+                   WHERE job_id = ? AND (status = 'pending' OR (status = 'running' AND COALESCE(lease_expires, 0) < ?))
+                   ORDER BY position LIMIT 1""",
+                (job_id, now),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE job_items SET status = 'running', owner = ?, lease_expires = ? WHERE job_id = ? AND position = ?",
+                (owner, now + lease_seconds, job_id, row["position"]),
+            )
+        return row["position"], row["original_note"]
+
+    def renew_leases(self, owner, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Extends the leases of the notes ``owner`` is running."""
+        with self._write() as conn:
+            conn.execute(
+                "UPDATE job_items SET lease_expires = ? WHERE owner = ? AND status = 'running'",
+                (time.time() + lease_seconds, owner),
+            )
+
+    def finish_item(self, job_id, position, result, owner=None):
+        """Stores the result of one note (see ``medsimplify.simplify``).
+
+        With ``owner``, the result is only stored while the note is leased to
+        it. Returns whether the result was stored.
+        """
+        simplified_note = result["simplified_note"]
+        if self.scrubber is not None and simplified_note:
+            # The original was scrubbed when it was queued; new identifiers get tokens after its own
+            simplified_note, _ = self.scrubber.scrub(simplified_note, kept_tokens(result["original_note"]))
+        owner_clause = " AND owner = ?" if owner is not None else ""
+        with self._write() as conn:
+            cursor = conn.execute(
+                f"""UPDATE job_items SET status = ?, simplified_note = ?, metrics = ?, error = ?, finished = ?
+                    WHERE job_id = ? AND position = ?{owner_clause}""",
+                (
+                    "failed" if result["error"] else "completed",
+                    simplified_note,
+                    json.dumps(result["metrics"]) if result["metrics"] else None,
+                    result["error"],
+                    time.strftime(TIMESTAMP_FORMAT),
+                    job_id,
+                    position,
+                ) + ((owner,) if owner is not None else ()),
+            )
+        return cursor.rowcount > 0
+
+    def fail_running_items(self, job_id, owner, error):
+        """Marks the notes of a job that ``owner`` is running as failed, when the runner cannot finish them."""
+        with self._write() as conn:
+            conn.execute(
+                """UPDATE job_items SET status = 'failed', error = ?, finished = ?
+                   WHERE job_id = ? AND owner = ? AND status = 'running'""",
+                (error, time.strftime(TIMESTAMP_FORMAT), job_id, owner),
+            )
+
+    def finish_job(self, job_id):
+        """Marks a job as completed once no notes are left, and returns its status."""
+        with self._write() as conn:
+            status = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()["status"]
+            left = conn.execute(
+                "SELECT COUNT(*) FROM job_items WHERE job_id = ? AND status IN ('pending', 'running')",
+                (job_id,),
+            ).fetchone()[0]
+            if status in ("queued", "running") and left == 0:
+                status = "completed"
+                conn.execute(
+                    "UPDATE jobs SET status = ?, finished = ? WHERE id = ?",
+                    (status, time.strftime(TIMESTAMP_FORMAT), job_id),
+                )
+        return status
+
+    def _stop(self, job_id, status):
+        with self._write() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished = ? WHERE id = ? AND status IN ('queued', 'running')",
+                (status, time.strftime(TIMESTAMP_FORMAT), job_id),
+            )
+
+    def cancel(self, job_id):
+        """Cancels a job; notes that are already being simplified still finish."""
+        self._stop(job_id, "cancelled")
+
+    def fail(self, job_id):
+        """Stops a job that cannot be run."""
+        self._stop(job_id, "failed")
+
+    def is_cancelled(self, job_id):
+        with self._connection() as conn:
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row is None or row["status"] == "cancelled"
+
+
+class JobRunner:
+    """Works through a ``JobQueue`` on background threads, one job at a time.
+
+    Each job needs a backend, which is kept in memory only: ``submit`` queues a
+    job with one, and ``resume`` attaches one to a job that was interrupted by a
+    restart. Up to ``max_workers`` notes of the running job are simplified at
+    once, each in its own trace, and ``on_result(job, result)`` is called on
+    the runner thread for every finished note; if it raises, the note is
+    marked as failed with the error. ``profile_job(job_id)``, if given,
+    returns a context manager the whole job runs in, for profiling.
+
+    Notes are leased to the runner's ``runner_id`` for ``lease_seconds`` and
+    the leases are renewed by a heartbeat thread while the runner is alive.
+    """
+
+    def __init__(self, job_queue, on_result=None, max_workers=DEFAULT_MAX_WORKERS, profile_job=None,
+                 lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.job_queue = job_queue
+        self.on_result = on_result
+        self.profile_job = profile_job
+        self.max_workers = max_workers
+        self.lease_seconds = lease_seconds
+        self.runner_id = uuid.uuid4().hex
+        self._backends = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="job-runner", daemon=True)
+                self._thread.start()
+                threading.Thread(target=self._renew_leases, name="job-runner-heartbeat", daemon=True).start()
+
+    def _renew_leases(self):
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            try:
+                self.job_queue.renew_leases(self.runner_id, self.lease_seconds)
+            except Exception:
+                logger.exception("Could not renew the leases of runner %s", self.runner_id)
+
+    def submit(self, notes, method, target_group, model, temperature, backend):
+        """Queues a job and returns its id."""
+        job_id = self.job_queue.submit(notes, method, target_group, model, temperature)
+        self.resume(job_id, backend)
+        return job_id
+
+    def resume(self, job_id, backend):
+        """Runs an unfinished job with ``backend``."""
+        with self._lock:
+            self._backends[job_id] = backend
+        self.start()
+        self._wakeup.set()
+
+    def cancel(self, job_id):
+        self.job_queue.cancel(job_id)
+
+    def is_attached(self, job_id):
+        """Whether the job has a backend and will be run by this runner."""
+        with self._lock:
+            return job_id in self._backends
+
+    def _next_job(self):
+        with self._lock:
+            attached = set(self._backends)
+        for job_id in self.job_queue.unfinished_jobs():
+            if job_id in attached:
+                return job_id
+        return None
+
+    def _run(self):
+        while True:
+            job_id = self._next_job()
+            if job_id is None:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            try:
+                if self.profile_job is not None:
+                    with self.profile_job(job_id):
+                        self._run_job(job_id)
+                else:
+                    self._run_job(job_id)
+            except Exception as e:
+                logger.exception("Job %s failed", job_id)
+                self.job_queue.fail_running_items(job_id, self.runner_id, f"The job failed: {e}")
+                self.job_queue.fail(job_id)
+            finally:
+                with self._lock:
+                    self._backends.pop(job_id, None)
+
+    def _run_job(self, job_id):
+        job = self.job_queue.job(job_id)
+        with self._lock:
+            backend = self._backends[job_id]
+
+        # Notes are claimed lazily, so a cancelled job stops taking new notes
+        positions = []
+
+        def claimed_notes():
+            while not self.job_queue.is_cancelled(job_id):
+                claimed = self.job_queue.claim_item(job_id, self.runner_id, self.lease_seconds)
+                if claimed is None:
+                    return
+                positions.append(claimed[0])
+                yield claimed[1]
+
+        results = simplify_stream(
+            claimed_notes(),
+            method=job["method"],
+            target_group=job["target_group"],
+            model=job["model"],
+            temperature=job["temperature"],
+            backend=backend,
+            max_workers=self.max_workers,
+            traced=True,
+        )
+        for result in results:
+            position = positions[result["index"]]
+            if not self.job_queue.finish_item(job_id, position, result, owner=self.runner_id):
+                # The lease expired and another runner took the note over
+                continue
+            if self.on_result is not None:
+                try:
+                    self.on_result(job, result)
+                except Exception as e:
+                    logger.exception("Could not handle the result of note %s of job %s", result["index"], job_id)
+                    error = f"Could not save the result: {e}"
+                    self.job_queue.finish_item(job_id, position, dict(result, error=error), owner=self.runner_id)
+
+        self.job_queue.finish_job(job_id)
@@ -0,0 +1,101 @@
+"""Chat completions with retries and per-call telemetry.
+
+Every simplification method sends its prompt through ``chat_completion``.
+Responses are streamed, so the time to the first token can be measured, and
+transient API errors (rate limits, timeouts, unavailable servers) are retried
+with exponential backoff as long as nothing has been received yet. When a call
+finishes, successfully or not, its telemetry is handed to a callback so the
+app can record it next to the history. Inside a trace (see ``tracing``) the
+wait for the first token, the streaming of the response and any retries are
+recorded as separate stages.
+
+The openai package is only imported by the first call, so pages that never
+call the LLM do not pay for it.
+"""
+
+import time
+
+from .tracing import add_span, span
+
+DEFAULT_MAX_RETRIES = 2
+
+# Seconds to wait before the first retry; doubled for each further retry
+RETRY_BACKOFF = 1.0
+
+
+def _retryable_errors(openai):
+    try:
+        from openai.error import APIConnectionError, APIError, RateLimitError, ServiceUnavailableError, Timeout
+    except ImportError:  # openai>=1.0 has no openai.error module
+        return (openai.APIConnectionError, openai.APIStatusError, openai.RateLimitError, openai.APITimeoutError)
+    return (APIConnectionError, APIError, RateLimitError, ServiceUnavailableError, Timeout)
+
+
+def chat_completion(messages, model="gpt-3.5-turbo", temperature=0.3, max_tokens=1000,
+                    max_retries=DEFAULT_MAX_RETRIES, on_complete=None, api_key=None):
+    """Returns the text of a chat completion, retrying transient errors.
+
+    ``on_complete`` is called with a telemetry dict once the call has finished
+    or failed: ``model``, ``latency`` and ``time_to_first_token`` (seconds,
+    including any retries), ``completion_tokens`` (one per streamed chunk with
+    content), ``retries`` and ``error`` (the exception class name, or None).
+    Without an ``api_key`` the openai package's configured key is used.
+    """
+    import openai
+
+    retryable_errors = _retryable_errors(openai)
+    telemetry = {
+        "model": model,
+        "latency": None,
+        "time_to_first_token": None,
+        "completion_tokens": 0,
+        "retries": 0,
+        "error": None,
+    }
+    start = time.perf_counter()
+    attempt_start = start
+    first_token_at = None
+    chunks = []
+
+    try:
+        for attempt in range(max_retries + 1):
+            attempt_start = time.perf_counter()
+            try:
+                response = openai.ChatCompletion.create(
+                    api_key=api_key,
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True
+                )
+                for chunk in response:
+                    content = chunk.choices[0].delta.get("content")
+                    if content:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                            telemetry["time_to_first_token"] = first_token_at - start
+                        chunks.append(content)
+                return "".join(chunks)
+            except retryable_errors as e:
+                # A stream that already produced text cannot be resumed
+                if chunks or attempt == max_retries:
+                    raise
+                add_span("failed_attempt", attempt_start, time.perf_counter(), error=type(e).__name__)
+                telemetry["retries"] += 1
+                with span("retry_backoff"):
+                    time.sleep(RETRY_BACKOFF * 2 ** attempt)
+    except Exception as e:
+        telemetry["error"] = type(e).__name__
+        raise
+    finally:
+        end = time.perf_counter()
+        if first_token_at is not None:
+            add_span("wait_first_token", attempt_start, first_token_at)
+            add_span("stream_response", first_token_at, end, chunks=len(chunks))
+        else:
+            add_span("request", attempt_start, end, error=telemetry["error"])
+        telemetry["latency"] = end - start
+        telemetry["completion_tokens"] = len(chunks)
+        if on_complete is not None:
+            on_complete(telemetry)
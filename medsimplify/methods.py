@@ -0,0 +1,350 @@
+"""Prompt construction for the four prompting methods.
+
+Each method turns a medical note and a target patient group into a chat
+prompt. ``METHODS`` maps the method names used throughout the app and the
+history to their prompt builder and completion token limit.
+"""
+
+SYSTEM_PROMPT = "You are a helpful assistant that specializes in making medical information accessible to patients."
+
+# Target patient groups, as offered in the app
+TARGET_GROUPS = ("General", "Elderly", "Low Literacy", "ESL (English as Second Language)")
+
+
+def zero_shot_prompt(medical_note, target_group="General"):
+    """Builds the prompt that simplifies a medical note using the zero-shot prompting approach."""
+    
+    # Customize for target patient group
+    if target_group == "Elderly":
+        audience = "elderly patients (70+ years) who may have some vision or hearing difficulties"
+        specific_instructions = "Use larger conceptual chunks, clear organization with headings, and avoid information overload."
+    elif target_group == "Low Literacy":
+        audience = "patients with low health literacy (reading at a 4th-5th grade level)"
+        specific_instructions = "Use very simple words (1-2 syllables when possible), short sentences, and concrete examples."
+    elif target_group.startswith("ESL"):
+        audience = "patients who speak English as a second language"
+        specific_instructions = "Use common everyday vocabulary, avoid idioms and cultural references, and use consistent terminology."
+    else:  # General
+        audience = "patients with limited health literacy"
+        specific_instructions = "Use plain language at approximately an 8th grade reading level."
+    
+    prompt = f"""
+Please simplify the following medical note to make it more understandable for {audience}:
+
+{medical_note}
+
+The simplified note should:
+- Use plain language instead of medical jargon
+- Maintain all important medical information
+- Be organized in a clear structure
+- Explain medical terms when necessary
+- {specific_instructions}
+"""
+    
+    return prompt
+
+
+def few_shot_prompt(medical_note, target_group="General"):
+    """Builds the prompt that simplifies a medical note using the few-shot (in-context learning) approach."""
+    
+    # Customize examples for target patient group
+    if target_group == "Elderly":
+        instruction = "elderly patients (70+ years) who may have some vision or hearing difficulties"
+        examples = """
+EXAMPLE 1:
+ORIGINAL: 
+Patient is a 75-year-old female with hypertension, hyperlipidemia, and osteoarthritis. Patient reports increasing joint pain and difficulty with mobility. Physical examination reveals decreased range of motion in bilateral knees.
+
+SIMPLIFIED:
+YOUR HEALTH SUMMARY
+
+You are a 75-year-old woman with high blood pressure, high cholesterol, and arthritis in your joints.
+
+YOUR CURRENT SYMPTOMS:
+You mentioned that your joint pain is getting worse and you're having more trouble moving around. When we examined you, we noticed you can't bend your knees as fully as normal.
+
+WHAT THIS MEANS:
+Your arthritis may be progressing. This is causing the increased pain and making it harder for you to walk and move.
+
+NEXT STEPS:
+We should discuss pain management options and possibly physical therapy to help maintain your mobility and independence.
+
+EXAMPLE 2:
+ORIGINAL:
+Patient presents with exacerbation of COPD. Pulmonary function tests show FEV1 of 45% predicted and SpO2 of 92% on room air. Started on prednisone 40mg daily for 5 days and increased albuterol inhaler frequency.
+
+SIMPLIFIED:
+YOUR HEALTH UPDATE
+
+Your lung condition (COPD) is having a flare-up right now.
+
+YOUR TEST RESULTS:
+• Breathing test: Shows your lungs are working at about 45% of normal capacity
+• Oxygen level: 92% (normal is 95-100%)
+
+YOUR TREATMENT PLAN:
+• New medication: Prednisone pills (40mg) once daily for 5 days
+  This helps reduce inflammation in your lungs
+• Increase your rescue inhaler (albuterol) as needed
+  Use it more often until your breathing improves
+
+IMPORTANT REMINDER:
+• Take all medications as directed
+• Call us if your breathing gets worse or doesn't improve
+"""
+    elif target_group == "Low Literacy":
+        instruction = "patients with low health literacy (reading at a 4th-5th grade level)"
+        examples = """
+EXAMPLE 1:
+ORIGINAL: 
+Patient is a 67-year-old male with hypertension, hyperlipidemia, and type 2 diabetes mellitus. Patient reports dyspnea on exertion and occasional orthopnea. Physical examination reveals bilateral lower extremity edema.
+
+SIMPLIFIED:
+YOUR HEALTH
+
+You are a 67-year-old man with:
+• High blood pressure
+• High fat in your blood
+• Sugar disease (diabetes)
+
+You told us:
+• You get short of breath when you move around
+• Sometimes it's hard to breathe when you lie down
+
+We found:
+• Your legs are swollen on both sides
+
+What this means:
+Your heart may be working too hard. The swelling in your legs happens when fluid builds up.
+
+Next steps:
+We need to check your heart. Take your pills every day.
+
+EXAMPLE 2:
+ORIGINAL:
+Patient presents with complaints of dyspepsia and epigastric pain for 2 weeks, worse after meals. Endoscopy revealed gastric erosions consistent with NSAID gastropathy. H. pylori testing negative.
+
+SIMPLIFIED:
+YOUR HEALTH PROBLEM
+
+What you told us:
+• Your stomach hurts
+• The pain has lasted 2 weeks
+• Pain gets worse after you eat
+
+What we found:
+• Your stomach has some raw, sore areas inside
+• These sores likely came from pain pills you take
+• You do not have the stomach germ called H. pylori
+
+What to do now:
+• Stop taking ibuprofen, naproxen, or aspirin
+• Take the new stomach medicine every day
+• Eat smaller meals
+• Call us if you see blood in your throw-up or poop
+"""
+    elif target_group.startswith("ESL"):
+        instruction = "patients who speak English as a second language"
+        examples = """
+EXAMPLE 1:
+ORIGINAL: 
+Patient is a 58-year-old female who presents with acute onset of severe headache, photophobia, and nuchal rigidity. CT scan negative for hemorrhage. Lumbar puncture performed, results pending. Started on empiric antibiotics for presumed meningitis.
+
+SIMPLIFIED:
+YOUR MEDICAL SITUATION
+
+Your symptoms:
+• You have a sudden, very bad headache
+• Bright light hurts your eyes
+• Your neck feels stiff and painful
+
+Tests we did:
+• Head scan (CT): No bleeding was found in your brain
+• Spinal fluid test: We took some fluid from your spine to test it. We are waiting for results.
+
+Current treatment:
+• We started you on strong antibiotics through your IV
+• These medications fight infection
+
+What we think might be happening:
+We are concerned you might have an infection around your brain and spinal cord. This is called "meningitis."
+
+Next steps:
+• You need to stay in the hospital
+• We will check your test results when they are ready
+• We will watch you closely for any changes
+
+EXAMPLE 2:
+ORIGINAL:
+Patient with history of CHF presents with increased dyspnea, orthopnea, and peripheral edema. BNP elevated at 850 pg/mL. CXR shows pulmonary edema and cardiomegaly. Started on IV furosemide and increased ACE inhibitor dosage.
+
+SIMPLIFIED:
+YOUR HEART CONDITION
+
+Your symptoms now:
+• You are having trouble breathing
+• You cannot breathe well when lying flat
+• Your legs and ankles are swollen
+
+Your test results:
+• Blood test: Shows your heart is under stress
+• Chest X-ray: Shows fluid in your lungs and your heart is enlarged
+
+Your treatment plan:
+• Water pill through IV: This helps remove extra fluid from your body
+• Increased dose of your heart medicine: This helps your heart work better
+
+What is happening:
+Your heart failure is getting worse right now. This means your heart is not pumping blood well enough. This causes fluid to build up in your lungs and legs.
+
+Important information:
+• You need to limit salt in your food
+• You need to limit how much liquid you drink
+• You should weigh yourself every day
+• Call us if you gain more than 2 kg (4 pounds) in one day
+"""
+    else:  # General
+        instruction = "patients with limited health literacy"
+        examples = """
+EXAMPLE 1:
+ORIGINAL: 
+Patient is a 67-year-old male with hypertension, hyperlipidemia, and type 2 diabetes mellitus. Patient reports dyspnea on exertion and orthopnea. Physical examination reveals bilateral lower extremity edema.
+
+SIMPLIFIED:
+You are a 67-year-old man with high blood pressure, high cholesterol, and type 2 diabetes. You mentioned feeling short of breath during activity and when lying flat. During the exam, we noticed swelling in both of your legs.
+
+EXAMPLE 2:
+ORIGINAL:
+Patient presents with persistent cough for 2 weeks, associated with low-grade fever and myalgia. Chest auscultation reveals rhonchi in the right lower lobe. WBC count elevated at 11,000.
+
+SIMPLIFIED:
+You came in with a cough that has lasted for 2 weeks, along with a mild fever and muscle aches. When listening to your lungs, we heard abnormal breathing sounds in the lower right part of your lungs. Your white blood cell count is high at 11,000, which might indicate an infection.
+"""
+    
+    prompt = f"""
+I'll show you how to simplify medical notes for {instruction}. Here are some examples:
+
+{examples}
+
+Now, please simplify the following medical note in a similar way:
+
+{medical_note}
+"""
+    
+    return prompt
+
+
+def chain_of_thought_prompt(medical_note, target_group="General"):
+    """Builds the prompt that simplifies a medical note using the chain of thought prompting approach."""
+    
+    # Customize for target patient group
+    if target_group == "Elderly":
+        audience = "elderly patients (70+ years) who may have some vision or hearing difficulties"
+        specific_instructions = "Use larger conceptual chunks, clear organization with headings, and avoid information overload."
+    elif target_group == "Low Literacy":
+        audience = "patients with low health literacy (reading at a 4th-5th grade level)"
+        specific_instructions = "Use very simple words (1-2 syllables when possible), short sentences, and concrete examples."
+    elif target_group.startswith("ESL"):
+        audience = "patients who speak English as a second language"
+        specific_instructions = "Use common everyday vocabulary, avoid idioms and cultural references, and use consistent terminology."
+    else:  # General
+        audience = "patients with limited health literacy"
+        specific_instructions = "Use plain language at approximately an 8th grade reading level."
+    
+    prompt = f"""
+Please simplify the following medical note for {audience}. Think step by step:
+
+1. First, identify all medical terms and jargon that need simplification
+2. Determine the core medical information that must be preserved
+3. Reorganize the information in a more logical flow for the patient
+4. Rewrite each section using plain language appropriate for the patient
+5. Add brief explanations for medical terms and values when needed
+6. Ensure all important information is included and accurate
+7. Format the information in a patient-friendly way with clear headings
+8. Check that the simplification addresses these specific needs: {specific_instructions}
+
+Medical Note:
+{medical_note}
+
+Now, first identify the medical terms that need simplification:
+"""
+    
+    return prompt
+
+
+def tree_of_thoughts_prompt(medical_note, target_group="General"):
+    """Builds the prompt that simplifies a medical note using the tree of thoughts approach."""
+    
+    # Customize for target patient group
+    if target_group == "Elderly":
+        audience = "elderly patients (70+ years) who may have some vision or hearing difficulties"
+        specific_instructions = "larger conceptual chunks, clear organization with headings, and avoid information overload"
+    elif target_group == "Low Literacy":
+        audience = "patients with low health literacy (reading at a 4th-5th grade level)"
+        specific_instructions = "very simple words (1-2 syllables when possible), short sentences, and concrete examples"
+    elif target_group.startswith("ESL"):
+        audience = "patients who speak English as a second language"
+        specific_instructions = "common everyday vocabulary, no idioms or cultural references, and consistent terminology"
+    else:  # General
+        audience = "patients with limited health literacy"
+        specific_instructions = "plain language at approximately an 8th grade reading level"
+    
+    prompt = f"""
+I will simplify this medical note for {audience} by exploring different approaches and selecting the best one.
+
+Medical Note:
+{medical_note}
+
+Approach 1: Focus on simplifying vocabulary while maintaining the structure
+- Identify all medical terms
+- Replace with simpler alternatives or brief explanations
+- Keep the original structure of the note
+- Use {specific_instructions}
+
+Approach 2: Restructure the note to be more narrative and conversational
+- Convert the note into a summary of what happened and what it means
+- Use second-person perspective ("you have..." instead of "patient has...")
+- Group related information together regardless of original structure
+- Use {specific_instructions}
+
+Approach 3: Create a hybrid approach with simplified sections and explanations
+- Keep key sections (history, medications, etc.) but rename them to be more patient-friendly
+- Simplify the language within each section
+- Add brief explanations of what each section means for the patient's health
+- Use {specific_instructions}
+
+Let me evaluate each approach for this specific note:
+
+Approach 1 Evaluation:
+
+Approach 2 Evaluation:
+
+Approach 3 Evaluation:
+
+Based on my evaluation, the most effective approach for this specific case is:
+
+Here's the simplified note using the best approach:
+"""
+    
+    return prompt
+
+
+# Prompt builder and completion token limit of each prompting method
+METHODS = {
+    "Zero-Shot": (zero_shot_prompt, 1000),
+    "Few-Shot (In-Context Learning)": (few_shot_prompt, 1000),
+    "Chain of Thought": (chain_of_thought_prompt, 1500),
+    "Tree of Thoughts": (tree_of_thoughts_prompt, 1500),
+}
+
+
+def build_messages(medical_note, method="Zero-Shot", target_group="General"):
+    """Returns the chat messages and the completion token limit for a note."""
+    if method not in METHODS:
+        raise ValueError(f"Unknown prompting method {method!r}, expected one of {', '.join(METHODS)}")
+    build_prompt, max_tokens = METHODS[method]
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": build_prompt(medical_note, target_group)},
+    ]
+    return messages, max_tokens
@@ -0,0 +1,136 @@
+"""Evaluation metrics for simplified medical notes."""
+
+import re
+
+# Sample list of medical terms (would be expanded in a real application)
+MEDICAL_TERMS = frozenset([
+    'hypertension', 'diabetes', 'mellitus', 'dyspnea', 'orthopnea', 'edema',
+    'hyperlipidemia', 'myocardial', 'infarction', 'stroke', 'arrhythmia',
+    'tachycardia', 'bradycardia', 'fibrillation', 'cholesterol', 'triglycerides',
+    'glucose', 'insulin', 'hyperglycemia', 'hypoglycemia', 'neuropathy',
+    'retinopathy', 'nephropathy', 'cardiomyopathy', 'angina', 'stent',
+    'bypass', 'angioplasty', 'catheterization', 'echocardiogram', 'electrocardiogram',
+    'coronary', 'atherosclerosis', 'atrial', 'congestive', 'creatinine',
+    'hemoglobin', 'ldl', 'troponin', 'bnp', 'copd', 'gerd', 'prn', 'bid',
+    'chronic', 'obstructive', 'pulmonary', 'gastroesophageal', 'reflux',
+    'albuterol', 'fluticasone', 'salmeterol', 'omeprazole', 'sertraline',
+    'metoprolol', 'warfarin', 'furosemide', 'lisinopril', 'atorvastatin',
+    'metformin', 'SpO2', 'FEV1', 'FVC'
+])
+
+_SENTENCE_END = re.compile(r'[.!?]+')
+_WORD = re.compile(r'\b\w+\b')
+_VOWEL_GROUP = re.compile(r'[aeiouy]+')
+# Drug names and lab values, as compared by facts_retained
+_FACT_TOKEN = re.compile(r'\d+(?:\.\d+)?|[a-z]+')
+
+
+def text_counts(text):
+    """Returns the sentence ends, words, syllables and medical terms of a text or of one of its lines.
+
+    No count spans a line break, so the counts of the lines of a text add up
+    to the counts of the whole text.
+    """
+    words = _WORD.findall(text.lower())
+    return (
+        len(_SENTENCE_END.findall(text)),
+        len(words),
+        sum(max(1, len(_VOWEL_GROUP.findall(word))) for word in words),
+        sum(1 for word in words if word in MEDICAL_TERMS),
+    )
+
+
+def statistics_from_counts(counts):
+    """Returns ``text_statistics`` from the ``text_counts`` of the parts (such as the lines) of a text."""
+    sentence_ends = words = syllables = medical_terms = 0
+    for part in counts:
+        sentence_ends += part[0]
+        words += part[1]
+        syllables += part[2]
+        medical_terms += part[3]
+    return {
+        # Text after the last sentence end counts as a sentence too
+        "sentences": sentence_ends + 1,
+        "words": words,
+        "syllables": syllables,
+        "medical_terms": medical_terms,
+    }
+
+
+def text_statistics(text):
+    """Returns the sentence, word, syllable and medical term counts the metrics are computed from."""
+    return statistics_from_counts([text_counts(text)])
+
+
+def readability_from_statistics(statistics):
+    """Returns the Flesch Reading Ease score for ``text_statistics``, clipped to 0-100."""
+    if statistics["sentences"] == 0 or statistics["words"] == 0:
+        return 0
+    
+    flesch_score = (
+        206.835
+        - 1.015 * (statistics["words"] / statistics["sentences"])
+        - 84.6 * (statistics["syllables"] / statistics["words"])
+    )
+    return max(0, min(100, flesch_score))  # Clip between 0 and 100
+
+
+def term_density_from_statistics(statistics):
+    """Returns the percentage of medical terms for ``text_statistics``."""
+    if statistics["words"] == 0:
+        return 0
+    return (statistics["medical_terms"] / statistics["words"]) * 100  # Return as a percentage
+
+
+def calculate_readability(text):
+    """Returns the Flesch Reading Ease score of a text, clipped to 0-100."""
+    return readability_from_statistics(text_statistics(text))
+
+
+def calculate_medical_term_density(text):
+    """Returns the percentage of words in a text that are medical terms."""
+    return term_density_from_statistics(text_statistics(text))
+
+
+def facts_retained(parsed_note, simplified_note):
+    """Returns the percentage of a note's medications and lab values that a simplified note still names.
+
+    ``parsed_note`` is a ``note_parser.ParsedNote``. A medication is kept when
+    its drug name appears and a lab result when its value does; conditions are
+    left out, as a good simplification renames them. Returns None for a note
+    that lists neither.
+    """
+    facts = [_FACT_TOKEN.findall(medication.lower())[:1] for medication in parsed_note.medications]
+    facts = [tokens[0] for tokens in facts if tokens]
+    facts.extend(value for _, _, value, _ in parsed_note.observations if value)
+    if not facts:
+        return None
+    tokens = set(_FACT_TOKEN.findall(simplified_note.lower()))
+    return sum(1 for fact in facts if fact in tokens) / len(facts) * 100  # Return as a percentage
+
+
+def evaluate_simplification(original_note, simplified_note, processing_time=None):
+    """Returns the metrics stored with every history item.
+
+    ``original_note`` is the note text or its ``note_parser.ParsedNote``; a
+    parsed note's statistics are reused rather than computed again, and its
+    listed medications and lab values are checked in the simplified note
+    (``facts_retained``, None for a plain text).
+    """
+    if isinstance(original_note, str):
+        original = text_statistics(original_note)
+        facts = None
+    else:
+        original = original_note.statistics
+        facts = facts_retained(original_note, simplified_note)
+    simplified = text_statistics(simplified_note)
+
+    return {
+        "readability_score": readability_from_statistics(simplified),
+        "original_readability": readability_from_statistics(original),
+        "term_density": term_density_from_statistics(simplified),
+        "original_term_density": term_density_from_statistics(original),
+        "length_ratio": simplified["words"] / original["words"] if original["words"] > 0 else 0,
+        "processing_time": processing_time,
+        "facts_retained": facts,
+    }
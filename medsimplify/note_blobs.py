@@ -0,0 +1,51 @@
+"""Content-addressed, compressed encoding of note texts.
+
+Notes are identified by the SHA-256 of their UTF-8 text, so the same note
+processed with several methods is stored only once. Bodies are compressed
+with zstd when the ``zstandard`` package is installed and with zlib otherwise;
+the codec is stored next to each body so both can be read back.
+"""
+
+import hashlib
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional; zlib is always available
+    zstandard = None
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 10
+
+# Bodies shorter than this are stored uncompressed
+MIN_COMPRESS_SIZE = 64
+
+
+def note_hash(text):
+    """Returns the content address (hex SHA-256) of a note text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def compress_note(text):
+    """Returns ``(codec, body)`` for a note text."""
+    data = text.encode("utf-8")
+    if len(data) < MIN_COMPRESS_SIZE:
+        return "raw", data
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return "zlib", zlib.compress(data, ZLIB_LEVEL)
+
+
+def decompress_note(codec, body):
+    """Decodes a body produced by ``compress_note``."""
+    if codec == "raw":
+        data = body
+    elif codec == "zlib":
+        data = zlib.decompress(body)
+    elif codec == "zstd":
+        if zstandard is None:
+            raise ImportError("This note was stored with zstd. Install it with 'pip install zstandard'.")
+        data = zstandard.ZstdDecompressor().decompress(body)
+    else:
+        raise ValueError(f"Unknown note codec {codec!r}")
+    return bytes(data).decode("utf-8")
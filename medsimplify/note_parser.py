@@ -0,0 +1,192 @@
+"""Structured parsing of medical notes.
+
+Notes follow the ``PATIENT MEDICAL NOTE`` layout of ``medsimplify.notes``:
+header fields such as ``Patient ID`` and ``Demographics``, then sections
+headed ``MEDICAL HISTORY:``, ``MEDICATIONS:``, ``ENCOUNTERS:`` and
+``LABORATORY RESULTS:``. ``parse_note`` reads a note in one pass over its
+lines into a ``ParsedNote`` with the header, the raw lines of every section
+and the conditions, medications, encounters and laboratory results as lists.
+Notes in another layout still parse; they simply have no sections.
+
+The same pass counts the words, sentences, syllables and medical terms of
+every line, so ``ParsedNote.statistics`` (see ``metrics.text_statistics``)
+comes from the parse rather than another scan of the text. The pipeline
+evaluates simplifications against the parsed original, which also checks
+its medications and lab values (``metrics.facts_retained``).
+
+Parsed notes are cached by the SHA-256 of their text, so a note simplified
+with every method, or many times in a batch run, is parsed once per process.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+
+from .metrics import statistics_from_counts, text_counts, text_statistics
+from .note_blobs import note_hash
+from .notes import NOTE_TITLE
+
+CACHE_SIZE = 1024
+
+CONDITION_SECTIONS = ("MEDICAL HISTORY", "CONDITIONS")
+MEDICATION_SECTIONS = ("MEDICATIONS",)
+ENCOUNTER_SECTIONS = ("ENCOUNTERS",)
+OBSERVATION_SECTIONS = ("LABORATORY RESULTS", "LAB RESULTS", "OBSERVATIONS")
+
+_HEADING = re.compile(r"^([A-Z][A-Z /&-]*[A-Z]):$")
+_FIELD = re.compile(r"^([A-Za-z][\w /-]*):\s*(.*)$")
+_DATED_ITEM = re.compile(r"^-\s*(\d{4}-\d{2}-\d{2}):\s*(.*)$")
+# "(onset: 2015-03-12)" or "(started: 2015-03-15)" after a listed condition or medication
+_START_DATE = re.compile(r"\s*\((?:onset|started): [^)]*\)$")
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class ParsedNote:
+    """A medical note split into its header, sections and listed entries.
+
+    ``encounters`` are ``(date, description, reason)`` tuples and
+    ``observations`` are ``(date, description, value, units)`` tuples, as
+    taken by ``medsimplify.notes.render_note``. Instances are shared through
+    the cache and must not be modified.
+    """
+
+    __slots__ = ("text", "hash", "header", "sections", "conditions", "medications", "encounters", "observations",
+                 "_statistics")
+
+    def __init__(self, text, hash=None):
+        self.text = text
+        self.hash = hash or note_hash(text)
+        self.header = {}
+        self.sections = {}
+        self.conditions = []
+        self.medications = []
+        self.encounters = []
+        self.observations = []
+        self._statistics = None
+
+    @property
+    def patient_id(self):
+        return self.header.get("Patient ID")
+
+    @property
+    def demographics(self):
+        return self.header.get("Demographics")
+
+    @property
+    def statistics(self):
+        """Word, sentence, syllable and medical term counts of the note (see ``metrics.text_statistics``)."""
+        if self._statistics is None:
+            # Counted while parsing; only a note built without parse_note gets here
+            self._statistics = text_statistics(self.text)
+        return self._statistics
+
+    def to_dict(self):
+        return {
+            "patient_id": self.patient_id,
+            "demographics": self.demographics,
+            "conditions": list(self.conditions),
+            "medications": list(self.medications),
+            "encounters": [list(encounter) for encounter in self.encounters],
+            "observations": [list(observation) for observation in self.observations],
+            "sections": list(self.sections),
+        }
+
+
+def _split_list(value):
+    """Splits a comma-separated list, keeping qualifiers such as "stage 2 (mild)" with their entry."""
+    items = []
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if items and part[0].islower():
+            items[-1] += ", " + part
+        else:
+            items.append(part)
+    return items
+
+
+def _list_entries(line, field):
+    """Returns the entries of a ``- entry`` line or of a ``Field: a, b`` / ``a, b`` line."""
+    if line.startswith("-"):
+        return [_START_DATE.sub("", line[1:].strip())]
+    match = _FIELD.match(line)
+    if match and match.group(1) == field:
+        return _split_list(match.group(2))
+    return _split_list(line) if not match else []
+
+
+def _parse_encounter(date, rest):
+    description, *details = rest.split(" - ")
+    reason = next((detail[len("Reason:"):].strip() for detail in details if detail.startswith("Reason:")), "")
+    return (date, description.strip(), reason)
+
+
+def _parse_observation(date, rest):
+    description, separator, result = rest.rpartition(" - ")
+    if not separator:
+        return (date, rest.strip(), "", "")
+    value, _, units = result.strip().partition(" ")
+    return (date, description.strip(), value, units.strip())
+
+
+def _parse(text, hash=None):
+    note = ParsedNote(text, hash)
+    section = None
+    counts = []
+    for line in text.splitlines():
+        counts.append(text_counts(line))
+        line = line.strip()
+        if not line or (section is None and line == NOTE_TITLE):
+            continue
+
+        heading = _HEADING.match(line)
+        if heading:
+            section = heading.group(1)
+            note.sections.setdefault(section, [])
+            continue
+
+        if section is None:
+            field = _FIELD.match(line)
+            if field:
+                note.header[field.group(1)] = field.group(2).strip()
+            continue
+
+        note.sections[section].append(line)
+        if section in CONDITION_SECTIONS:
+            note.conditions.extend(_list_entries(line, "Conditions"))
+        elif section in MEDICATION_SECTIONS:
+            note.medications.extend(_list_entries(line, "Medications"))
+        elif section in ENCOUNTER_SECTIONS or section in OBSERVATION_SECTIONS:
+            item = _DATED_ITEM.match(line)
+            if item:
+                if section in ENCOUNTER_SECTIONS:
+                    note.encounters.append(_parse_encounter(*item.groups()))
+                else:
+                    note.observations.append(_parse_observation(*item.groups()))
+    note._statistics = statistics_from_counts(counts)
+    return note
+
+
+def parse_note(text):
+    """Returns the ``ParsedNote`` of a note text, from the cache when it was parsed before."""
+    key = note_hash(text)
+    with _cache_lock:
+        note = _cache.get(key)
+        if note is not None:
+            _cache.move_to_end(key)
+            return note
+
+    note = _parse(text, key)
+    with _cache_lock:
+        _cache[key] = note
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return note
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,112 @@
+"""Rendering of patient records as medical notes.
+
+Every ingestion source (Synthea CSV exports, FHIR bundles) builds the same
+plain-text ``PATIENT MEDICAL NOTE`` the app's sample notes use, so notes from
+any source can be simplified, compared and stored together. Sources feed a
+``PatientRecord`` entry by entry; it keeps only what the note will list, so
+a patient with years of observations costs no more memory than one with a
+single visit.
+"""
+
+import heapq
+import itertools
+
+NOTE_TITLE = "PATIENT MEDICAL NOTE"
+
+DEFAULT_MAX_ENCOUNTERS = 5
+DEFAULT_MAX_OBSERVATIONS = 10
+
+
+def age_in_years(birth, end):
+    """Returns the age in whole years on ``end`` of someone born on ``birth`` (both dates)."""
+    return end.year - birth.year - ((end.month, end.day) < (birth.month, birth.day))
+
+
+def format_demographics(age, gender, race=None, ethnicity=None):
+    """Returns the demographics line, e.g. ``67 year old male, White, Non-Hispanic``."""
+    parts = [" ".join(part for part in (f"{age} year old" if age is not None else None, gender) if part)]
+    parts.extend(part for part in (race, ethnicity) if part)
+    return ", ".join(part for part in parts if part)
+
+
+def render_note(patient_id, demographics, conditions=(), medications=(), encounters=(), observations=()):
+    """Renders one patient as a medical note.
+
+    ``encounters`` are ``(date, description, reason)`` tuples and
+    ``observations`` are ``(date, description, value, units)`` tuples, both
+    in the order they should be listed; ``reason`` and ``units`` may be empty.
+    Sections without entries are left out.
+    """
+    lines = [NOTE_TITLE, f"Patient ID: {patient_id}"]
+    if demographics:
+        lines.append(f"Demographics: {demographics}")
+
+    if conditions:
+        lines += ["", "MEDICAL HISTORY:", f"Conditions: {', '.join(conditions)}"]
+
+    if medications:
+        lines += ["", "MEDICATIONS:", ", ".join(medications)]
+
+    if encounters:
+        lines += ["", "ENCOUNTERS:"]
+        for date, description, reason in encounters:
+            lines.append(f"- {date}: {description}" + (f" - Reason: {reason}" if reason else ""))
+
+    if observations:
+        lines += ["", "LABORATORY RESULTS:"]
+        for date, description, value, units in observations:
+            lines.append(f"- {date}: {description} - {value}" + (f" {units}" if units else ""))
+
+    return "\n".join(lines)
+
+
+class PatientRecord:
+    """The parts of one patient's note, collected entry by entry.
+
+    Conditions and medications are kept in the order they were added,
+    without duplicates; only the ``max_encounters`` most recent encounters and
+    ``max_observations`` most recent results are kept. Dates are ISO strings,
+    so they compare chronologically.
+    """
+
+    def __init__(self, patient_id, max_encounters=DEFAULT_MAX_ENCOUNTERS, max_observations=DEFAULT_MAX_OBSERVATIONS):
+        self.patient_id = patient_id
+        self.demographics = None
+        self.max_encounters = max_encounters
+        self.max_observations = max_observations
+        self._conditions = {}
+        self._medications = {}
+        self._encounters = []
+        self._observations = []
+        # Breaks ties between entries of the same date in favour of the later one
+        self._sequence = itertools.count()
+
+    def add_condition(self, description):
+        self._conditions[description] = None
+
+    def add_medication(self, description):
+        self._medications[description] = None
+
+    def add_encounter(self, date, description, reason=""):
+        self._keep_latest(self._encounters, self.max_encounters, date, (date, description, reason))
+
+    def add_observation(self, date, description, value, units=""):
+        self._keep_latest(self._observations, self.max_observations, date, (date, description, value, units))
+
+    def _keep_latest(self, heap, limit, date, entry):
+        item = (date, next(self._sequence), entry)
+        if len(heap) < limit:
+            heapq.heappush(heap, item)
+        elif limit and item[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, item)
+
+    def render(self):
+        """Renders the note, most recent encounters and results first."""
+        return render_note(
+            self.patient_id,
+            self.demographics,
+            conditions=list(self._conditions),
+            medications=list(self._medications),
+            encounters=[entry for _, _, entry in sorted(self._encounters, reverse=True)],
+            observations=[entry for _, _, entry in sorted(self._observations, reverse=True)],
+        )
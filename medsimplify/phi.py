@@ -0,0 +1,232 @@
+"""De-identification of medical notes before they are sent to an LLM or stored.
+
+``PhiScrubber`` replaces identifiers with surrogate tokens such as
+``[DATE_1]`` or ``[ID_1]``: the values of labelled fields (``Patient ID``,
+``Name``, ``MRN``, ...), dates, social security and phone numbers, e-mail
+addresses, UUIDs and ages over 89; a name or other field value is also
+replaced where it reappears in the note. All patterns are compiled into one
+regex that skips ahead to the characters an identifier can start with, so a
+typical note is scrubbed in a single pass at tens of MB/s, and
+``scrub_batch`` scrubs many notes in one pass over their concatenation.
+
+The ``Demographics`` line (age, sex, race and ethnicity) is deliberately left
+as it is. None of these are identifiers under the HIPAA Safe Harbor method,
+which only covers ages over 89, and the LLM needs the patient's age and sex to
+explain the note to them. A deployment with a stricter policy can scrub the
+line too with ``PhiScrubber(dict(FIELD_KINDS, Demographics="DEMOGRAPHICS"))``.
+
+Surrogates are numbered per note in order of first appearance and a value
+repeated in a note gets the same token, so the scrubbed text depends only on
+the note's content around the identifiers: two notes that differ only in
+their identifiers scrub to the same text, which makes scrubbed prompts and
+stored notes far more cacheable. ``restore`` puts the original values back
+into a text that uses the tokens, such as the LLM's answer.
+
+``PhiScrubbingBackend`` wraps any LLM backend so prompts leave the process
+scrubbed and answers come back restored; ``HistoryStore(scrubber=...)`` and
+``JobQueue(scrubber=...)`` store scrubbed notes.
+"""
+
+import re
+
+from .tracing import span
+
+# Labelled fields whose whole value is an identifier, and the surrogate kind of each
+# (Demographics is left out on purpose, see the module docstring)
+FIELD_KINDS = {
+    "Patient ID": "ID",
+    "MRN": "ID",
+    "Medical Record Number": "ID",
+    "Insurance ID": "ID",
+    "Patient Name": "NAME",
+    "Name": "NAME",
+    "Address": "ADDRESS",
+    "Phone": "PHONE",
+    "Email": "EMAIL",
+    "SSN": "SSN",
+}
+
+# The combined pattern consumes the first character of a match with a single
+# character set, which lets the regex engine skip ahead to candidates at C speed;
+# each branch then checks the character it started on with a lookbehind. A branch
+# that follows ``_NOT_IN_WORD`` starts at a word boundary, like a leading ``\b``.
+_NOT_IN_WORD = r"(?<!\w.)"
+
+_EMAIL = rf"(?:{_NOT_IN_WORD}(?<=\w)|(?<=\w.)(?<=[.+-]))(?P<EMAIL>[\w.+-]*@[\w-]+(?:\.[\w-]+)+\b)"
+
+_PATTERNS = (
+    rf"{_NOT_IN_WORD}(?<=\d)(?P<DATE>\d{{3}}-\d{{2}}-\d{{2}}(?:T\d{{2}}:\d{{2}}(?::\d{{2}}(?:\.\d+)?)?(?:Z|[+-]\d{{2}}:?\d{{2}})?)?\b|\d?/\d{{1,2}}/\d{{2,4}}\b)",
+    rf"{_NOT_IN_WORD}(?<=\d)(?P<SSN>\d{{2}}-\d{{2}}-\d{{4}}\b)",
+    rf"(?P<PHONE>(?<=\()\d{{3}}\) ?\d{{3}}[-.]\d{{4}}\b|{_NOT_IN_WORD}(?<=\d)\d{{2}}[-.]\d{{3}}[-.]\d{{4}}\b)",
+    _EMAIL,
+    rf"{_NOT_IN_WORD}(?<=[0-9a-fA-F])(?P<ID>[0-9a-fA-F]{{7}}-[0-9a-fA-F]{{4}}-[0-9a-fA-F]{{4}}-[0-9a-fA-F]{{4}}-[0-9a-fA-F]{{12}}\b)",
+    # HIPAA Safe Harbor allows ages up to 89
+    rf"{_NOT_IN_WORD}(?P<AGE>(?:(?<=9)\d|(?<=1)[0-4]\d)(?=[- ]years?[- ]old\b))",
+)
+
+# Fields follow a newline and most identifiers start with a digit or "(". E-mail
+# addresses and UUIDs starting with a letter are rare but would make the pattern
+# stop at most letters, so the fast pattern skips them; notes in which they may
+# occur are scrubbed with the full pattern instead.
+_FAST_PATTERNS = tuple(pattern for pattern in _PATTERNS if pattern is not _EMAIL)
+_FAST_START = r"[\d(\n\x00]"
+_FULL_START = r"[\w(.+\n\x00-]"
+# The rest of a UUID; anchored on the "-" so that checking a note for one is fast
+_UUID_TAIL = re.compile(r"-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}")
+
+_TOKEN = re.compile(r"\[([A-Z]+)_(\d+)\]")
+
+# Separates the notes of a batch; notes containing it are scrubbed one by one
+_BATCH_SEPARATOR = "\x00"
+
+
+def _compile(fields, start, patterns):
+    labels = "|".join(re.escape(label) for label in sorted(fields, key=len, reverse=True))
+    field = rf"(?<=\n)(?P<field>[ \t]*(?P<label>{labels})[ \t]*:[ \t]*)(?P<field_value>[^\n\x00]*[^\s\x00])"
+    separator = f"(?<={_BATCH_SEPARATOR})(?P<separator>)"
+    return re.compile(start + "(?:" + "|".join((field,) + patterns + (separator,)) + ")")
+
+
+class _Surrogates:
+    """Token assignment for one note."""
+
+    def __init__(self, surrogates=None):
+        self.surrogates = dict(surrogates or {})
+        self.tokens = {}
+        self.counts = {}
+        for token, value in self.surrogates.items():
+            kind, number = _TOKEN.fullmatch(token).groups()
+            self.tokens[(kind, value)] = token
+            self.counts[kind] = max(self.counts.get(kind, 0), int(number))
+
+    def token(self, kind, value):
+        token = self.tokens.get((kind, value))
+        if token is None:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+            token = f"[{kind}_{self.counts[kind]}]"
+            self.tokens[(kind, value)] = token
+            self.surrogates[token] = value
+        return token
+
+    def replace_known(self, text):
+        """Replaces the values with tokens wherever else they appear as whole words.
+
+        Patterns find every date or phone number, but a name or address is only
+        found in its field; this catches it in the rest of the text. Ages and
+        numbers shorter than four digits are too ambiguous to replace.
+        """
+        tokens = {
+            value: token for (kind, value), token in self.tokens.items()
+            if kind != "AGE" and not (value.isdigit() and len(value) < 4) and value in text
+        }
+        if not tokens:
+            return text
+        values = "|".join(re.escape(value) for value in sorted(tokens, key=len, reverse=True))
+        return re.sub(rf"(?<!\w)(?:{values})(?!\w)", lambda match: tokens[match.group()], text)
+
+
+class PhiScrubber:
+    """Replaces identifiers in notes with surrogate tokens.
+
+    ``fields`` maps the labels of fields whose value is an identifier to the
+    kind of surrogate used for it (default ``FIELD_KINDS``).
+    """
+
+    def __init__(self, fields=None):
+        self.fields = dict(FIELD_KINDS if fields is None else fields)
+        self._fast_pattern = _compile(self.fields, _FAST_START, _FAST_PATTERNS)
+        self._full_pattern = _compile(self.fields, _FULL_START, _PATTERNS)
+
+    def _replace(self, match, note):
+        kind = match.lastgroup
+        if kind == "field_value":
+            return "\n" + match.group("field") + note.token(self.fields[match.group("label")], match.group("field_value"))
+        return note.token(kind, match.group())
+
+    @staticmethod
+    def _missed_uuid(scrubbed):
+        # Fields are replaced before the identifiers in them, so a UUID left in the
+        # text of the fast pattern is one that starts with a letter
+        return _UUID_TAIL.search(scrubbed) is not None
+
+    def scrub(self, text, surrogates=None):
+        """Returns the scrubbed text and its surrogates (token -> original value).
+
+        Pass the ``surrogates`` of a related text, such as the original of a
+        simplified note, to reuse its tokens for the same values; a name found
+        in a field of the original is then also replaced in the related text.
+        """
+        if _BATCH_SEPARATOR in text:
+            raise ValueError("Notes must not contain NUL characters")
+        # A newline in front lets fields on the first line match like the others
+        text = "\n" + text
+        if "@" not in text:
+            note = _Surrogates(surrogates)
+            scrubbed = self._fast_pattern.sub(lambda match: self._replace(match, note), text)
+            if not self._missed_uuid(scrubbed):
+                return note.replace_known(scrubbed[1:]), note.surrogates
+        note = _Surrogates(surrogates)
+        scrubbed = self._full_pattern.sub(lambda match: self._replace(match, note), text)
+        return note.replace_known(scrubbed[1:]), note.surrogates
+
+    def scrub_batch(self, texts):
+        """Scrubs many notes in a single pass; returns a ``(text, surrogates)`` pair per note."""
+        texts = list(texts)
+        if any(_BATCH_SEPARATOR in text for text in texts):
+            return [self.scrub(text) for text in texts]
+
+        notes = [_Surrogates()]
+
+        def replace(match):
+            if match.lastgroup == "separator":
+                notes.append(_Surrogates())
+                return _BATCH_SEPARATOR
+            return self._replace(match, notes[-1])
+
+        separator = _BATCH_SEPARATOR + "\n"
+        scrubbed = self._fast_pattern.sub(replace, "\n" + separator.join(texts))[1:].split(separator)
+        return [
+            self.scrub(text) if "@" in text or self._missed_uuid(result) else (note.replace_known(result), note.surrogates)
+            for text, result, note in zip(texts, scrubbed, notes)
+        ]
+
+
+def kept_tokens(text):
+    """Returns surrogates that map the tokens in an already scrubbed text to themselves.
+
+    Pass them to ``scrub`` for a text related to one whose surrogates were not
+    kept, so that new identifiers get tokens that do not clash with its tokens.
+    """
+    return {match.group(): match.group() for match in _TOKEN.finditer(text)}
+
+
+def restore(text, surrogates):
+    """Puts the original values back in place of the tokens in ``surrogates``; other text is kept."""
+    if not surrogates:
+        return text
+    return _TOKEN.sub(lambda match: surrogates.get(match.group(), match.group()), text)
+
+
+class PhiScrubbingBackend:
+    """Wraps an LLM backend so that prompts are scrubbed and answers are restored.
+
+    All messages of a call share one set of surrogates, so a value gets the
+    same token wherever it appears in the prompt.
+    """
+
+    def __init__(self, backend, scrubber=None):
+        self.backend = backend
+        self.scrubber = scrubber if scrubber is not None else PhiScrubber()
+
+    def complete(self, messages, **options):
+        with span("scrub_phi"):
+            surrogates = {}
+            scrubbed_messages = []
+            for message in messages:
+                content, surrogates = self.scrubber.scrub(message["content"], surrogates)
+                scrubbed_messages.append(dict(message, content=content))
+
+        text = self.backend.complete(scrubbed_messages, **options)
+
+        with span("restore_phi"):
+            return restore(text, surrogates)
@@ -0,0 +1,123 @@
+"""Simplification of one note or a stream of notes.
+
+``simplify`` sends one note through a prompting method and evaluates the
+result. ``simplify_stream`` runs many notes concurrently and yields each
+result as soon as it is ready, so callers can show or store results while the
+rest of a batch is still running.
+
+Each note is parsed once (``note_parser.parse_note``, cached by note hash)
+and simplifications are evaluated against the parsed note, so the statistics
+of an original note simplified with several methods or many times in a batch
+are computed once. Prompt building, the LLM call and
+the evaluation are timed as separate stages when a trace is active (see
+``tracing``).
+"""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .backends import OpenAIBackend
+from .methods import build_messages
+from .metrics import evaluate_simplification
+from .note_parser import parse_note
+from .tracing import run_in_context, span, trace
+
+DEFAULT_MAX_WORKERS = 4
+
+
+def simplify(medical_note, method="Zero-Shot", target_group="General", model="gpt-3.5-turbo",
+             temperature=0.3, backend=None):
+    """Simplifies one medical note and returns a result dictionary.
+
+    The result holds the ``original_note`` and ``simplified_note``, the
+    ``method``, ``target_group`` and ``model``, the evaluation ``metrics``, the
+    ``telemetry`` of the LLM call and an ``error`` message. LLM failures are
+    reported in ``error`` (with ``simplified_note`` and ``metrics`` left as
+    None) rather than raised; an unknown method raises ``ValueError``.
+    """
+    with span("build_prompt", method=method, target_group=target_group):
+        note = parse_note(medical_note)
+        messages, max_tokens = build_messages(note.text, method, target_group)
+    backend = backend if backend is not None else OpenAIBackend()
+
+    result = {
+        "original_note": medical_note,
+        "simplified_note": None,
+        "method": method,
+        "target_group": target_group,
+        "model": model,
+        "metrics": None,
+        "telemetry": None,
+        "error": None,
+    }
+    telemetry = {}
+    start = time.time()
+    try:
+        with span("llm_call", model=model):
+            text = backend.complete(
+                messages,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                on_complete=telemetry.update
+            )
+        result["simplified_note"] = text.strip()
+        with span("evaluate"):
+            result["metrics"] = evaluate_simplification(note, result["simplified_note"], time.time() - start)
+    except Exception as e:
+        result["error"] = str(e)
+    result["telemetry"] = telemetry or None
+    return result
+
+
+def _simplify_traced(medical_note, index, **options):
+    with trace("simplify_note", index=index, method=options["method"], target_group=options["target_group"]) as root:
+        result = simplify(medical_note, **options)
+    result["trace"] = root.to_dict()
+    return result
+
+
+def simplify_stream(notes, method="Zero-Shot", target_group="General", model="gpt-3.5-turbo",
+                    temperature=0.3, backend=None, max_workers=DEFAULT_MAX_WORKERS, traced=False):
+    """Simplifies many notes concurrently, yielding each result as it finishes.
+
+    Results arrive in completion order and carry the ``index`` of their note
+    in ``notes``. Notes are read lazily and at most ``2 * max_workers`` are in
+    flight, so ``notes`` can be a generator over a large file. Closing the
+    generator early cancels the notes that have not started yet.
+
+    With ``traced`` every note is simplified in its own trace, which is logged
+    and returned under the result's ``trace`` key.
+    """
+    backend = backend if backend is not None else OpenAIBackend()
+    options = {
+        "method": method,
+        "target_group": target_group,
+        "model": model,
+        "temperature": temperature,
+        "backend": backend,
+    }
+    max_pending = max_workers * 2
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="simplify")
+    pending = {}
+    try:
+        for index, note in enumerate(notes):
+            if traced:
+                task = run_in_context(_simplify_traced, note, index, **options)
+            else:
+                task = run_in_context(simplify, note, **options)
+            pending[executor.submit(task)] = index
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield dict(future.result(), index=pending.pop(future))
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield dict(future.result(), index=pending.pop(future))
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
@@ -0,0 +1,208 @@
+"""Low-overhead sampling profiler for diagnosing slow runs in production.
+
+``SamplingProfiler`` wakes up every ``interval`` seconds on its own thread,
+reads the current stack of the profiled threads from ``sys._current_frames``
+and counts each distinct stack. Nothing is hooked into the profiled code, so
+the cost is one stack walk per thread per sample and the app runs at full
+speed between samples.
+
+Profiles are written in the collapsed stack format (one ``frame;frame;frame
+count`` line per stack), which flamegraph.pl, speedscope and most other
+flame graph viewers read directly. ``ProfileSchedule`` lets an operator arm
+profiling for the next few script runs or batch jobs of a running server.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+DEFAULT_INTERVAL = 0.01
+PROFILE_SUFFIX = ".collapsed"
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples the stacks of the selected threads until stopped.
+
+    ``threads`` selects what to profile: None for every thread but the
+    profiler's own, a collection of thread idents, or a predicate called with
+    each ``threading.Thread``.
+    """
+
+    def __init__(self, threads=None, interval=DEFAULT_INTERVAL, max_depth=200):
+        self.threads = threads
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.sample_count = 0
+        self.started = None
+        self.duration = 0.0
+        self._start_time = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _selected_idents(self):
+        if self.threads is None:
+            return None
+        if callable(self.threads):
+            return {thread.ident for thread in threading.enumerate() if self.threads(thread)}
+        return set(self.threads)
+
+    def _sample(self):
+        own_ident = threading.get_ident()
+        selected = self._selected_idents()
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident or (selected is not None and ident not in selected):
+                continue
+            labels = []
+            while frame is not None and len(labels) < self.max_depth:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(labels))] += 1
+        self.sample_count += 1
+
+    def _run(self):
+        # Thread selection by predicate is refreshed on each sample, so new pool workers are picked up
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self.started = datetime.now()
+        self._start_time = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self.duration = time.perf_counter() - self._start_time
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def collapsed(self):
+        """Returns the profile in the collapsed stack format, heaviest stacks first."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def write(self, directory, label):
+        """Writes the profile to ``directory`` and returns its path."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        safe_label = "".join(character if character.isalnum() or character in "-_" else "_" for character in label)
+        path = directory / f"{self.started:%Y%m%d_%H%M%S_%f}_{safe_label}{PROFILE_SUFFIX}"
+        path.write_text(self.collapsed(), encoding="utf-8")
+        return path
+
+
+class ProfileSchedule:
+    """Number of upcoming runs of each kind (for example script runs or batch jobs) to profile.
+
+    One schedule is shared by every session of a server, so the runs that get
+    profiled are whichever come next, from any user. Profiles are written to
+    ``directory``.
+    """
+
+    def __init__(self, directory, interval=DEFAULT_INTERVAL):
+        self.directory = Path(directory)
+        self.interval = interval
+        self._remaining = Counter()
+        self._lock = threading.Lock()
+
+    def arm(self, kind, count):
+        """Profiles the next ``count`` runs of ``kind`` (0 disarms)."""
+        with self._lock:
+            self._remaining[kind] = max(int(count), 0)
+
+    def remaining(self, kind):
+        with self._lock:
+            return self._remaining[kind]
+
+    def start(self, kind, threads=None):
+        """Starts a profiler if runs of ``kind`` are still to be profiled, otherwise returns None."""
+        with self._lock:
+            if self._remaining[kind] <= 0:
+                return None
+            self._remaining[kind] -= 1
+        return SamplingProfiler(threads=threads, interval=self.interval).start()
+
+    def finish(self, profiler, label):
+        """Stops a profiler returned by ``start`` and writes its profile; returns the path."""
+        profiler.stop()
+        return profiler.write(self.directory, label)
+
+    @contextmanager
+    def profile(self, kind, label, threads=None):
+        """Profiles the block if runs of ``kind`` are still to be profiled."""
+        profiler = self.start(kind, threads=threads)
+        try:
+            yield profiler
+        finally:
+            if profiler is not None:
+                self.finish(profiler, label)
+
+
+def read_collapsed(path):
+    """Reads a collapsed stack file into a ``Counter`` of stacks."""
+    stacks = Counter()
+    with open(path, encoding="utf-8") as profile:
+        for line in profile:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if stack:
+                stacks[stack] += int(count)
+    return stacks
+
+
+def top_functions(stacks, limit=25):
+    """Ranks the frames of a profile by self samples (top of stack) and total samples (anywhere on the stack)."""
+    own = Counter()
+    total = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+
+    sample_count = sum(stacks.values()) or 1
+    return [
+        {
+            "function": frame,
+            "self_samples": own[frame],
+            "self_percent": own[frame] / sample_count * 100,
+            "total_samples": total[frame],
+            "total_percent": total[frame] / sample_count * 100,
+        }
+        for frame in sorted(total, key=lambda frame: (own[frame], total[frame]), reverse=True)[:limit]
+    ]
+
+
+def list_profiles(directory):
+    """Returns the profiles in ``directory``, newest first."""
+    directory = Path(directory)
+    if not directory.exists():
+        return []
+    profiles = []
+    for path in sorted(directory.glob(f"*{PROFILE_SUFFIX}"), reverse=True):
+        stat = path.stat()
+        profiles.append({
+            "name": path.stem,
+            "path": path,
+            "size": stat.st_size,
+            "created": datetime.fromtimestamp(stat.st_mtime),
+        })
+    return profiles
@@ -0,0 +1,123 @@
+"""Running statistics that can be updated one value at a time and merged.
+
+``RunningStats`` keeps count, sum, sum of squares, min and max, plus a
+``QuantileSketch`` for percentiles. Updates are O(1) and two instances can be
+merged, so aggregates can be maintained on every history write and combined
+across days, methods, target groups and models when a dashboard reads them.
+"""
+
+import json
+import math
+
+
+class QuantileSketch:
+    """Log-bucketed histogram with a bounded relative error (DDSketch-style).
+
+    Positive values fall into buckets whose bounds grow by a factor of
+    ``gamma = (1 + accuracy) / (1 - accuracy)``, so any quantile is returned
+    within ``accuracy`` of the true value. Zero and negative values are
+    counted separately and reported as 0.
+    """
+
+    def __init__(self, accuracy=0.01, buckets=None, zero_count=0):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = buckets if buckets is not None else {}
+        self.zero_count = zero_count
+
+    @property
+    def count(self):
+        return self.zero_count + sum(self.buckets.values())
+
+    def add(self, value):
+        if value <= 0:
+            self.zero_count += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def merge(self, other):
+        self.zero_count += other.zero_count
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def quantile(self, q):
+        """Returns the approximate ``q``-quantile (0 <= q <= 1), or None when empty."""
+        total = self.count
+        if total == 0:
+            return None
+
+        rank = q * (total - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                # Midpoint of the bucket (gamma^(i-1), gamma^i] in relative terms
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def to_json(self):
+        return json.dumps({"accuracy": self.accuracy, "zero": self.zero_count, "buckets": self.buckets})
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        buckets = {int(index): count for index, count in data["buckets"].items()}
+        return cls(accuracy=data["accuracy"], buckets=buckets, zero_count=data["zero"])
+
+
+class RunningStats:
+    """Count, sum, sum of squares, min, max and a quantile sketch of a metric."""
+
+    def __init__(self, count=0, total=0.0, total_sq=0.0, minimum=None, maximum=None, sketch=None):
+        self.count = count
+        self.total = total
+        self.total_sq = total_sq
+        self.minimum = minimum
+        self.maximum = maximum
+        self.sketch = sketch if sketch is not None else QuantileSketch()
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.total_sq += value * value
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+        self.sketch.add(value)
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.minimum = other.minimum if self.minimum is None else min(self.minimum, other.minimum)
+        self.maximum = other.maximum if self.maximum is None else max(self.maximum, other.maximum)
+        self.sketch.merge(other.sketch)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    @property
+    def variance(self):
+        """Sample variance, or None with fewer than two values."""
+        if self.count < 2:
+            return None
+        # Clamp the small negative values floating point error can produce
+        return max(0.0, (self.total_sq - self.total * self.total / self.count) / (self.count - 1))
+
+    @property
+    def stddev(self):
+        variance = self.variance
+        return math.sqrt(variance) if variance is not None else None
+
+    def quantile(self, q):
+        """Approximate ``q``-quantile, clamped to the observed min and max."""
+        value = self.sketch.quantile(q)
+        if value is None:
+            return None
+        return min(max(value, self.minimum), self.maximum)
@@ -0,0 +1,310 @@
+"""Async HTTP service that simplifies medical notes for other applications.
+
+Endpoints:
+    POST /simplify  JSON body with ``medical_note`` and optional ``method``,
+                    ``target_group``, ``model`` and ``temperature``; returns
+                    the result of ``medsimplify.simplify`` with the timing
+                    ``trace`` of the request
+    GET  /health    liveness and queue state
+    GET  /metrics   request counters and latency statistics
+
+Requests wait in a bounded queue served by a fixed number of workers, each of
+which runs one simplification at a time in a thread. When the queue is full
+the service answers 503 with a ``Retry-After`` header instead of accepting
+more work than it can finish, so a load balancer can spread the load over
+more replicas. Run one service process per core or host; replicas share
+nothing but the optional history database. With ``--scrub-phi`` identifiers
+are replaced before notes reach the LLM or the history database (see
+``medsimplify.phi``).
+
+Usage:
+    python -m medsimplify.service --port 8080 --workers 8 --queue-size 64
+    python -m medsimplify.service --backend mock --mock-latency 0.5
+    python -m medsimplify.service --scrub-phi --history-db history.db
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .backends import BACKENDS, MockBackend, OpenAIBackend
+from .history_store import HistoryStore
+from .methods import METHODS, TARGET_GROUPS
+from .phi import PhiScrubber, PhiScrubbingBackend
+from .pipeline import simplify
+from .running_stats import RunningStats
+from .tracing import span, trace
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_RETRY_AFTER = 1
+MAX_NOTE_LENGTH = 100000
+
+
+def _require_aiohttp():
+    """Imports aiohttp on first use; it is optional and only the service needs it."""
+    try:
+        from aiohttp import web
+    except ImportError:
+        raise ImportError("aiohttp is required for the HTTP service. Install it with 'pip install aiohttp'.")
+    return web
+
+
+class RequestError(ValueError):
+    """A simplification request with a missing or invalid field."""
+
+
+def parse_request(body):
+    """Validates a /simplify request body and returns the arguments for ``simplify``."""
+    if not isinstance(body, dict):
+        raise RequestError("Request body must be a JSON object")
+
+    medical_note = body.get("medical_note")
+    if not isinstance(medical_note, str) or not medical_note.strip():
+        raise RequestError("'medical_note' must be a non-empty string")
+    if len(medical_note) > MAX_NOTE_LENGTH:
+        raise RequestError(f"'medical_note' must be at most {MAX_NOTE_LENGTH} characters")
+
+    request = {
+        "medical_note": medical_note,
+        "method": body.get("method", "Zero-Shot"),
+        "target_group": body.get("target_group", "General"),
+        "model": body.get("model", "gpt-3.5-turbo"),
+        "temperature": body.get("temperature", 0.3),
+    }
+    if request["method"] not in METHODS:
+        raise RequestError(f"'method' must be one of {', '.join(METHODS)}")
+    if request["target_group"] not in TARGET_GROUPS:
+        raise RequestError(f"'target_group' must be one of {', '.join(TARGET_GROUPS)}")
+    if not isinstance(request["model"], str):
+        raise RequestError("'model' must be a string")
+    if not isinstance(request["temperature"], (int, float)) or not 0 <= request["temperature"] <= 2:
+        raise RequestError("'temperature' must be a number between 0 and 2")
+    return request
+
+
+class SimplificationService:
+    """Bounded request queue and worker pool behind the HTTP endpoints.
+
+    ``workers`` simplifications run at the same time and up to ``queue_size``
+    more wait for a worker. Results, and the telemetry of every LLM call, are
+    saved to ``history_store`` when one is given.
+    """
+
+    def __init__(self, backend, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE, history_store=None,
+                 retry_after=DEFAULT_RETRY_AFTER):
+        self.backend = backend
+        self.workers = workers
+        self.queue_size = queue_size
+        self.history_store = history_store
+        self.retry_after = retry_after
+
+        self._queue = None
+        self._tasks = []
+        self._executor = None
+        self._started = time.time()
+        self.counters = {"accepted": 0, "rejected": 0, "invalid": 0, "completed": 0, "failed": 0, "cancelled": 0}
+        self.busy_workers = 0
+        self.queue_wait = RunningStats()
+        self.latency = RunningStats()
+
+    async def start(self, app=None):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="simplify")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._started = time.time()
+
+    async def stop(self, app=None):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._executor.shutdown(wait=True)
+
+    def submit(self, request):
+        """Queues a parsed request and returns a future for its result.
+
+        Raises ``asyncio.QueueFull`` when the queue has no room left.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((request, future, time.perf_counter()))
+        self.counters["accepted"] += 1
+        return future
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            request, future, queued_at = await self._queue.get()
+            try:
+                # The client went away while the request was waiting
+                if future.cancelled():
+                    self.counters["cancelled"] += 1
+                    continue
+
+                self.queue_wait.add(time.perf_counter() - queued_at)
+                self.busy_workers += 1
+                try:
+                    result = await loop.run_in_executor(self._executor, self._process, request)
+                finally:
+                    self.busy_workers -= 1
+
+                self.counters["failed" if result["error"] else "completed"] += 1
+                self.latency.add(time.perf_counter() - queued_at)
+                if not future.cancelled():
+                    future.set_result(result)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.counters["failed"] += 1
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def _process(self, request):
+        """Runs one simplification in a worker thread and records it in the history."""
+        with trace("service_request", method=request["method"], target_group=request["target_group"]) as root:
+            result = simplify(backend=self.backend, **request)
+            if self.history_store is not None:
+                with span("save_history"):
+                    self._save(result)
+        result["trace"] = root.to_dict()
+        return result
+
+    def _save(self, result):
+        try:
+            if result["telemetry"]:
+                self.history_store.add_llm_call(result["method"], result["target_group"], result["telemetry"])
+            if not result["error"]:
+                self.history_store.add(
+                    result["original_note"],
+                    result["simplified_note"],
+                    result["method"],
+                    result["target_group"],
+                    result["metrics"],
+                    model=result["model"]
+                )
+        except Exception:
+            logger.exception("Could not save the simplification to the history database")
+
+    def health(self):
+        return {
+            "status": "ok",
+            "workers": self.workers,
+            "busy_workers": self.busy_workers,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_size": self.queue_size,
+        }
+
+    def metrics(self):
+        def summary(stats):
+            return {
+                "count": stats.count,
+                "mean": stats.mean,
+                "p50": stats.quantile(0.5),
+                "p95": stats.quantile(0.95),
+                "p99": stats.quantile(0.99),
+                "max": stats.maximum,
+            }
+
+        return dict(
+            self.health(),
+            uptime_seconds=time.time() - self._started,
+            requests=dict(self.counters),
+            queue_wait_seconds=summary(self.queue_wait),
+            latency_seconds=summary(self.latency),
+        )
+
+    async def handle_simplify(self, http_request):
+        web = _require_aiohttp()
+        try:
+            request = parse_request(await http_request.json())
+        except ValueError as e:
+            # Malformed JSON raises a ValueError subclass as well
+            self.counters["invalid"] += 1
+            return web.json_response({"error": str(e)}, status=400)
+
+        try:
+            future = self.submit(request)
+        except asyncio.QueueFull:
+            self.counters["rejected"] += 1
+            return web.json_response(
+                {"error": "Too many requests are waiting, retry later"},
+                status=503,
+                headers={"Retry-After": str(self.retry_after)}
+            )
+
+        result = await future
+        return web.json_response(result, status=502 if result["error"] else 200)
+
+    async def handle_health(self, http_request):
+        return _require_aiohttp().json_response(self.health())
+
+    async def handle_metrics(self, http_request):
+        return _require_aiohttp().json_response(self.metrics())
+
+
+def create_app(backend=None, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE, history_store=None,
+               retry_after=DEFAULT_RETRY_AFTER):
+    """Builds the aiohttp application; the worker pool starts with the app."""
+    web = _require_aiohttp()
+    service = SimplificationService(
+        backend if backend is not None else OpenAIBackend(),
+        workers=workers,
+        queue_size=queue_size,
+        history_store=history_store,
+        retry_after=retry_after,
+    )
+
+    app = web.Application(client_max_size=4 * MAX_NOTE_LENGTH)
+    app.on_startup.append(service.start)
+    app.on_cleanup.append(service.stop)
+    app.add_routes([
+        web.post("/simplify", service.handle_simplify),
+        web.get("/health", service.handle_health),
+        web.get("/metrics", service.handle_metrics),
+    ])
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve medical note simplification over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Simplifications run at the same time")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="Requests that may wait for a worker")
+    parser.add_argument("--retry-after", type=int, default=DEFAULT_RETRY_AFTER, help="Seconds clients are asked to wait when the queue is full")
+    parser.add_argument("--backend", choices=list(BACKENDS), default=os.environ.get("LLM_BACKEND", "openai"))
+    parser.add_argument("--mock-latency", type=float, default=0.5, help="Seconds per call of the mock backend")
+    parser.add_argument("--history-db", default=os.environ.get("HISTORY_DB_PATH"), help="Save results to this history database")
+    parser.add_argument("--scrub-phi", action="store_true", help="Replace identifiers before LLM calls and storage")
+    args = parser.parse_args()
+
+    web = _require_aiohttp()
+    logging.basicConfig(level=logging.INFO)
+    if args.backend == "mock":
+        backend = MockBackend(latency=args.mock_latency)
+    else:
+        backend = OpenAIBackend(api_key=os.environ.get("OPENAI_API_KEY"))
+    scrubber = PhiScrubber() if args.scrub_phi else None
+    if scrubber is not None:
+        backend = PhiScrubbingBackend(backend, scrubber)
+    history_store = HistoryStore(args.history_db, scrubber=scrubber) if args.history_db else None
+
+    app = create_app(
+        backend,
+        workers=args.workers,
+        queue_size=args.queue_size,
+        history_store=history_store,
+        retry_after=args.retry_after,
+    )
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
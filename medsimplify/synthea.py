@@ -0,0 +1,278 @@
+"""Streaming ingestion of Synthea CSV exports.
+
+A Synthea export is a directory of CSV tables keyed by patient:
+``patients.csv`` plus ``conditions.csv``, ``medications.csv``,
+``encounters.csv`` and ``observations.csv``. ``SyntheaExport`` turns it into
+one medical note per patient, in the format of the app's sample notes,
+without loading the tables into memory.
+
+Each event table is scanned once, in large buffered reads, to build a
+per-patient index of the byte ranges that hold the patient's rows. Synthea
+writes the rows of a patient together, so the index has about one range per
+patient and per table however many rows the table has. Patients are then
+read one at a time from ``patients.csv`` and their rows are read back from
+each table by seeking to those ranges. Memory use is bounded by the index
+and the rows of one patient, so exports with millions of observation rows
+can be processed on a laptop.
+
+``notes()`` is a generator, so it can be passed straight to
+``simplify_stream`` or ``JobRunner.submit``.
+
+Usage:
+    python -m medsimplify.synthea synthea/output/csv --limit 100 > notes.jsonl
+    python -m medsimplify.synthea synthea/output/csv --simplify --backend mock --method "Chain of Thought"
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import sys
+from array import array
+from datetime import date
+from pathlib import Path
+
+from .backends import BACKENDS, MockBackend, OpenAIBackend
+from .methods import METHODS, TARGET_GROUPS
+from .notes import DEFAULT_MAX_ENCOUNTERS, DEFAULT_MAX_OBSERVATIONS, PatientRecord, age_in_years, format_demographics
+from .pipeline import DEFAULT_MAX_WORKERS, simplify_stream
+
+READ_BUFFER_SIZE = 1 << 20
+
+GENDERS = {"M": "male", "F": "female"}
+ETHNICITIES = {"hispanic": "Hispanic", "nonhispanic": "Non-Hispanic"}
+
+# Newer exports suffix SNOMED descriptions with their semantic tag, e.g. "Hypertension (disorder)"
+_SEMANTIC_TAG = re.compile(r"\s+\((?:disorder|finding|situation|procedure|morphologic abnormality)\)$")
+
+
+def _clean_description(description):
+    return _SEMANTIC_TAG.sub("", description.strip())
+
+
+class PatientIndex:
+    """Byte ranges of each patient's rows in one Synthea CSV table.
+
+    The table is scanned once when the index is built; ``rows(patient_id)``
+    then reads only that patient's ranges.
+    """
+
+    def __init__(self, path, patient_column="PATIENT"):
+        self.path = Path(path)
+        self.patient_column = patient_column
+        self.columns = []
+        self.row_count = 0
+        self._ranges = {}
+        self._file = None
+        self._build()
+
+    def _build(self):
+        with open(self.path, "rb", buffering=READ_BUFFER_SIZE) as table:
+            header = table.readline()
+            self.columns = next(csv.reader([header.decode("utf-8-sig")]))
+            column = self.columns.index(self.patient_column)
+
+            offset = len(header)
+            current, range_start = None, offset
+            for line in table:
+                # A quoted field spanning lines leaves an odd number of quotes
+                while line.count(b'"') % 2:
+                    continuation = table.readline()
+                    if not continuation:
+                        break
+                    line += continuation
+
+                if b'"' in line:
+                    patient = next(csv.reader([line.decode("utf-8")]))[column].encode("utf-8")
+                else:
+                    patient = line.split(b",", column + 1)[column].strip()
+
+                if patient != current:
+                    if current is not None:
+                        self._add_range(current, range_start, offset)
+                    current, range_start = patient, offset
+                offset += len(line)
+                self.row_count += 1
+
+            if current is not None:
+                self._add_range(current, range_start, offset)
+
+    def _add_range(self, patient, start, end):
+        self._ranges.setdefault(patient.decode("utf-8"), array("q")).extend((start, end))
+
+    def __len__(self):
+        return len(self._ranges)
+
+    def rows(self, patient_id):
+        """Yields the patient's rows as dictionaries keyed by column name."""
+        ranges = self._ranges.get(patient_id)
+        if not ranges:
+            return
+        if self._file is None:
+            self._file = open(self.path, "rb")
+        for position in range(0, len(ranges), 2):
+            self._file.seek(ranges[position])
+            data = self._file.read(ranges[position + 1] - ranges[position]).decode("utf-8")
+            for values in csv.reader(io.StringIO(data, newline="")):
+                yield dict(zip(self.columns, values))
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SyntheaExport:
+    """Medical notes for the patients of a Synthea CSV export directory.
+
+    Tables other than ``patients.csv`` are optional. Notes list the active
+    conditions and medications, the ``max_encounters`` most recent
+    encounters and the ``max_observations`` most recent laboratory results.
+    Ages are computed at ``as_of`` (default today) or at the date of death.
+    """
+
+    TABLES = ("conditions", "medications", "encounters", "observations")
+
+    def __init__(self, directory, max_encounters=DEFAULT_MAX_ENCOUNTERS, max_observations=DEFAULT_MAX_OBSERVATIONS,
+                 as_of=None):
+        self.directory = Path(directory)
+        self.max_encounters = max_encounters
+        self.max_observations = max_observations
+        self.as_of = as_of or date.today()
+        self._indexes = None
+        if not (self.directory / "patients.csv").exists():
+            raise FileNotFoundError(f"No patients.csv in {self.directory}")
+
+    @property
+    def indexes(self):
+        """The per-patient index of each event table, built on first use."""
+        if self._indexes is None:
+            self._indexes = {
+                table: PatientIndex(self.directory / f"{table}.csv")
+                for table in self.TABLES
+                if (self.directory / f"{table}.csv").exists()
+            }
+        return self._indexes
+
+    def patients(self):
+        """Yields the rows of ``patients.csv`` one at a time."""
+        with open(self.directory / "patients.csv", newline="", encoding="utf-8-sig") as table:
+            yield from csv.DictReader(table)
+
+    def _rows(self, table, patient_id):
+        index = self.indexes.get(table)
+        return index.rows(patient_id) if index is not None else iter(())
+
+    def _age(self, patient):
+        birth = date.fromisoformat(patient["BIRTHDATE"][:10])
+        end = date.fromisoformat(patient["DEATHDATE"][:10]) if patient.get("DEATHDATE") else self.as_of
+        return age_in_years(birth, end)
+
+    def render(self, patient):
+        """Renders the note of one row of ``patients.csv``."""
+        patient_id = patient["Id"]
+        record = PatientRecord(patient_id, self.max_encounters, self.max_observations)
+        record.demographics = format_demographics(
+            self._age(patient),
+            GENDERS.get(patient.get("GENDER"), patient.get("GENDER")),
+            patient.get("RACE", "").capitalize() or None,
+            ETHNICITIES.get(patient.get("ETHNICITY"), patient.get("ETHNICITY")),
+        )
+
+        # Only active conditions and medications are listed
+        for row in self._rows("conditions", patient_id):
+            if not row.get("STOP"):
+                record.add_condition(_clean_description(row["DESCRIPTION"]))
+        for row in self._rows("medications", patient_id):
+            if not row.get("STOP"):
+                record.add_medication(row["DESCRIPTION"].strip())
+        for row in self._rows("encounters", patient_id):
+            record.add_encounter(
+                row["START"][:10],
+                _clean_description(row["DESCRIPTION"]),
+                _clean_description(row.get("REASONDESCRIPTION", ""))
+            )
+        for row in self._rows("observations", patient_id):
+            if _is_laboratory(row):
+                record.add_observation(row["DATE"][:10], row["DESCRIPTION"].strip(), row["VALUE"], row.get("UNITS", ""))
+
+        return record.render()
+
+    def notes(self, limit=None):
+        """Yields the note of every patient (at most ``limit``), in the order of ``patients.csv``."""
+        for count, patient in enumerate(self.patients()):
+            if limit is not None and count >= limit:
+                return
+            yield self.render(patient)
+
+    def close(self):
+        for index in (self._indexes or {}).values():
+            index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _is_laboratory(row):
+    # Exports before Synthea 3.0 have no CATEGORY column; keep their numeric results
+    if "CATEGORY" in row:
+        return row["CATEGORY"] == "laboratory"
+    return row.get("TYPE", "numeric") == "numeric"
+
+
+def iter_synthea_notes(directory, limit=None, **options):
+    """Yields the notes of a Synthea CSV export and closes its files when done."""
+    with SyntheaExport(directory, **options) as export:
+        yield from export.notes(limit=limit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build medical notes from a Synthea CSV export as JSON lines.")
+    parser.add_argument("directory", help="Directory with patients.csv and the other Synthea CSV tables")
+    parser.add_argument("--limit", type=int, help="Stop after this many patients")
+    parser.add_argument("--max-encounters", type=int, default=DEFAULT_MAX_ENCOUNTERS)
+    parser.add_argument("--max-observations", type=int, default=DEFAULT_MAX_OBSERVATIONS)
+    parser.add_argument("--simplify", action="store_true", help="Simplify each note and write the results instead")
+    parser.add_argument("--method", choices=list(METHODS), default="Zero-Shot")
+    parser.add_argument("--target-group", choices=list(TARGET_GROUPS), default="General")
+    parser.add_argument("--model", default="gpt-3.5-turbo")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--backend", choices=list(BACKENDS), default=os.environ.get("LLM_BACKEND", "openai"))
+    parser.add_argument("--mock-latency", type=float, default=0.5, help="Seconds per call of the mock backend")
+    args = parser.parse_args()
+
+    notes = iter_synthea_notes(
+        args.directory,
+        limit=args.limit,
+        max_encounters=args.max_encounters,
+        max_observations=args.max_observations,
+    )
+    if not args.simplify:
+        for note in notes:
+            print(json.dumps({"note": note}))
+        return
+
+    if args.backend == "mock":
+        backend = MockBackend(latency=args.mock_latency)
+    else:
+        backend = OpenAIBackend(api_key=os.environ.get("OPENAI_API_KEY"))
+    results = simplify_stream(
+        notes,
+        method=args.method,
+        target_group=args.target_group,
+        model=args.model,
+        backend=backend,
+        max_workers=args.workers,
+    )
+    for result in results:
+        print(json.dumps(result))
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Lightweight hierarchical timing of the simplification flow.
+
+``trace(name)`` starts a trace and ``span(name)`` times one stage inside it.
+The current span is kept in a context variable, so stages nested in other
+functions attach to their caller without a tracer being passed around, and
+``run_in_context`` carries it into worker threads. Outside a trace ``span``
+only yields None, so library code is instrumented unconditionally at the cost
+of one context variable lookup. Stages measured some other way, such as the
+time to the first token of a streamed LLM response, are added after the fact
+with ``add_span``.
+
+When a trace finishes it is written to the ``medsimplify.trace`` logger as
+one JSON line, and ``waterfall_rows`` flattens it for display.
+"""
+
+import contextvars
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("medsimplify.trace")
+
+_current_span = contextvars.ContextVar("medsimplify_current_span", default=None)
+
+
+class Span:
+    """One timed stage, with the stages it contains as children."""
+
+    __slots__ = ("name", "attributes", "start", "end", "children")
+
+    def __init__(self, name, start=None, end=None, attributes=None):
+        self.name = name
+        self.attributes = attributes or {}
+        self.start = time.perf_counter() if start is None else start
+        self.end = end
+        self.children = []
+
+    @property
+    def duration(self):
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def to_dict(self, origin=None):
+        """Returns the span tree with times in milliseconds from the start of ``origin`` (default: this span)."""
+        origin = self.start if origin is None else origin
+        return {
+            "name": self.name,
+            "start_ms": (self.start - origin) * 1000,
+            "duration_ms": self.duration * 1000,
+            "attributes": self.attributes,
+            "children": [child.to_dict(origin) for child in self.children],
+        }
+
+
+def current_span():
+    return _current_span.get()
+
+
+@contextmanager
+def span(name, **attributes):
+    """Times the block as a child of the current span; does nothing outside a trace."""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(name, attributes=attributes)
+    parent.children.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        child.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def add_span(name, start, end, **attributes):
+    """Adds a stage that was timed elsewhere (``perf_counter`` values) to the current span."""
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    child = Span(name, start=start, end=end, attributes=attributes)
+    parent.children.append(child)
+    return child
+
+
+@contextmanager
+def trace(name, log=True, **attributes):
+    """Starts a trace; spans opened inside the block become its stages.
+
+    The finished trace is logged as JSON unless ``log`` is false. Traces can
+    be nested, in which case the inner one is also a child of the outer one.
+    """
+    root = Span(name, attributes=attributes)
+    parent = _current_span.get()
+    if parent is not None:
+        parent.children.append(root)
+    token = _current_span.set(root)
+    try:
+        yield root
+    finally:
+        root.end = time.perf_counter()
+        _current_span.reset(token)
+        if log and logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(root.to_dict()))
+
+
+def run_in_context(func, *args, **kwargs):
+    """Returns a callable running ``func`` under the caller's current span, for worker threads."""
+    context = contextvars.copy_context()
+    return lambda: context.run(func, *args, **kwargs)
+
+
+def waterfall_rows(trace_dict):
+    """Flattens a trace (see ``Span.to_dict``) into rows of depth, name, start, duration and attributes."""
+    rows = []
+
+    def visit(node, depth):
+        rows.append({
+            "depth": depth,
+            "name": node["name"],
+            "start_ms": node["start_ms"],
+            "duration_ms": node["duration_ms"],
+            "attributes": node["attributes"],
+        })
+        for child in sorted(node["children"], key=lambda child: child["start_ms"]):
+            visit(child, depth + 1)
+
+    visit(trace_dict, 0)
+    return rows
@@ -0,0 +1,124 @@
+"""Splitting of uploaded files into medical notes.
+
+``iter_file_notes`` reads notes lazily from one file, so an upload with
+thousands of notes can be passed straight to ``simplify_stream`` or
+``JobRunner.submit`` without building a list of them. Supported files:
+
+- ``.txt``: one or more notes, separated by a line of ``---`` (or ``===``)
+  or starting with a ``PATIENT MEDICAL NOTE`` heading
+- ``.csv``: one note per row, from the ``medical_note``, ``note``, ``text``
+  or ``original_note`` column (a Processing History export can be
+  re-uploaded as it is), or from the only column
+- ``.jsonl``: one note per line, as a JSON string or an object with one of
+  the columns above
+- ``.zip``: any of the above; members are decompressed as they are read
+"""
+
+import csv
+import io
+import json
+import re
+import zipfile
+from pathlib import PurePosixPath
+
+from .notes import NOTE_TITLE
+
+UPLOAD_TYPES = ("txt", "csv", "jsonl", "zip")
+
+NOTE_COLUMNS = ("medical_note", "note", "text", "original_note")
+
+_SEPARATOR = re.compile(r"^\s*(?:-{3,}|={3,})\s*$")
+
+
+class UploadError(ValueError):
+    """An uploaded file that cannot be split into notes."""
+
+
+def _text_lines(file, newline=None):
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline=newline)
+    try:
+        yield from text
+    finally:
+        # Leave the caller's file open
+        if not file.closed:
+            text.detach()
+
+
+def _iter_text_notes(file):
+    lines = []
+    for line in _text_lines(file):
+        if _SEPARATOR.match(line) or (line.strip() == NOTE_TITLE and "".join(lines).strip()):
+            note = "".join(lines).strip()
+            if note:
+                yield note
+            lines = [] if _SEPARATOR.match(line) else [line]
+        else:
+            lines.append(line)
+    note = "".join(lines).strip()
+    if note:
+        yield note
+
+
+def _note_column(columns, name):
+    for column in NOTE_COLUMNS:
+        if column in columns:
+            return column
+    if len(columns) == 1:
+        return columns[0]
+    raise UploadError(f"{name} has no column named {', '.join(NOTE_COLUMNS)}")
+
+
+def _iter_csv_notes(file, name):
+    reader = csv.DictReader(_text_lines(file, newline=""))
+    column = _note_column(reader.fieldnames or [], name)
+    for row in reader:
+        note = (row.get(column) or "").strip()
+        if note:
+            yield note
+
+
+def _iter_jsonl_notes(file, name):
+    for line_number, line in enumerate(_text_lines(file), start=1):
+        if not line.strip():
+            continue
+        try:
+            value = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise UploadError(f"{name}, line {line_number}: {e}") from None
+        if isinstance(value, dict):
+            value = next((value[column] for column in NOTE_COLUMNS if column in value), None)
+        if not isinstance(value, str):
+            raise UploadError(f"{name}, line {line_number}: expected a note string or an object with a note")
+        if value.strip():
+            yield value.strip()
+
+
+def _iter_zip_notes(file, name):
+    try:
+        archive = zipfile.ZipFile(file)
+    except zipfile.BadZipFile as e:
+        raise UploadError(f"{name}: {e}") from None
+    with archive:
+        for member in archive.infolist():
+            path = PurePosixPath(member.filename)
+            # Skip folders and the metadata macOS adds to archives
+            if member.is_dir() or path.name.startswith(".") or "__MACOSX" in path.parts:
+                continue
+            if path.suffix.lower() in (".txt", ".csv", ".jsonl"):
+                with archive.open(member) as member_file:
+                    yield from iter_file_notes(member_file, name=f"{name}/{member.filename}")
+
+
+def iter_file_notes(file, name=None):
+    """Yields the notes in a binary file object, by the suffix of ``name`` (default ``file.name``)."""
+    name = name or getattr(file, "name", "")
+    suffix = PurePosixPath(name).suffix.lower()
+    if suffix == ".txt":
+        return _iter_text_notes(file)
+    if suffix == ".csv":
+        return _iter_csv_notes(file, name)
+    if suffix == ".jsonl":
+        return _iter_jsonl_notes(file, name)
+    if suffix == ".zip":
+        return _iter_zip_notes(file, name)
+    raise UploadError(f"{name}: unsupported file type; upload {', '.join(UPLOAD_TYPES)} files")
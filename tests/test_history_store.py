@@ -0,0 +1,64 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+from medsimplify.history_store import HistoryStore  # noqa: E402
+from medsimplify.phi import PhiScrubber  # noqa: E402
+
+METRICS = {
+    "readability_score": 70.0,
+    "original_readability": 30.0,
+    "term_density": 2.0,
+    "original_term_density": 10.0,
+    "length_ratio": 0.8,
+    "processing_time": 1.0,
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(tmp_path / "history.db", scrubber=PhiScrubber())
+    yield store
+    store.close()
+
+
+def stored_notes(store):
+    item = store.items(with_notes=True)[-1]
+    return item["original_note"], item["simplified_note"]
+
+
+def test_simplified_note_reuses_the_tokens_of_its_original(store):
+    store.add(
+        "Patient ID: 12345\nSeen 2024-04-02 for COPD.",
+        "You were seen on 2024-04-02.",
+        "Zero-Shot", "General", METRICS,
+    )
+    original, simplified = stored_notes(store)
+    assert original == "Patient ID: [ID_1]\nSeen [DATE_1] for COPD."
+    assert simplified == "You were seen on [DATE_1]."
+
+
+def test_new_identifiers_do_not_clash_with_an_already_scrubbed_original(store):
+    # Job results reach the history with an original that was scrubbed when it was queued
+    store.add(
+        "Patient ID: [ID_1]\nSeen [DATE_1] for COPD.",
+        "You were seen on [DATE_1]. Come back on 2024-05-01.",
+        "Zero-Shot", "General", METRICS,
+    )
+    original, simplified = stored_notes(store)
+    assert original == "Patient ID: [ID_1]\nSeen [DATE_1] for COPD."
+    assert simplified == "You were seen on [DATE_1]. Come back on [DATE_2]."
+
+
+def test_demographics_are_kept(store):
+    store.add(
+        "Patient ID: 12345\nDemographics: 72 year old female, Asian, Non-Hispanic",
+        "You are a 72 year old woman.",
+        "Zero-Shot", "General", METRICS,
+    )
+    original, _ = stored_notes(store)
+    assert original == "Patient ID: [ID_1]\nDemographics: 72 year old female, Asian, Non-Hispanic"
@@ -0,0 +1,117 @@
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+from medsimplify.metrics import MEDICAL_TERMS, evaluate_simplification, text_statistics  # noqa: E402
+from medsimplify.note_parser import ParsedNote, clear_cache, parse_note  # noqa: E402
+
+SAMPLES_DIR = REPO_DIR / "content" / "samples"
+SAMPLE_PATHS = sorted(SAMPLES_DIR.glob("*.txt"))
+
+
+def read_sample(name):
+    return (SAMPLES_DIR / f"{name}.txt").read_text(encoding="utf-8").rstrip("\n")
+
+
+def reference_statistics(text):
+    """The statistics as computed over the whole text before notes were parsed."""
+    words = re.findall(r"\b\w+\b", text.lower())
+    return {
+        "sentences": len(re.split(r"[.!?]+", text)),
+        "words": len(words),
+        "syllables": sum(max(1, len(re.findall(r"[aeiouy]+", word))) for word in words),
+        "medical_terms": sum(1 for word in words if word in MEDICAL_TERMS),
+    }
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_cache()
+    yield
+    clear_cache()
+
+
+def test_samples_exist():
+    assert [path.stem for path in SAMPLE_PATHS] == ["cardiac", "diabetes_hypertension", "respiratory"]
+
+
+@pytest.mark.parametrize("path", SAMPLE_PATHS, ids=lambda path: path.stem)
+def test_samples_have_the_four_sections(path):
+    note = parse_note(path.read_text(encoding="utf-8"))
+    assert list(note.sections) == ["MEDICAL HISTORY", "MEDICATIONS", "ENCOUNTERS", "LABORATORY RESULTS"]
+    assert note.patient_id
+    assert note.demographics
+    assert note.conditions and note.medications and note.encounters and note.observations
+
+
+@pytest.mark.parametrize("path", SAMPLE_PATHS, ids=lambda path: path.stem)
+def test_statistics_match_the_whole_text(path):
+    text = path.read_text(encoding="utf-8")
+    assert parse_note(text).statistics == reference_statistics(text) == text_statistics(text)
+
+
+def test_diabetes_hypertension_sample():
+    note = parse_note(read_sample("diabetes_hypertension"))
+    assert note.header == {"Patient ID": "1a2b3c4d-5e6f", "Demographics": "67 year old male, White, Non-Hispanic"}
+    assert note.conditions == [
+        "Essential hypertension",
+        "Hyperlipidemia",
+        "Type 2 diabetes mellitus",
+        "Chronic kidney disease, stage 2 (mild)",
+    ]
+    assert note.medications == ["Lisinopril 10mg daily", "Atorvastatin 20mg daily", "Metformin 1000mg BID"]
+    assert note.encounters == [
+        ("2024-03-10", "Outpatient visit", "Follow-up"),
+        ("2024-01-15", "Laboratory encounter", "Routine labs"),
+    ]
+    assert note.observations == [
+        ("2024-01-15", "Hemoglobin A1c", "7.2", "%"),
+        ("2024-01-15", "Creatinine", "1.3", "mg/dL"),
+        ("2024-01-15", "LDL Cholesterol", "110", "mg/dL"),
+    ]
+
+
+def test_cardiac_sample_encounter_without_reason():
+    note = parse_note(read_sample("cardiac"))
+    assert note.encounters[-1] == ("2024-02-10", "Discharge", "")
+    assert note.observations[1] == ("2024-02-05", "BNP", "450", "pg/mL")
+
+
+def test_respiratory_sample_observation_units():
+    note = parse_note(read_sample("respiratory"))
+    assert note.medications[1] == "Fluticasone/Salmeterol inhaler BID"
+    assert note.encounters[1] == ("2024-04-02", "Pulmonary function test", "")
+    assert note.observations[1] == ("2024-04-02", "FEV1", "65", "% predicted")
+    assert note.observations[2] == ("2024-04-02", "FEV1/FVC ratio", "0.65", "")
+
+
+def test_parsed_notes_are_cached_by_text():
+    text = read_sample("cardiac")
+    assert parse_note(text) is parse_note(text)
+    assert parse_note(text) is not parse_note(read_sample("respiratory"))
+
+
+def test_note_in_another_layout_has_no_sections():
+    note = parse_note("Patient reports dyspnea. Started on albuterol!")
+    assert note.sections == {}
+    assert note.statistics == reference_statistics(note.text)
+
+
+def test_note_built_without_parse_note_computes_its_statistics():
+    text = read_sample("respiratory")
+    assert ParsedNote(text).statistics == text_statistics(text)
+
+
+def test_evaluation_checks_medications_and_lab_values():
+    note = parse_note(read_sample("diabetes_hypertension"))
+    simplified = "Keep taking lisinopril and metformin. Your A1c is 7.2 and your LDL is 110."
+    metrics = evaluate_simplification(note, simplified)
+    # Lisinopril, Metformin, 7.2 and 110 out of three medications and three lab values
+    assert metrics["facts_retained"] == pytest.approx(4 / 6 * 100)
+    assert metrics["original_readability"] == evaluate_simplification(note.text, simplified)["original_readability"]
+    assert evaluate_simplification(note.text, simplified)["facts_retained"] is None